@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Vergleich der Kursabfrage (KurseDB.get_kurs):
+# bisheriger Weg mit bis zu drei Abfragen gegen die neue Abfrage mit JOIN
+#
+# Aufruf aus dem Hauptverzeichnis:
+#   python -m benchmarks.bench_kursabfrage
+
+import datetime
+import random
+import timeit
+
+from lib.kursedb import *
+
+ANZ_TAGE = 25 * 365
+ANZ_ABFRAGEN = 20000
+
+def get_kurs_alt(kursedb, isin, datum):
+    # bisherige Implementierung: fonds, exaktes Datum, dann Datum davor
+    res = kursedb.fetchone("SELECT * FROM fonds WHERE isin=?", (isin,))
+    if res is None:
+        return None
+    isin_id = res[KURSEDB_FONDID]
+    kurswaehrung = res[KURSEDB_KURSWAEHRUNG]
+
+    # (Tage inzwischen als Ordinalzahl gespeichert)
+    res = kursedb.fetchone("SELECT * FROM kurse WHERE datum=? AND fondsid=?", (datum.toordinal(), isin_id))
+    if res is not None:
+        res[KURSEDB_EXAKTES_DATUM] = True
+    else:
+        res = kursedb.fetchone("SELECT * FROM kurse WHERE datum<=? AND fondsid=? ORDER BY datum DESC LIMIT 1",
+                               (datum.toordinal(), isin_id))
+        if res is not None:
+            res[KURSEDB_EXAKTES_DATUM] = False
+    if res is not None:
+        res[KURSEDB_KURSWAEHRUNG] = kurswaehrung
+        res[KURSEDB_DATUM] = datetime.date.fromordinal(res[KURSEDB_DATUM])
+        # die interne id der Kurse wird nicht mehr zurückgegeben
+        res.pop("id", None)
+    return res
+
+def erzeuge_db():
+    kursedb = KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+    kursedb.insert_isin("LU1437016972")
+    start = datetime.date(2000, 1, 3)
+    daten = []
+    for i in range(ANZ_TAGE):
+        tag = start + datetime.timedelta(days=i)
+        if tag.weekday() >= 5:
+            continue
+        daten.append({KURSEDB_DATUM: tag, KURSEDB_SCHLUSSKURS: 100.0 + i * 0.01})
+    kursedb.upsert_kurse("LU1437016972", datalist=daten)
+    return kursedb, start
+
+def main():
+    kursedb, start = erzeuge_db()
+    rnd = random.Random(42)
+    abfragen = [start + datetime.timedelta(days=rnd.randrange(ANZ_TAGE)) for _ in range(ANZ_ABFRAGEN)]
+
+    # beide Wege müssen dasselbe liefern
+    for datum in abfragen[:500]:
+        assert get_kurs_alt(kursedb, "LU1437016972", datum) == kursedb.get_kurs("LU1437016972", datum)
+
+    with kursedb.cursor2() as cursor:
+        t_alt = timeit.timeit(lambda: [get_kurs_alt(kursedb, "LU1437016972", d) for d in abfragen], number=1)
+        t_neu = timeit.timeit(lambda: [kursedb.get_kurs("LU1437016972", d, cursor=cursor) for d in abfragen], number=1)
+
+    print("Abfragen.........: %d" % ANZ_ABFRAGEN)
+    print("bisher...........: %7.2f µs/Abfrage" % (t_alt / ANZ_ABFRAGEN * 1e6))
+    print("eine Abfrage.....: %7.2f µs/Abfrage" % (t_neu / ANZ_ABFRAGEN * 1e6))
+    print("Faktor...........: %7.2f" % (t_alt / t_neu))
+    kursedb.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Vergleich beim Lesen einer kompletten Kursreihe (25 Jahre):
+#
+# bisher       Datum als Text (Umwandlung durch PARSE_DECLTYPES), sqlite3.Row -> dict
+# dict         Tag als Ordinalzahl, KurseDB.get_alle_kurse (dict pro Kurs)
+# tupel        Tag als Ordinalzahl, KurseDB.get_kurse_tupel (namedtuple pro Kurs)
+# strom        Tag als Ordinalzahl, KurseDB.iter_kurse (Generator, Kurse werden nur gezählt)
+#
+# Gemessen werden Laufzeit und Speicherbedarf (Spitze laut tracemalloc).
+#
+# Aufruf aus dem Hauptverzeichnis:
+#   python -m benchmarks.bench_kursreihe
+
+import datetime
+import timeit
+import tracemalloc
+
+from lib.kursedb import *
+from lib.sqlite import DBClass
+
+ANZ_TAGE = 25 * 365
+ANZ_WIEDERHOLUNGEN = 20
+
+# Aufbau der Tabelle `kurse` vor den Migrationen
+ALTES_SCHEMA = """
+CREATE TABLE kurse (
+    id integer primary key autoincrement,
+    datum date not null,
+    fondsid integer not null,
+    schluss float not null,
+    stueck float,
+    volumen float
+);
+CREATE UNIQUE INDEX k_fonds_datum ON kurse(fondsid, datum);
+"""
+
+def erzeuge_daten():
+    start = datetime.date(2000, 1, 3)
+    daten = []
+    for i in range(ANZ_TAGE):
+        tag = start + datetime.timedelta(days=i)
+        if tag.weekday() >= 5:
+            continue
+        daten.append({KURSEDB_DATUM: tag, KURSEDB_SCHLUSSKURS: 100.0 + i * 0.01})
+    return daten
+
+def erzeuge_db_alt(daten):
+    db = DBClass.open_sqlite(":memory:")
+    with db.cursor2() as cursor:
+        cursor.executescript(ALTES_SCHEMA)
+        cursor.executemany("INSERT INTO kurse (datum, fondsid, schluss) VALUES (?,1,?)",
+                           [(x[KURSEDB_DATUM], x[KURSEDB_SCHLUSSKURS]) for x in daten])
+    db.commit()
+    return db
+
+def erzeuge_db_neu(daten):
+    kursedb = KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+    kursedb.insert_isin("LU1437016972")
+    kursedb.upsert_kurse("LU1437016972", datalist=daten)
+    return kursedb
+
+def messe(name, fkt, anzahl):
+    tracemalloc.start()
+    res = fkt()
+    _, spitze = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert (res if type(res) is int else len(res)) == anzahl
+    del res
+
+    zeit = timeit.timeit(fkt, number=ANZ_WIEDERHOLUNGEN) / ANZ_WIEDERHOLUNGEN
+    print("%-8s %8.2f ms %10.1f kB" % (name, zeit * 1e3, spitze / 1024))
+    return zeit, spitze
+
+def main():
+    daten = erzeuge_daten()
+    alt = erzeuge_db_alt(daten)
+    neu = erzeuge_db_neu(daten)
+
+    print("Kurse: %d\n" % len(daten))
+    print("Weg         Laufzeit    Speicher")
+    t_alt, m_alt = messe("bisher", lambda: alt.fetchall("SELECT * FROM kurse WHERE fondsid=? ORDER BY datum", (1,)), len(daten))
+    messe("dict", lambda: neu.get_alle_kurse("LU1437016972"), len(daten))
+    t_tup, m_tup = messe("tupel", lambda: neu.get_kurse_tupel("LU1437016972"), len(daten))
+    messe("strom", lambda: sum(1 for _ in neu.iter_kurse("LU1437016972")), len(daten))
+    print()
+    print("tupel/bisher: Laufzeit %.0f %%, Speicher %.0f %%" % (t_tup / t_alt * 100, m_tup / m_alt * 100))
+
+    alt.close()
+    neu.close()
+
+if __name__ == "__main__":
+    main()
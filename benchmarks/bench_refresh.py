@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Laufzeit eines kompletten "refresh" ohne Internet
+#
+# Die Antworten von Onvista (eod_history) werden einmal erzeugt und mit
+# `AufzeichnenderDownloader` aufgezeichnet. Danach wird die Kurse-DB mehrfach aktualisiert:
+#
+# wiedergabe   WiedergabeDownloader (direkt, ohne HTTP, ohne Drosselung und ohne Fehler)
+# server       SimpleDownloader -> StandInServer (lokales HTTP, mit Drosselung, einem Anteil
+#              fehlerhafter Antworten und Wiederholungen)
+#
+# jeweils mit 1 und REFRESH_THREADS Threads und derselben Latenz pro Abfrage.
+# Nach jedem Lauf wird die Anzahl der Kurse geprüft.
+#
+# Aufruf aus dem Hauptverzeichnis:
+#   python -m benchmarks.bench_refresh
+
+import calendar
+import contextlib
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+import urllib.parse
+
+from lib.kursedb import *
+from lib.config import Config
+from lib.stammdaten import STAMMDATEN_NAME, STAMMDATEN_TYP, STAMMDATEN_TYP_FUND, STAMMDATEN_KURSWAEHRUNG
+from lib.aufzeichnung import AufzeichnenderDownloader, WiedergabeDownloader, StandInServer
+from lib.drosselung import GedrosselterDownloader
+from lib.onlinekursabfrage import init_abfragemodule
+from lib.onlinekursabfrage.query_onvista import ONVISTA_ENTITY, ONVISTA_NOTATION, ONVISTA_API_URL
+from lib.module.kurse_online import refresh_datenbank, REFRESH_THREADS
+
+ANZ_ISINS = 20
+HEUTE = datetime.date(2024, 6, 28)
+ERSTER_TAG = datetime.date(2024, 1, 2)
+LETZTER_TAG_DB = datetime.date(2024, 3, 28)     # danach fehlen die Kurse (5 Abfragen pro ISIN)
+
+LATENZ = 0.02           # s pro Abfrage
+FEHLERQUOTE = 0.05      # Anteil der Antworten mit Status 500 (nur "server")
+
+def isin(nr:int) -> str:
+    return "XX%010d" % nr
+
+def kurs(nr:int, tag:datetime.date) -> float:
+    return round(100.0 + nr + (tag - ERSTER_TAG).days * 0.1, 4)
+
+def handelstage(von:datetime.date, bis:datetime.date):
+    tag = von
+    while tag <= bis:
+        if tag.weekday() < 5:
+            yield tag
+        tag += datetime.timedelta(days=1)
+
+class Stammdaten:
+    def get_entry(self, isin_:str):
+        nr = int(isin_[2:])
+        return {
+            STAMMDATEN_NAME: "Fonds %d" % nr,
+            STAMMDATEN_TYP: STAMMDATEN_TYP_FUND,
+            STAMMDATEN_KURSWAEHRUNG: "EUR",
+            ONVISTA_ENTITY: "F%d" % nr,
+            ONVISTA_NOTATION: str(1000 + nr),
+        }
+
+class Erzeuger:
+    """ Downloader mit künstlichen Onvista-Antworten (alle Kurse ab `startDate` bis HEUTE)
+    """
+    def get_url(self, url:str):
+        teile = urllib.parse.urlsplit(url)
+        param = urllib.parse.parse_qs(teile.query)
+        nr = int(param["idNotation"][0]) - 1000
+        tage = list(handelstage(datetime.date.fromisoformat(param["startDate"][0]), HEUTE))
+        dj = {
+            "market": {"name": "KVG"},
+            "isoCurrency": "EUR",
+            "datetimeLast": [calendar.timegm(tag.timetuple()) for tag in tage],
+            "last": [kurs(nr, tag) for tag in tage],
+            "low": [kurs(nr, tag) for tag in tage],
+            "high": [kurs(nr, tag) for tag in tage],
+            "volume": [0 for _ in tage],
+        }
+        return 200, json.dumps(dj).encode("utf-8"), {"encoding": "utf-8", "headers": {"Content-Type": "application/json"}}
+
+def erzeuge_aufzeichnung(verzeichnis:str) -> None:
+    dl = AufzeichnenderDownloader(Erzeuger(), verzeichnis)
+    stammdaten = Stammdaten()
+    for nr in range(ANZ_ISINS):
+        dat = stammdaten.get_entry(isin(nr))
+        dl.get_url(f"{ONVISTA_API_URL}/api/v1/instruments/FUND/{dat[ONVISTA_ENTITY]}/eod_history"
+                   f"?idNotation={dat[ONVISTA_NOTATION]}&range=M1&startDate={ERSTER_TAG.isoformat()}&withEarnings=false")
+
+def erzeuge_kursedb(filename:str) -> KurseDB:
+    if os.path.exists(filename):
+        os.remove(filename)
+    kursedb = KurseDB.open_sqlite(filename=filename, schema="sql/kurse.sql")
+    for nr in range(ANZ_ISINS):
+        kursedb.insert_isin(isin(nr))
+        kursedb.insert_kurse(isin(nr), datalist=[{KURSEDB_DATUM: tag, KURSEDB_SCHLUSSKURS: kurs(nr, tag)}
+                                                 for tag in handelstage(ERSTER_TAG, LETZTER_TAG_DB)])
+    kursedb.commit()
+    return kursedb
+
+def lauf(verzeichnis:str, *, art:str, threads:int):
+    kursedb = erzeuge_kursedb(os.path.join(verzeichnis, "kurse.db"))
+    stammdaten = Stammdaten()
+    vorher = kursedb.count_kurse()
+    server = None
+    try:
+        if art == "wiedergabe":
+            downloader = WiedergabeDownloader(os.path.join(verzeichnis, "aufzeichnung"),
+                                              latenz=LATENZ)
+            config = None
+        else:
+            from lib.simpledownloader import SimpleDownloader
+            server = StandInServer(os.path.join(verzeichnis, "aufzeichnung"),
+                                   latenz=LATENZ, fehlerquote=FEHLERQUOTE, seed=1).start()
+            inifile = os.path.join(verzeichnis, "bench.ini")
+            with open(inifile, "w") as fout:
+                fout.write("[onvista]\napi_url=%s\n" % server.basis_url)
+            config = Config(inifile)
+            # kurze Abstände, damit Latenz und Parallelität den Ausschlag geben
+            downloader = GedrosselterDownloader(SimpleDownloader(backoff=0.01), abstand=0.005, kapazitaet=threads, zufall=0)
+        abfrager = init_abfragemodule(downloader=downloader, config=config, stammdaten=stammdaten, ids=["onvista"])
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            refresh_datenbank(config=config, downloader=downloader, kursedb=kursedb, stammdaten=stammdaten,
+                              abfrager=abfrager, threads=threads, heute=HEUTE)
+        dauer = time.perf_counter() - start
+        neue = kursedb.count_kurse() - vorher
+    finally:
+        kursedb.close()
+        if server is not None:
+            server.stop()
+    return dauer, neue
+
+def main():
+    erwartet = ANZ_ISINS * len(list(handelstage(LETZTER_TAG_DB + datetime.timedelta(days=1), HEUTE)))
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        erzeuge_aufzeichnung(os.path.join(verzeichnis, "aufzeichnung"))
+        print("%d ISINs, Latenz %.0f ms, Fehlerquote %.0f %%, %d neue Kurse erwartet" % (
+            ANZ_ISINS, LATENZ * 1000, FEHLERQUOTE * 100, erwartet))
+        print("%-12s %8s %10s %8s" % ("Art", "Threads", "Laufzeit s", "Kurse"))
+        for art in ["wiedergabe", "server"]:
+            for threads in [1, REFRESH_THREADS]:
+                dauer, neue = lauf(verzeichnis, art=art, threads=threads)
+                print("%-12s %8d %10.2f %8d%s" % (art, threads, dauer, neue, "" if neue == erwartet else "  (unvollständig)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ import datetime
 
 import argparse
 
-from lib.simpledownloader import SimpleDownloader
 from lib.kursedb import *
 from lib.stammdaten import *
 from lib.depot import *
@@ -13,33 +12,229 @@ from lib.transaktionen import *
 from lib.utils import *
 from lib.isincheck import isin_check
 from lib.config import Config
+from lib.pruefung import pruefe_eingabedaten
 from lib.messages import messages
 
 CONFIGFILE = "config.ini"
 
+# Ressourcen, die die Unterbefehle benötigen können (siehe `benoetigt` bei argparse)
+RES_DOWNLOADER = "downloader"
+RES_STAMMDATEN = "stammdaten"
+RES_DEPOTS = "depots"
+RES_TRANSAKTIONEN = "transaktionen"
+RES_KURSEDB = "kursedb"
+RES_KURSEDB_LESEN = "kursedb_lesen"
+
+class Ressourcen:
+    """ Lädt (und prüft) die Daten erst beim ersten Zugriff
+
+        Jeder Unterbefehl gibt an, welche Ressourcen er benötigt. Diese werden vor dem Aufruf
+        geladen, damit Fehler in den Daten einheitlich gemeldet werden. Alles andere wird
+        nicht angefasst.
+    """
+    def __init__(self, cfg:Config):
+        self.cfg = cfg
+        self._dl = None
+        self._stammdaten = None
+        self._depots = None
+        self._transaktionen = None
+        self._kursedb = None
+        self.sql_statistik = None           # Schwelle für langsame Abfragen in ms (None = keine Statistik)
+        self.offline = False                # Web-Abfragen nur aus dem Zwischenspeicher
+        self.aufzeichnen = None             # Verzeichnis für die Aufzeichnung der Web-Abfragen
+        self.wiedergabe = None              # Verzeichnis mit aufgezeichneten Web-Abfragen
+
+    def lade(self, namen) -> None:
+        # Transaktionen zuerst: dann werden alle Yaml-Dateien in einem Durchlauf geprüft
+        if RES_TRANSAKTIONEN in namen:
+            self.transaktionen
+        for name in namen:
+            getattr(self, name)
+
+    @property
+    def downloader(self):
+        # Ein Downloader für "Refresh"
+        if self._dl is None and self.wiedergabe is not None:
+            from lib.aufzeichnung import WiedergabeDownloader
+            self._dl = WiedergabeDownloader(self.wiedergabe)
+        if self._dl is None:
+            from lib.simpledownloader import SimpleDownloader
+            cache = None
+            cache_cfg = self.cfg.get_httpcache()
+            if cache_cfg is not None:
+                from lib.httpcache import HttpCache
+                cache = HttpCache.open_cache(offline=self.offline, **cache_cfg)
+            elif self.offline:
+                raise ValueError("--offline benötigt den Eintrag `httpcache` in [databases]")
+            self._dl = SimpleDownloader(cache=cache)
+            if self.aufzeichnen is not None:
+                from lib.aufzeichnung import AufzeichnenderDownloader
+                self._dl = AufzeichnenderDownloader(self._dl, self.aufzeichnen)
+        return self._dl
+
+    def _lade_yaml(self, *, transaktionen:bool) -> None:
+        """ Yaml-Dateien laden und gemeinsam prüfen (ein Durchlauf, alle Verstöße auf einmal)
+
+            Stammdaten und Depots werden immer zusammen geladen, die Transaktionen (und deren
+            Verweise auf Stammdaten und Depots) nur, wenn sie gebraucht werden. Bereits geladene
+            Objekte werden weiterverwendet.
+        """
+        # Wertpapier-Stammdaten und Depots
+        stammdaten = self._stammdaten
+        if stammdaten is None:
+            stammdaten = Stammdaten(self.cfg.get_filename_stammdaten())
+        depots = self._depots
+        if depots is None:
+            depots = Depot_Stammdaten(self.cfg.get_filename_depots())
+
+        trans = None
+        if transaktionen:
+            # Transaktionen (Käufe, Verkäufe, Ausschüttungen), ISINs erst nach der Prüfung
+            trans = Transaktionen(
+                self.cfg.get_filename_portfolio(),
+                self.cfg.get_filename_ausschuettungen(),
+                depots=depots,
+                isinliste=None)
+
+        # erst prüfen, dann auf die Daten zugreifen
+        pruefe_eingabedaten(stammdaten=stammdaten, depots=depots, transaktionen=trans)
+
+        # Prüfsummen-Check
+        # bei Dummy-ISINs überspringen
+        isinliste = stammdaten.get_all_isins()
+        for isin in isinliste:
+            entry = stammdaten.get_entry(isin)
+            if str(entry.get(STAMMDATEN_TYP)).lower() in [STAMMDATEN_TYP_CURRENCY, STAMMDATEN_TYP_INDEX]:
+                isin_check.set_skip_check_for(isin)
+
+        self._stammdaten = stammdaten
+        self._depots = depots
+        if trans is not None:
+            trans.isinliste = isinliste
+            self._transaktionen = trans
+
+    @property
+    def stammdaten(self):
+        if self._stammdaten is None:
+            self._lade_yaml(transaktionen=False)
+        return self._stammdaten
+
+    @property
+    def depots(self):
+        if self._depots is None:
+            self._lade_yaml(transaktionen=False)
+        return self._depots
+
+    @property
+    def transaktionen(self):
+        if self._transaktionen is None:
+            self._lade_yaml(transaktionen=True)
+        return self._transaktionen
+
+    def _oeffne_kursedb(self, *, readonly:bool):
+        kursedb = KurseDB.open_sqlite(
+            filename=self.cfg.get_filename_kursdatenbank(),
+            schema="sql/kurse.sql",
+            profile=self.cfg.get_sqlite_profil(),
+            readonly=readonly)
+        # Kursreihen bei Auswertungen nur einmal aus der Datenbank lesen
+        kursedb.aktiviere_kurscache()
+        if self.sql_statistik is not None:
+            kursedb.enable_query_stats(slow_ms=self.sql_statistik)
+        return kursedb
+
+    def download_statistik_ausgabe(self) -> None:
+        """ Abfragen und Laufzeiten der Web-Zugriffe pro Host ausgeben
+        """
+        if self._dl is None:
+            return
+
+        titel = "Download-Statistik"
+        print()
+        print(titel)
+        print("=" * len(titel))
+        print("%-25s %7s %6s %6s %10s %9s %9s" % ("Host", "Anzahl", "Wdh.", "Fehler", "Summe ms", "Max ms", "kB"))
+        for zeile in self._dl.statistik_zeilen():
+            print("%-25s %7d %6d %6d %10.1f %9.1f %9.1f" % zeile)
+        cache = self._dl.cache
+        if cache is not None:
+            print("Zwischenspeicher: %d Treffer, %d bestätigt (304), %d neu gespeichert" % (
+                cache.treffer, cache.bestaetigt, cache.gespeichert))
+
+    def sql_statistik_ausgabe(self, anzahl:int=20) -> None:
+        """ Laufzeiten der Abfragen an die Kursdatenbank ausgeben
+
+        :param anzahl: nur die Abfragen mit der größten Gesamtlaufzeit, defaults to 20
+        :type anzahl: int
+        """
+        if self._kursedb is None or self._kursedb.query_stats is None:
+            return
+        stats = self._kursedb.query_stats
+
+        titel = "SQL-Statistik"
+        print()
+        print(titel)
+        print("=" * len(titel))
+        print("%7s %10s %9s  %s" % ("Anzahl", "Summe ms", "Max ms", "Abfrage"))
+        for query, count, total, maximum in stats.rows()[:anzahl]:
+            print("%7d %10.2f %9.2f  %s" % (count, total, maximum, query))
+
+        if stats.slow:
+            titel = "Langsame Abfragen (ab %g ms)" % stats.slow_ms
+            print()
+            print(titel)
+            print("=" * len(titel))
+            for ms, query, params, plan in stats.slow:
+                print("%.2f ms: %s" % (ms, " ".join(query.split())))
+                if params:
+                    print("   Parameter:", params)
+                for zeile in plan or []:
+                    print("   Plan:", zeile)
+
+    @property
+    def kursedb(self):
+        # Kursdatenbank (lesen und schreiben, falls nicht vorher über `kursedb_lesen` geöffnet)
+        if self._kursedb is None:
+            self._kursedb = self._oeffne_kursedb(readonly=False)
+        return self._kursedb
+
+    @property
+    def kursedb_lesen(self):
+        # Kursdatenbank nur lesen: Auswertungen laufen so auch während eines Imports
+        if self._kursedb is None:
+            self._kursedb = self._oeffne_kursedb(readonly=True)
+        return self._kursedb
+
 def isin_stammdaten_anzeigen(args):
-    global stammdaten
+    global ressourcen
 
     import lib.module.zeige_stammdaten
 
     assert isin_check.check_list(args.isins)
 
     lib.module.zeige_stammdaten.stammdaten_anzeigen(
-        stammdaten,
+        ressourcen.stammdaten,
         args.isins,
         kurz=args.kurz
     )
 
 def alle_db_isins(args):
-    global stammdaten
-    global kursedb
+    global ressourcen
 
     import lib.module.kursdatenbankinfo
 
-    lib.module.kursdatenbankinfo.alle_db_isins(kursedb=kursedb, stammdaten=stammdaten)
+    lib.module.kursdatenbankinfo.alle_db_isins(kursedb=ressourcen.kursedb, stammdaten=ressourcen.stammdaten)
+
+def db_reorganisieren(args):
+    global ressourcen
+
+    if ressourcen.kursedb.reorganisiere_kurse():
+        print("Kursdatenbank neu aufgebaut")
+    else:
+        print("Kursdatenbank ist bereits reorganisiert")
 
 def online_lookup(args):
-    global dl, stammdaten, cfg
+    global ressourcen
 
     import lib.module.kurse_online
 
@@ -48,32 +243,31 @@ def online_lookup(args):
 
     abfragedatum = datetime.datetime.strptime(args.datum, "%d.%m.%Y").date()
     lib.module.kurse_online.online_kurs_lookup(
-        downloader=dl,
+        downloader=ressourcen.downloader,
         isin=isin,
         abfragedatum=abfragedatum,
-        stammdaten=stammdaten,
-        config=cfg)
+        stammdaten=ressourcen.stammdaten,
+        config=ressourcen.cfg)
 
 def db_kursvergleich(args):
     import lib.module.kursvergleich
-    global stammdaten, kursedb
+    global ressourcen
 
     assert isin_check.check_list(args.isins)
 
     lib.module.kursvergleich.db_kursvergleich(
         args.isins,
         startdatum=datetime.datetime.strptime(args.startdatum, "%d.%m.%Y").date(),
-        kursedb=kursedb,
-        stammdaten=stammdaten,
+        kursedb=ressourcen.kursedb,
+        stammdaten=ressourcen.stammdaten,
         savesvg=args.savesvg
     )
 
 def db_kursvergleiche_gespeichert(args):
-    global cfg
     import lib.module.kursvergleich
-    global stammdaten, kursedb
+    global ressourcen
 
-    params = cfg.get_gespeicherter_kursvergleich(args.name)
+    params = ressourcen.cfg.get_gespeicherter_kursvergleich(args.name)
     # argparse stellt sicher, dass nur gespeicherte Keys angegeben werden.
     assert params is not None
 
@@ -92,15 +286,14 @@ def db_kursvergleiche_gespeichert(args):
     lib.module.kursvergleich.db_kursvergleich(
         isins,
         startdatum=datetime.datetime.strptime(startdatum, "%d.%m.%Y").date(),
-        kursedb=kursedb,
-        stammdaten=stammdaten,
+        kursedb=ressourcen.kursedb,
+        stammdaten=ressourcen.stammdaten,
         savesvg=args.savesvg
     )
 
 
 def db_abfrage(args):
-    global stammdaten
-    global kursedb
+    global ressourcen
 
     import lib.module.kursdatenbankinfo
 
@@ -112,48 +305,46 @@ def db_abfrage(args):
     lib.module.kursdatenbankinfo.kursabfrage(
         isin=isin,
         datum=abfragedatum,
-        kursedb=kursedb,
-        stammdaten=stammdaten
+        kursedb=ressourcen.kursedb,
+        stammdaten=ressourcen.stammdaten
     )
 
 def do_transaktionen(args):
-    global transaktionen
-    global stammdaten
+    global ressourcen
 
-    assert isin_check.check_list(args.isins)
+    assert isin_check.check_list(args.isin)
 
     import lib.module.zeige_transaktionen
-    lib.module.zeige_transaktionen.zeige_transaktionen.zeige_transaktionen(
-        transaktionen=transaktionen,
-        stammdaten=stammdaten,
+    lib.module.zeige_transaktionen.zeige_transaktionen(
+        transaktionen=ressourcen.transaktionen,
+        stammdaten=ressourcen.stammdaten,
         isin=args.isin,
         depot=args.depot
     )
 
 
 def do_refresh(args):
-    global kursedb
-    global dl
-    global stammdaten
+    global ressourcen
 
     import lib.module.kurse_online
 
     try:
         lib.module.kurse_online.refresh_datenbank(
-            downloader=dl,
-            kursedb=kursedb,
-            stammdaten=stammdaten,
-            config=cfg,
+            downloader=ressourcen.downloader,
+            kursedb=ressourcen.kursedb,
+            stammdaten=ressourcen.stammdaten,
+            config=ressourcen.cfg,
             ignore=k2p(args.ignore),
-            verbose=args.verbose
+            verbose=args.verbose,
+            budget=args.budget,
+            alle=args.alle,
+            gleichzeitig=args.gleichzeitig
         )
     except ValueError as msg:
         messages.error(msg)
 
 def do_vorabpauschale_jahr(args):
-    global kursedb
-    global stammdaten
-    global transaktionen
+    global ressourcen
 
     import lib.module.vorabpauschale
 
@@ -161,22 +352,20 @@ def do_vorabpauschale_jahr(args):
         isin=args.isin,
         jahr=args.jahr,
         depot=args.depot,
-        kursedb=kursedb,
-        transaktionen=transaktionen,
-        stammdaten=stammdaten
+        kursedb=ressourcen.kursedb,
+        transaktionen=ressourcen.transaktionen,
+        stammdaten=ressourcen.stammdaten
     )
 
 def do_csv(args):
     import lib.module.csv_einlesen
 
-    global cfg
-    global stammdaten
-    global kursedb
+    global ressourcen
 
     lib.module.csv_einlesen.do_csv_einlesen(
-        cfg=cfg,
-        stammdaten=stammdaten,
-        kursedb=kursedb,
+        cfg=ressourcen.cfg,
+        stammdaten=ressourcen.stammdaten,
+        kursedb=ressourcen.kursedb,
         create_new_fonds=args.neue,
         only_newer_entries=False,      # not args.alte,
         ignore=k2p(args.ignore),
@@ -186,51 +375,43 @@ def do_csv(args):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Depotauswertung')
 
-    try:
-        # Konfiguration
-        cfg = Config(CONFIGFILE)
-
-        # Ein Downloader für "Refresh"
-        dl = SimpleDownloader()
-
-        # Wertpapier-Stammdaten
-        stammdaten = Stammdaten(cfg.get_filename_stammdaten())
-        stammdaten.base_check()
-
-        # Prüfsummen-Check
-        # bei Dummy-ISINs überspringen
-        isinliste = stammdaten.get_all_isins()
-        for isin in isinliste:
-            entry = stammdaten.get_entry(isin)
-            if entry[STAMMDATEN_TYP].lower() in [STAMMDATEN_TYP_CURRENCY, STAMMDATEN_TYP_INDEX]:
-                isin_check.set_skip_check_for(isin)
-
-        # Depots
-        depots = Depot_Stammdaten(cfg.get_filename_depots())
-        depots.base_check()
-
-        # Transaktionen (Käufe, Verkäufe, Ausschüttungen)
-        transaktionen = Transaktionen(cfg.get_filename_portfolio(), cfg.get_filename_ausschuettungen(), depots=depots, isinliste=isinliste)
-        transaktionen.base_check()
-
-        # Kursdatenbank
-        kursedb = KurseDB.open_sqlite(filename=cfg.get_filename_kursdatenbank(), schema="sql/kurse.sql")
-
-        # Namen der gespeicherten Kursvergleiche für argparse
-        gespeicherte_kursvergleiche = cfg.get_namen_kursvergleiche()
-    except FileNotFoundError as msg:
-        print("*** Datei/Verzeichnis nicht gefunden:", msg.filename)
-        parser.exit(101)
-    except ValueError as msg:
-        print("**** Wertefehler:", msg)
-        parser.exit(102)
+    # Konfiguration
+    cfg = Config(CONFIGFILE)
+    ressourcen = Ressourcen(cfg)
 
+    # Namen der gespeicherten Kursvergleiche für argparse
+    gespeicherte_kursvergleiche = cfg.get_namen_kursvergleiche()
 
     parser.add_argument('--verbose', '-v',
         action='store_true',
         default=False,
         help='mehr Ausgaben')
 
+    parser.add_argument('--offline',
+        action='store_true',
+        default=False,
+        help='Web-Abfragen nur aus dem Zwischenspeicher beantworten (siehe `httpcache` in der Konfigdatei)')
+
+    parser.add_argument('--aufzeichnen',
+        type=str,
+        default=None,
+        metavar='VERZ',
+        help='Antworten der Web-Abfragen im Verzeichnis VERZ speichern')
+
+    parser.add_argument('--wiedergabe',
+        type=str,
+        default=None,
+        metavar='VERZ',
+        help='Web-Abfragen nur aus den Aufzeichnungen im Verzeichnis VERZ beantworten (ohne Internet)')
+
+    parser.add_argument('--sql-statistik',
+        type=float,
+        nargs='?',
+        const=50.0,
+        default=None,
+        metavar='MS',
+        help='Laufzeiten der Datenbankabfragen ausgeben, Abfragen ab MS Millisekunden (Vorgabe 50) mit Abfrageplan')
+
     subparsers = parser.add_subparsers(title='Unterbefehle',
                                     description='gültige Unterbefehle',
                                     help='zusätzliche Hilfe')
@@ -238,57 +419,77 @@ if __name__ == "__main__":
     parser_a = subparsers.add_parser('stammdaten', help='zeige Stammdaten zu ISIN')
     parser_a.add_argument('--kurz', '--short', action="store_true", help='nur bestimmte Keys zeigen')
     parser_a.add_argument('isins', type=str, nargs="+", help='ISIN-Nummer(n)')
-    parser_a.set_defaults(func=isin_stammdaten_anzeigen)
+    parser_a.set_defaults(func=isin_stammdaten_anzeigen, benoetigt=[RES_STAMMDATEN])
 
     parser_a = subparsers.add_parser('transaktionen', help='Transaktionen anzeigen')
     parser_a.add_argument('isin', type=str, help='ISIN-Nummer')
     parser_a.add_argument('depot', type=str, nargs="?", help='optional: Depot')
-    parser_a.set_defaults(func=do_transaktionen)
+    parser_a.set_defaults(func=do_transaktionen, benoetigt=[RES_STAMMDATEN, RES_TRANSAKTIONEN])
 
     parser_a = subparsers.add_parser('db_isins', help='zeige ISINs in Kursdatenbank')
-    parser_a.set_defaults(func=alle_db_isins)
+    parser_a.set_defaults(func=alle_db_isins, benoetigt=[RES_STAMMDATEN, RES_KURSEDB_LESEN])
+
+    parser_a = subparsers.add_parser('db_reorganisieren', help='Kurse in der Datenbank nach ISIN und Datum geordnet neu speichern')
+    parser_a.set_defaults(func=db_reorganisieren, benoetigt=[RES_KURSEDB])
 
     parser_a = subparsers.add_parser('db_kurs', help='Kursabfrage in offline Datenbank')
     parser_a.add_argument('isin', type=str, help='ISIN-Nummer')
     parser_a.add_argument('datum', type=str, help='TT.MM.JJJJ')
-    parser_a.set_defaults(func=db_abfrage)
+    parser_a.set_defaults(func=db_abfrage, benoetigt=[RES_STAMMDATEN, RES_KURSEDB_LESEN])
 
     parser_a = subparsers.add_parser('kursvergleich', help='Offline-Kursplot zweier oder mehrerer ISINs')
     parser_a.add_argument('--savesvg', action="store_true", help="Grafik in /tmp speichern")
     parser_a.add_argument('startdatum', type=str, help='TT.MM.JJJJ')
     parser_a.add_argument('isins', type=str, nargs="+", help='ISIN-Nummern')
-    parser_a.set_defaults(func=db_kursvergleich)
+    parser_a.set_defaults(func=db_kursvergleich, benoetigt=[RES_STAMMDATEN, RES_KURSEDB_LESEN])
 
     parser_a = subparsers.add_parser('kv', help='Offline-Kursplot mit vordefinierten Abfragen')
     parser_a.add_argument('--savesvg', action="store_true", help="Grafik in /tmp speichern")
     parser_a.add_argument('name', type=str, choices=gespeicherte_kursvergleiche, help='Name der KV-Konfiguration')
     parser_a.add_argument('startdatum', type=str, nargs="?", help='TT.MM.JJJJ')
-    parser_a.set_defaults(func=db_kursvergleiche_gespeichert)
+    parser_a.set_defaults(func=db_kursvergleiche_gespeichert, benoetigt=[RES_STAMMDATEN, RES_KURSEDB_LESEN])
 
     parser_a = subparsers.add_parser('csv', help='Kurse aus CSV-Dateien einlesen')
     parser_a.add_argument('--neue', action="store_true", help='Anlegen neuer Fonds ermöglichen')
     # parser_a.add_argument('--alte', action="store_true", help='Anlegen von Einträgen vor neustem Eintrag ermöglichen')
     parser_a.add_argument('--ignore', type=str, help='Ignoriere Unstimmigkeiten beim Anschluss (abs.)')
-    parser_a.set_defaults(func=do_csv)
+    parser_a.set_defaults(func=do_csv, benoetigt=[RES_STAMMDATEN, RES_KURSEDB])
 
     parser_a = subparsers.add_parser('refresh', help='neue Kurse holen')
     parser_a.add_argument('--ignore', type=str, help='Ignoriere Unstimmigkeiten beim Anschluss (abs.)')
-    parser_a.set_defaults(func=do_refresh)
+    parser_a.add_argument('--budget', type=int, help='höchstens so viele Web-Abfragen (die ältesten Kurse zuerst)')
+    parser_a.add_argument('--alle', action="store_true", help='auch ISINs abfragen, deren Kurse aktuell sind')
+    parser_a.add_argument('--gleichzeitig', action="store_true", help='alle Abfragemodule gleichzeitig fragen, die erste gültige Antwort gilt')
+    parser_a.set_defaults(func=do_refresh, benoetigt=[RES_DOWNLOADER, RES_STAMMDATEN, RES_KURSEDB])
 
     parser_a = subparsers.add_parser('vorab', help='Alle Vorabpauschalen berechnen')
     parser_a.add_argument('jahr', type=int, help='Jahr')
     parser_a.add_argument('--isin', type=str, help='eingrenzen auf ISIN')
     parser_a.add_argument('--depot', type=str, help='eingrenzen auf Depot')
-    parser_a.set_defaults(func=do_vorabpauschale_jahr)
+    parser_a.set_defaults(func=do_vorabpauschale_jahr, benoetigt=[RES_STAMMDATEN, RES_TRANSAKTIONEN, RES_KURSEDB_LESEN])
 
     parser_a = subparsers.add_parser('online_lookup', help='Online-Kursabfrage')
     parser_a.add_argument('isin', type=str, help='ISIN-Nummer')
     parser_a.add_argument('datum', type=str, help='TT.MM.JJJJ')
-    parser_a.set_defaults(func=online_lookup)
+    parser_a.set_defaults(func=online_lookup, benoetigt=[RES_DOWNLOADER, RES_STAMMDATEN])
 
     args = parser.parse_args()
+    ressourcen.sql_statistik = args.sql_statistik
+    ressourcen.offline = args.offline
+    ressourcen.aufzeichnen = args.aufzeichnen
+    ressourcen.wiedergabe = args.wiedergabe
     func = getattr(args, "func", None)
     if func is not None:
+        # Benötigte Daten laden und prüfen
+        try:
+            ressourcen.lade(args.benoetigt)
+        except FileNotFoundError as msg:
+            print("*** Datei/Verzeichnis nicht gefunden:", msg.filename)
+            parser.exit(101)
+        except ValueError as msg:
+            print("**** Wertefehler:", msg)
+            parser.exit(102)
+
         try:
             args.func(args)
         except AssertionError as msg:
@@ -299,6 +500,9 @@ if __name__ == "__main__":
         parser.print_help()
 
     messages.ausgabe(verbose=False)
+    ressourcen.sql_statistik_ausgabe()
+    if args.verbose:
+        ressourcen.download_statistik_ausgabe()
     if messages.has_errors():
         parser.exit(1)
     parser.exit(0)                    # = sys.exit(0)
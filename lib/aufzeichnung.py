@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Aufzeichnung und Wiedergabe von Web-Abfragen (für Tests und Benchmarks ohne Internet)
+#
+# AufzeichnenderDownloader   speichert jede Antwort eines anderen Downloaders als JSON-Datei
+# Aufzeichnung               beantwortet URLs aus einem Verzeichnis mit solchen Dateien
+# WiedergabeDownloader       Downloader, der nur die Aufzeichnung nutzt
+# StandInServer              lokaler HTTP-Server mit denselben Antworten
+#
+# Gesucht wird nach Pfad und Query der URL (ohne Host), damit aufgezeichnete Abfragen an
+# api.onvista.de auch vom lokalen Server beantwortet werden können. Für Onvista-Abfragen
+# (".../eod_history") mit einem anderen Startdatum wird die Antwort aus allen Aufzeichnungen
+# derselben Notation zusammengesetzt: die Kurse eines Monats ab `startDate`.
+#
+# Latenz und Fehlerquote sind einstellbar; Fehler werden mit Status 500 beantwortet.
+
+import datetime
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+AUFZEICHNUNG_FEHLERSTATUS = 500
+
+_EOD_HISTORY = "/eod_history"
+_EOD_REIHEN = ["datetimeLast", "last", "low", "high", "volume"]
+
+def _schluessel(url:str) -> str:
+    teile = urllib.parse.urlsplit(url)
+    if teile.query:
+        return teile.path + "?" + teile.query
+    return teile.path
+
+def _monat_spaeter(tag:datetime.date) -> datetime.date:
+    jahr, monat = divmod(tag.month, 12)
+    jahr += tag.year
+    monat += 1
+    while True:
+        try:
+            return tag.replace(year=jahr, month=monat)
+        except ValueError:
+            tag = tag - datetime.timedelta(days=1)
+
+class AufzeichnenderDownloader:
+    """ Downloader, der alle Antworten zusätzlich in `verzeichnis` speichert
+    """
+    def __init__(self, downloader, verzeichnis:str):
+        self.downloader = downloader
+        self.verzeichnis = verzeichnis
+        os.makedirs(verzeichnis, exist_ok=True)
+
+    def __getattr__(self, name):
+        # z.B. `statistik_zeilen`, `cache` des eigentlichen Downloaders
+        return getattr(self.downloader, name)
+
+    def aus_cache(self, url:str):
+        # Treffer im Zwischenspeicher des Downloaders werden ebenfalls aufgezeichnet
+        aus_cache = getattr(self.downloader, "aus_cache", None)
+        res = aus_cache(url) if aus_cache is not None else None
+        if res is not None:
+            self._speichere(url, *res)
+        return res
+
+    def get_url(self, url:str):
+        status, data, info = self.downloader.get_url(url)
+        self._speichere(url, status, data, info)
+        return status, data, info
+
+    def _speichere(self, url:str, status:int, data:bytes, info:dict) -> None:
+        info = info or {}
+        eintrag = {
+            "url": url,
+            "status": status,
+            "encoding": info.get("encoding"),
+            "headers": dict(info.get("headers") or {}),
+            "zeit": time.time(),
+            "inhalt": data.decode("utf-8", errors="surrogateescape") if data is not None else None
+        }
+        filename = os.path.join(self.verzeichnis, hashlib.sha1(url.encode("utf-8")).hexdigest()[:20] + ".json")
+        with open(filename, "w", encoding="utf-8", errors="surrogateescape") as fout:
+            json.dump(eintrag, fout, ensure_ascii=False, indent=1)
+
+class Aufzeichnung:
+    """ Aufgezeichnete Antworten eines Verzeichnisses
+    """
+    def __init__(self, verzeichnis:str):
+        self.eintraege = {}         # Pfad+Query -> Eintrag
+        for filename in sorted(os.listdir(verzeichnis)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(verzeichnis, filename), "r", encoding="utf-8", errors="surrogateescape") as fin:
+                eintrag = json.load(fin)
+            self.eintraege[_schluessel(eintrag["url"])] = eintrag
+
+    def antwort(self, url:str):
+        """ Antwort auf eine URL
+
+        :return: (status, inhalt, info) oder None (nicht aufgezeichnet)
+        """
+        schluessel = _schluessel(url)
+        eintrag = self.eintraege.get(schluessel)
+        if eintrag is not None:
+            inhalt = eintrag["inhalt"]
+            inhalt = inhalt.encode("utf-8", errors="surrogateescape") if inhalt is not None else b""
+            return eintrag["status"], inhalt, {"encoding": eintrag["encoding"], "headers": eintrag["headers"]}
+        return self._eod_history(schluessel)
+
+    def _eod_history(self, schluessel:str):
+        pfad, _, query = schluessel.partition("?")
+        if not pfad.endswith(_EOD_HISTORY):
+            return None
+        param = urllib.parse.parse_qs(query)
+        if "startDate" not in param:
+            return None
+        start = datetime.date.fromisoformat(param["startDate"][0])
+        ende = _monat_spaeter(start)
+        notation = param.get("idNotation")
+
+        # alle Kurse derselben Notation
+        kurse = {}
+        vorlage = None
+        for key, eintrag in self.eintraege.items():
+            epfad, _, equery = key.partition("?")
+            if epfad != pfad or urllib.parse.parse_qs(equery).get("idNotation") != notation or eintrag["status"] != 200:
+                continue
+            dj = json.loads(eintrag["inhalt"])
+            vorlage = dj
+            for werte in zip(*[dj[reihe] for reihe in _EOD_REIHEN]):
+                kurse[werte[0]] = werte
+        if vorlage is None:
+            return None
+
+        dj = {key: value for key, value in vorlage.items() if key not in _EOD_REIHEN}
+        auswahl = [kurse[ts] for ts in sorted(kurse)
+                   if start <= datetime.datetime.utcfromtimestamp(ts).date() < ende]
+        for nr, reihe in enumerate(_EOD_REIHEN):
+            dj[reihe] = [werte[nr] for werte in auswahl]
+        return 200, json.dumps(dj).encode("utf-8"), {"encoding": "utf-8", "headers": {"Content-Type": "application/json"}}
+
+class WiedergabeDownloader:
+    """ Downloader, der nur aus einer Aufzeichnung antwortet
+
+    :param aufzeichnung: Aufzeichnung oder Verzeichnis
+    :param latenz: Verzögerung pro Abfrage in s, defaults to 0
+    :param fehlerquote: Anteil der Abfragen, die mit Status 500 beantwortet werden, defaults to 0
+    :param seed: Startwert für die Auswahl der Fehler, defaults to None
+    """
+    # Drosselung überflüssig (siehe `refresh_datenbank`)
+    ohne_drosselung = True
+    cache = None
+
+    def __init__(self, aufzeichnung, *, latenz:float=0.0, fehlerquote:float=0.0, seed=None):
+        if isinstance(aufzeichnung, str):
+            aufzeichnung = Aufzeichnung(aufzeichnung)
+        self.aufzeichnung = aufzeichnung
+        self.latenz = latenz
+        self.fehlerquote = fehlerquote
+        self.zufall = random.Random(seed)
+        self.lock = threading.Lock()
+        self.abfragen = 0
+        self.fehler = 0
+
+    def get_url(self, url:str):
+        with self.lock:
+            self.abfragen += 1
+            fehler = self.zufall.random() < self.fehlerquote
+            if fehler:
+                self.fehler += 1
+        if self.latenz > 0:
+            time.sleep(self.latenz)
+        if fehler:
+            return AUFZEICHNUNG_FEHLERSTATUS, b"", {"encoding": None, "headers": {}}
+        res = self.aufzeichnung.antwort(url)
+        if res is None:
+            return 404, b"", {"encoding": None, "headers": {}}
+        return res
+
+    def statistik_zeilen(self) -> list:
+        """ Statistik wie `SimpleDownloader.statistik_zeilen` (ohne Laufzeiten und Größen)
+        """
+        with self.lock:
+            return [("Wiedergabe", self.abfragen, 0, self.fehler, 0.0, 0.0, 0.0)]
+
+class StandInServer:
+    """ Lokaler HTTP-Server, der aus einer Aufzeichnung antwortet (in einem eigenen Thread)
+
+    with StandInServer(aufzeichnung, latenz=0.05) as server:
+        url = server.basis_url + "/api/v1/..."
+    """
+    def __init__(self, aufzeichnung, *, latenz:float=0.0, fehlerquote:float=0.0, seed=None, port:int=0):
+        import http.server
+
+        if isinstance(aufzeichnung, str):
+            aufzeichnung = Aufzeichnung(aufzeichnung)
+        wiedergabe = WiedergabeDownloader(aufzeichnung, latenz=latenz, fehlerquote=fehlerquote, seed=seed)
+        self.wiedergabe = wiedergabe
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # Header und Inhalt ohne Verzögerung
+
+            def do_GET(self):
+                status, inhalt, info = wiedergabe.get_url(self.path)
+                self.send_response(status)
+                content_type = (info.get("headers") or {}).get("Content-Type", "application/json")
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(inhalt)))
+                self.end_headers()
+                self.wfile.write(inhalt)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.basis_url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = None
+
+    @property
+    def abfragen(self) -> int:
+        return self.wiedergabe.abfragen
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -5,6 +5,8 @@ import configparser
 import re
 import os
 
+from .sqlite import PROFILE_PRAGMAS
+
 CONF_SECTION_DATA = "data"
 CONF_SECTION_DATABASES = "databases"
 CONF_SECTION_KURSVERGLEICHE = "kursvergleiche"
@@ -49,6 +51,33 @@ class Config:
     def get_filename_kursdatenbank(self):
         return os.path.expanduser(self._get(CONF_SECTION_DATABASES, "kurse"))
 
+    def get_httpcache(self):
+        """ Zwischenspeicher für Web-Abfragen aus dem Abschnitt [databases]
+
+        :return: None (kein Eintrag `httpcache`) oder dict mit "filename", "ttl" (s), "max_bytes"
+        :rtype: dict
+        """
+        section = self.get_section(CONF_SECTION_DATABASES)
+        if section is None or "httpcache" not in section:
+            return None
+        res = {"filename": os.path.expanduser(section["httpcache"])}
+        if "httpcache_ttl" in section:
+            res["ttl"] = float(section["httpcache_ttl"])
+        if "httpcache_max_mb" in section:
+            res["max_bytes"] = int(float(section["httpcache_max_mb"]) * 1024 * 1024)
+        return res
+
+    def get_sqlite_profil(self):
+        """ Einstellungen für sqlite aus dem Abschnitt [databases]
+
+        :return: Pragma -> Wert, nur die angegebenen Einträge
+        :rtype: dict
+        """
+        section = self.get_section(CONF_SECTION_DATABASES)
+        if section is None:
+            return {}
+        return {key: section[key] for key in PROFILE_PRAGMAS if key in section}
+
     def get_namen_kursvergleiche(self):
         if CONF_SECTION_KURSVERGLEICHE not in self.cfg.sections():
             return None
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import yaml
 from .yamlbase import YamlBase
 
 DEPOT_ID = "name"
@@ -24,26 +23,43 @@ class Depot_Stammdaten(YamlBase):
         return self.waehrungscache[depotid]
 
     def get_entry(self, depotid):
-        for item in yaml.load_all(open(self.filename, "r", encoding="utf8"), Loader=yaml.SafeLoader):
+        for item in self.iter_entries():
             if item[DEPOT_ID] == depotid:
                 return item
         return None
 
-    def base_check(self):
-        super().base_check()
-        for item in self.iter_entries():
-            self.content_not_empty(item, DEPOT_ID, info=None)
+    def pruefregeln(self, gesehen=None):
+        """ Prüfregeln für die Depots
+
+        :param gesehen: sammelt die Depot-IDs (Prüfung auf doppelte Einträge), defaults to None
+        :type gesehen: set, optional
+        :return: Prüfregeln
+        :rtype: list of function
+        """
+        if gesehen is None:
+            gesehen = set()
+
+        def eindeutig(item):
+            depotid = item[DEPOT_ID]
+            if depotid in gesehen:
+                raise ValueError("Depot-ID mehrfach vergeben: %s" % depotid)
+            gesehen.add(depotid)
+
+        return [
+            lambda item: self.content_not_empty(item, DEPOT_ID, info=""),
+            eindeutig
+        ]
 
     def get_alle_depots(self):
         """ Erzeuge eine Liste aller Depot-IDs
 
         :return: Depot-IDs
         :rtype: list(str)
-        :note: Es wird darauf geachtet, dass die ID nicht mehrfach vorkommt.
+        :note: Jede ID nur einmal; doppelte IDs meldet die Prüfung (`pruefregeln`).
         """
         res = []
         for item in self.iter_entries():
             depotid = item[DEPOT_ID]
-            assert depotid not in res, "Depot-ID mehrfach vergeben: "+depotid
-            res.append(depotid)
+            if depotid not in res:
+                res.append(depotid)
         return res
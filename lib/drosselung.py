@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Drosselung der Web-Abfragen pro Host
+#
+# Jeder Host hat einen eigenen Token-Bucket: alle `abstand` Sekunden kommt ein Token hinzu,
+# höchstens `kapazitaet` Tokens liegen auf Vorrat. Jede Abfrage verbraucht ein Token und
+# zusätzlich eine zufällige Verzögerung bis `zufall` Sekunden. Mit den Vorgaben bleibt der
+# Abstand zweier Abfragen an dieselbe Website wie bisher bei 7-14 s, Abfragen an
+# verschiedene Hosts können aber gleichzeitig (aus mehreren Threads) laufen.
+#
+# Antwortet ein Host mit 429 (bzw. 503) und `Retry-After`, wird er für diese Zeit gesperrt
+# und die Abfrage danach wiederholt.
+#
+# `GedrosselterDownloader.abbrechen` (z.B. nach Strg-C) weckt alle wartenden Threads;
+# sie und alle weiteren Abfragen enden mit `AbfrageAbgebrochen`. Einzelne Abfragen lassen
+# sich über ein eigenes Event abbrechen (Parameter `abbruch` von `get_url` bzw. für alle
+# Abfragen eines Threads `abbruch_im_thread`), z.B. wenn ein anderes Abfragemodul schneller war.
+
+import contextlib
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+
+DROSSEL_ABSTAND = 7.0           # s pro Token
+DROSSEL_ZUFALL = 7.0            # s zufällige Verzögerung (höchstens)
+DROSSEL_KAPAZITAET = 1          # Tokens auf Vorrat
+DROSSEL_WIEDERHOLUNGEN = 3      # nach 429/503
+DROSSEL_SPERRE = 60.0           # s Sperre nach 429/503 ohne (lesbares) Retry-After
+
+_STATUS_UEBERLASTET = [429, 503]
+
+_lokal = threading.local()      # `abbruch` der Abfragen eines Threads
+
+class AbfrageAbgebrochen(Exception):
+    pass
+
+def retry_after(headers, jetzt=None):
+    """ Wartezeit aus dem Header `Retry-After`
+
+    :param headers: Header der Antwort
+    :type headers: dict
+    :param jetzt: aktuelle Zeit (für HTTP-Datum), defaults to None (time.time())
+    :type jetzt: float, optional
+    :return: Sekunden oder None (fehlt/unlesbar)
+    :rtype: float
+    """
+    if headers is None:
+        return None
+    wert = None
+    for key in headers:
+        if key.lower() == "retry-after":
+            wert = headers[key].strip()
+    if not wert:
+        return None
+    if wert.isdigit():
+        return float(wert)
+    try:
+        zeitpunkt = email.utils.parsedate_to_datetime(wert)
+    except (TypeError, ValueError):
+        return None
+    if jetzt is None:
+        jetzt = time.time()
+    return max(0.0, zeitpunkt.timestamp() - jetzt)
+
+@contextlib.contextmanager
+def abbruch_im_thread(abbruch):
+    """ Alle Abfragen dieses Threads (über `GedrosselterDownloader`) mit `abbruch` abbrechbar machen
+
+    :param abbruch: gesetzt = Abfrage abbrechen, None = nur `abbrechen` des Downloaders
+    :type abbruch: threading.Event
+    """
+    alt = getattr(_lokal, "abbruch", None)
+    _lokal.abbruch = abbruch
+    try:
+        yield
+    finally:
+        _lokal.abbruch = alt
+
+class TokenBucket:
+    """ Token-Bucket eines Hosts (threadsicher)
+    """
+    def __init__(self, *, abstand:float=DROSSEL_ABSTAND, kapazitaet:int=DROSSEL_KAPAZITAET,
+                 zufall:float=DROSSEL_ZUFALL, uhr=time.monotonic):
+        self.abstand = abstand
+        self.kapazitaet = kapazitaet
+        self.zufall = zufall
+        self.uhr = uhr
+        self.lock = threading.Lock()
+        # Tokens zum Zeitpunkt `stand` (negativ = bereits reserviert)
+        self.tokens = float(kapazitaet)
+        self.stand = uhr()
+        self.gesperrt_bis = self.stand
+
+    def reserviere(self) -> float:
+        """ Token für eine Abfrage reservieren
+
+        :return: Wartezeit in s bis zur Abfrage
+        :rtype: float
+        """
+        with self.lock:
+            jetzt = self.uhr()
+            if jetzt > self.stand:
+                self.tokens = min(self.kapazitaet, self.tokens + (jetzt - self.stand) / self.abstand)
+                self.stand = jetzt
+            self.tokens -= 1.0 + random.random() * self.zufall / self.abstand
+            return (self.stand - jetzt) + max(0.0, -self.tokens) * self.abstand
+
+    def sperre(self, sekunden:float) -> None:
+        """ Keine Abfragen für `sekunden` s, danach wieder im normalen Abstand
+        """
+        with self.lock:
+            bis = self.uhr() + sekunden
+            if bis > self.gesperrt_bis:
+                self.gesperrt_bis = bis
+            if bis > self.stand:
+                # Tokens sammeln sich während der Sperre weiter an, erst ab `bis` verfügbar
+                self.tokens = min(self.kapazitaet, self.tokens + (bis - self.stand) / self.abstand)
+                self.stand = bis
+
+    def gesperrt(self) -> float:
+        """ Restdauer der Sperre in s (0 = frei)
+        """
+        with self.lock:
+            return max(0.0, self.gesperrt_bis - self.uhr())
+
+    def warte(self, schlafen=time.sleep, abbruch=None) -> None:
+        """ Bis zur nächsten erlaubten Abfrage warten
+
+        :param schlafen: Funktion zum Warten, defaults to time.sleep
+        :param abbruch: gesetzt = nicht weiter warten, defaults to None
+        :type abbruch: threading.Event, optional
+        :raises AbfrageAbgebrochen: `abbruch` wurde gesetzt
+        """
+        while True:
+            if abbruch is not None and abbruch.is_set():
+                raise AbfrageAbgebrochen()
+            wartezeit = self.reserviere()
+            if wartezeit > 0:
+                schlafen(wartezeit)
+            if abbruch is not None and abbruch.is_set():
+                raise AbfrageAbgebrochen()
+            # während des Wartens gesperrt? => neu einreihen
+            if self.gesperrt() == 0:
+                return
+
+class GedrosselterDownloader:
+    """ Downloader mit Drosselung pro Host, sonst wie der übergebene Downloader
+
+    :param downloader: Objekt mit `get_url(url)` -> (status, data, info)
+    :param abstand, kapazitaet, zufall: Vorgaben für die Token-Buckets der Hosts
+    :param wiederholungen: Wiederholungen nach 429/503, defaults to DROSSEL_WIEDERHOLUNGEN
+    :param schlafen: Funktion zum Warten, defaults to None (bis `abbrechen` aufgerufen wird)
+    """
+    def __init__(self, downloader, *, abstand:float=DROSSEL_ABSTAND, kapazitaet:int=DROSSEL_KAPAZITAET,
+                 zufall:float=DROSSEL_ZUFALL, wiederholungen:int=DROSSEL_WIEDERHOLUNGEN,
+                 uhr=time.monotonic, schlafen=None):
+        self.downloader = downloader
+        # 429/503 nur hier wiederholen (mit Sperre des Hosts), nicht zusätzlich im Downloader
+        weitergeben = getattr(downloader, "ueberlastung_weitergeben", None)
+        if weitergeben is not None:
+            weitergeben()
+        self.abstand = abstand
+        self.kapazitaet = kapazitaet
+        self.zufall = zufall
+        self.wiederholungen = wiederholungen
+        self.uhr = uhr
+        self.abbruch = threading.Event()
+        self.schlafen = schlafen
+        self.lock = threading.Lock()
+        self.buckets = {}           # Host -> TokenBucket
+        self.wartende = []          # Events der Abfragen mit eigenem `abbruch`
+
+    def abbrechen(self) -> None:
+        """ Wartende Abfragen sofort beenden, keine weiteren mehr zulassen
+        """
+        self.abbruch.set()
+        with self.lock:
+            for abbruch in self.wartende:
+                abbruch.set()
+
+    def bucket(self, host:str) -> TokenBucket:
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(
+                    abstand=self.abstand, kapazitaet=self.kapazitaet, zufall=self.zufall, uhr=self.uhr)
+            return bucket
+
+    def get_url(self, url:str, abbruch=None):
+        """ GET, frühestens wenn die Drosselung des Hosts es erlaubt
+
+        :param url: URL
+        :type url: str
+        :param abbruch: gesetzt = nicht weiter warten, defaults to None (siehe `abbruch_im_thread`)
+        :type abbruch: threading.Event, optional
+        :raises AbfrageAbgebrochen: `abbruch` oder `abbrechen` vor der Abfrage
+        :return: wie `get_url` des Downloaders
+        """
+        # gespeicherte Antworten ohne Wartezeit
+        aus_cache = getattr(self.downloader, "aus_cache", None)
+        if aus_cache is not None:
+            res = aus_cache(url)
+            if res is not None:
+                return res
+
+        if abbruch is None:
+            abbruch = getattr(_lokal, "abbruch", None)
+        if abbruch is None:
+            return self._get_url(url, self.abbruch)
+
+        # `abbrechen` setzt auch dieses Event, gewartet wird nur auf eines
+        with self.lock:
+            self.wartende.append(abbruch)
+            if self.abbruch.is_set():
+                abbruch.set()
+        try:
+            return self._get_url(url, abbruch)
+        finally:
+            with self.lock:
+                self.wartende.remove(abbruch)
+
+    def _get_url(self, url:str, abbruch):
+        schlafen = self.schlafen if self.schlafen is not None else abbruch.wait
+        bucket = self.bucket(urllib.parse.urlsplit(url).netloc.lower())
+        versuch = 0
+        while True:
+            bucket.warte(schlafen, abbruch)
+            # auch während der Abfrage eines anderen Threads könnte abgebrochen worden sein
+            if abbruch.is_set() or self.abbruch.is_set():
+                raise AbfrageAbgebrochen()
+            status, data, info = self.downloader.get_url(url)
+            if status not in _STATUS_UEBERLASTET or versuch >= self.wiederholungen:
+                return status, data, info
+            versuch += 1
+            sekunden = retry_after((info or {}).get("headers"))
+            if sekunden is None:
+                sekunden = DROSSEL_SPERRE
+            print("* %s: Status %d, warte %.0f s" % (urllib.parse.urlsplit(url).netloc, status, sekunden))
+            bucket.sperre(sekunden)
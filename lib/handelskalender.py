@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Handelskalender
+#
+# Handelstage sind Montag bis Freitag ohne die Feiertage des jeweiligen Kalenders:
+#
+# target2     1.1., Karfreitag, Ostermontag, 1.5., 25.12., 26.12.
+# xetra       wie target2, zusätzlich 24.12. und 31.12.
+#
+# Regionale Feiertage (z.B. Pfingstmontag, Tag der Deutschen Einheit) sind keine Schließtage.
+
+import datetime
+import functools
+
+KALENDER_TARGET2 = "target2"
+KALENDER_XETRA = "xetra"
+
+# feste Feiertage (Monat, Tag)
+_FESTE_FEIERTAGE = {
+    KALENDER_TARGET2: [(1, 1), (5, 1), (12, 25), (12, 26)],
+    KALENDER_XETRA: [(1, 1), (5, 1), (12, 24), (12, 25), (12, 26), (12, 31)],
+}
+
+def ostersonntag(jahr:int) -> datetime.date:
+    """ Ostersonntag nach der Gaußschen Osterformel (gregorianischer Kalender)
+    """
+    a = jahr % 19
+    b = jahr // 100
+    c = jahr % 100
+    d = (19 * a + b - b // 4 - (b - (8 * b + 13) // 25 + 1) // 3 + 15) % 30
+    e = (32 + 2 * (b % 4) + 2 * (c // 4) - d - c % 4) % 7
+    f = d + e - 7 * ((a + 11 * d + 22 * e) // 451) + 114
+    return datetime.date(jahr, f // 31, f % 31 + 1)
+
+@functools.lru_cache(maxsize=None)
+def feiertage(jahr:int, kalender:str=KALENDER_XETRA) -> frozenset:
+    """ Schließtage eines Jahres (ohne Wochenenden)
+
+    :param jahr: Jahr
+    :type jahr: int
+    :param kalender: KALENDER_TARGET2 oder KALENDER_XETRA, defaults to KALENDER_XETRA
+    :type kalender: str, optional
+    :raises ValueError: unbekannter Kalender
+    :rtype: frozenset of date
+    """
+    if kalender not in _FESTE_FEIERTAGE:
+        raise ValueError("Unbekannter Handelskalender: %s" % kalender)
+    ostern = ostersonntag(jahr)
+    tage = [datetime.date(jahr, monat, tag) for monat, tag in _FESTE_FEIERTAGE[kalender]]
+    tage.append(ostern - datetime.timedelta(days=2))      # Karfreitag
+    tage.append(ostern + datetime.timedelta(days=1))      # Ostermontag
+    return frozenset(tage)
+
+def ist_handelstag(datum:datetime.date, kalender:str=KALENDER_XETRA) -> bool:
+    return datum.weekday() < 5 and datum not in feiertage(datum.year, kalender)
+
+def letzter_handelstag(bis:datetime.date, kalender:str=KALENDER_XETRA) -> datetime.date:
+    """ Letzter Handelstag an oder vor `bis`
+    """
+    while not ist_handelstag(bis, kalender):
+        bis -= datetime.timedelta(days=1)
+    return bis
+
+def anzahl_handelstage(nach:datetime.date, bis:datetime.date, kalender:str=KALENDER_XETRA) -> int:
+    """ Handelstage nach `nach` bis einschließlich `bis`
+
+    :rtype: int
+    """
+    anzahl = 0
+    tag = nach + datetime.timedelta(days=1)
+    while tag <= bis:
+        if ist_handelstag(tag, kalender):
+            anzahl += 1
+        tag += datetime.timedelta(days=1)
+    return anzahl
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Zwischenspeicher für Web-Abfragen (Sqlite-Datei, Aufbau in sql/httpcache.sql)
+#
+# Antworten mit Status 200 werden unter ihrer URL gespeichert. Innerhalb von `ttl` Sekunden
+# wird die gespeicherte Antwort ohne Web-Zugriff zurückgegeben. Danach wird - falls der Server
+# ETag bzw. Last-Modified geliefert hat - mit If-None-Match/If-Modified-Since nachgefragt.
+# Antwortet der Server mit 304, gilt die gespeicherte Antwort wieder `ttl` Sekunden.
+#
+# Wird `max_bytes` überschritten, werden die am längsten nicht verwendeten Antworten gelöscht.
+# Im Offline-Modus werden nur gespeicherte Antworten geliefert (auch abgelaufene).
+#
+# Die Verbindung wird von mehreren Threads genutzt (siehe "refresh") und ist deshalb durch
+# ein Lock geschützt.
+
+import json
+import threading
+import time
+
+from lib.sqlite import DBClass
+
+HTTPCACHE_SCHEMA = "sql/httpcache.sql"
+HTTPCACHE_TTL = 6 * 3600                # s
+HTTPCACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Status, wenn im Offline-Modus nichts gespeichert ist (wie bei "Cache-Control: only-if-cached")
+HTTPCACHE_STATUS_OFFLINE = 504
+
+def _header(headers, name:str):
+    name = name.lower()
+    for key in headers:
+        if key.lower() == name:
+            return headers[key]
+    return None
+
+class HttpCache(DBClass):
+    def __init__(self, driver_dict):
+        super().__init__(driver_dict)
+        self.ttl = HTTPCACHE_TTL
+        self.max_bytes = HTTPCACHE_MAX_BYTES
+        self.offline = False
+        self.uhr = time.time
+        self.lock = threading.Lock()
+        # Statistik
+        self.treffer = 0            # ohne Web-Zugriff beantwortet
+        self.bestaetigt = 0         # 304
+        self.gespeichert = 0        # neu geladen und gespeichert
+
+    @classmethod
+    def open_cache(cls, filename:str, *, ttl:float=HTTPCACHE_TTL, max_bytes:int=HTTPCACHE_MAX_BYTES,
+                   offline:bool=False, uhr=time.time):
+        """ Zwischenspeicher öffnen (bzw. anlegen)
+
+        :param filename: Sqlite-Datei
+        :type filename: str
+        :param ttl: Gültigkeit einer Antwort in s, defaults to HTTPCACHE_TTL
+        :type ttl: float, optional
+        :param max_bytes: Obergrenze für die gespeicherten Inhalte, defaults to HTTPCACHE_MAX_BYTES
+        :type max_bytes: int, optional
+        :param offline: nur gespeicherte Antworten liefern, defaults to False
+        :type offline: bool, optional
+        :rtype: HttpCache
+        """
+        cache = cls.open_sqlite(filename, schema=HTTPCACHE_SCHEMA, check_same_thread=False)
+        cache.ttl = ttl
+        cache.max_bytes = max_bytes
+        cache.offline = offline
+        cache.uhr = uhr
+        return cache
+
+    def _eintrag(self, url:str):
+        return self.fetchone("SELECT * FROM antworten WHERE url=?", (url,))
+
+    @staticmethod
+    def _antwort(eintrag:dict):
+        info = {
+            "encoding": eintrag["encoding"],
+            "headers": json.loads(eintrag["headers"]),
+            "aus_cache": True
+        }
+        return eintrag["status"], eintrag["inhalt"], info
+
+    def _verwendet(self, url:str, *, geprueft:bool=False) -> None:
+        jetzt = self.uhr()
+        if geprueft:
+            self.execute("UPDATE antworten SET zugriff=?, geprueft=? WHERE url=?", (jetzt, jetzt, url))
+        else:
+            self.execute("UPDATE antworten SET zugriff=? WHERE url=?", (jetzt, url))
+        self.commit()
+
+    def frische_antwort(self, url:str):
+        """ Gespeicherte Antwort, falls noch gültig (offline: falls vorhanden)
+
+        :return: (status, inhalt, info) oder None
+        """
+        with self.lock:
+            eintrag = self._eintrag(url)
+            if eintrag is None:
+                return None
+            if not self.offline and self.uhr() - eintrag["geprueft"] >= self.ttl:
+                return None
+            self._verwendet(url)
+            self.treffer += 1
+            return self._antwort(eintrag)
+
+    def bedingungen(self, url:str) -> dict:
+        """ Header für eine bedingte Abfrage einer abgelaufenen Antwort
+
+        :return: If-None-Match/If-Modified-Since (leer, falls nichts gespeichert)
+        :rtype: dict
+        """
+        with self.lock:
+            eintrag = self._eintrag(url)
+        headers = {}
+        if eintrag is not None:
+            if eintrag["etag"] is not None:
+                headers["If-None-Match"] = eintrag["etag"]
+            if eintrag["last_modified"] is not None:
+                headers["If-Modified-Since"] = eintrag["last_modified"]
+        return headers
+
+    def bestaetige(self, url:str):
+        """ Server hat mit 304 geantwortet: gespeicherte Antwort gilt wieder `ttl` s
+
+        :return: (status, inhalt, info) oder None (inzwischen verdrängt)
+        """
+        with self.lock:
+            eintrag = self._eintrag(url)
+            if eintrag is None:
+                return None
+            self._verwendet(url, geprueft=True)
+            self.bestaetigt += 1
+            return self._antwort(eintrag)
+
+    def speichere(self, url:str, status:int, inhalt:bytes, info:dict) -> None:
+        """ Antwort speichern (nur Status 200), danach ggf. alte Antworten verdrängen
+        """
+        if status != 200 or len(inhalt) > self.max_bytes:
+            return
+        headers = dict((info or {}).get("headers") or {})
+        jetzt = self.uhr()
+        with self.lock:
+            self.execute(
+                "INSERT OR REPLACE INTO antworten (url, status, encoding, headers, inhalt, etag, last_modified, geprueft, zugriff, groesse) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (url, status, (info or {}).get("encoding"), json.dumps(headers), inhalt,
+                 _header(headers, "ETag"), _header(headers, "Last-Modified"), jetzt, jetzt, len(inhalt)))
+            self._begrenze()
+            self.commit()
+            self.gespeichert += 1
+
+    def _begrenze(self) -> None:
+        summe = self.fetchone("SELECT coalesce(sum(groesse), 0) FROM antworten", None, singleparam=0)
+        if summe <= self.max_bytes:
+            return
+        loeschen = []
+        for row in self.fetchall("SELECT url, groesse FROM antworten ORDER BY zugriff", None):
+            if summe <= self.max_bytes:
+                break
+            loeschen.append((row["url"],))
+            summe -= row["groesse"]
+        with self.cursor2() as cursor:
+            cursor.executemany("DELETE FROM antworten WHERE url=?", loeschen)
+
+    def offline_antwort(self):
+        """ Antwort im Offline-Modus, wenn nichts gespeichert ist
+        """
+        return HTTPCACHE_STATUS_OFFLINE, b"", {"encoding": None, "headers": {}, "aus_cache": True}
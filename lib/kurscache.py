@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Zwischenspeicher für Kursreihen
+#
+# Bei einer Auswertung werden dieselben Kursreihen (Fonds und Währungen) sehr oft
+# abgefragt. Beim ersten Zugriff wird deshalb die gesamte Reihe einer fondsid geladen
+# und kompakt gespeichert:
+#
+#   tage      array('l')  Tag als Ordinalzahl (datetime.date.toordinal)
+#   schluss   array('d')  Schlusskurs
+#   stueck    array('d')  NaN = nicht vorhanden
+#   volumen   array('d')  NaN = nicht vorhanden
+#
+# Abfragen (exakt bzw. "letzter Kurs bis") werden per Binärsuche beantwortet
+# (`tag_index_exakt`, `tag_index_nach`, auch für `Kursspalten` der Online-Abfragen).
+# Die Anzahl der gespeicherten Kurse ist begrenzt; verdrängt wird die am längsten
+# nicht benutzte Reihe (LRU).
+
+from array import array
+from collections import OrderedDict
+import bisect
+import datetime
+import math
+
+# Standardgrenze für die Anzahl der gespeicherten Kurse (alle Reihen zusammen)
+KURSCACHE_MAX_PUNKTE = 2000000
+
+def _ordinal(datum) -> int:
+    return datum.toordinal()
+
+def _opt(wert):
+    # None <-> NaN
+    if wert is None:
+        return math.nan
+    return wert
+
+def _unopt(wert):
+    if math.isnan(wert):
+        return None
+    return wert
+
+def tag_index_exakt(tage, tag:int):
+    """ Position von `tag` in den aufsteigend sortierten Tagen
+
+    :param tage: Tage als Ordinalzahl (aufsteigend)
+    :type tage: array('l')
+    :param tag: Tag als Ordinalzahl
+    :type tag: int
+    :return: Index oder None
+    :rtype: int
+    """
+    i = bisect.bisect_left(tage, tag)
+    if i < len(tage) and tage[i] == tag:
+        return i
+    return None
+
+def tag_index_nach(tage, tag:int) -> int:
+    """ Position des ersten Tages nach `tag` in den aufsteigend sortierten Tagen
+
+    :param tage: Tage als Ordinalzahl (aufsteigend)
+    :type tage: array('l')
+    :param tag: Tag als Ordinalzahl
+    :type tag: int
+    :return: Index (len(tage), falls keiner danach)
+    :rtype: int
+    """
+    return bisect.bisect_right(tage, tag)
+
+class Kursreihe:
+    __slots__ = ("fondsid", "tage", "schluss", "stueck", "volumen")
+
+    def __init__(self, fondsid:int, rows):
+        self.fondsid = fondsid
+        self.tage = array('l')
+        self.schluss = array('d')
+        self.stueck = array('d')
+        self.volumen = array('d')
+        # Die Datenbank liefert die Tage bereits als Ordinalzahl
+        for datum, schluss, stueck, volumen in rows:
+            self.tage.append(datum)
+            self.schluss.append(schluss)
+            self.stueck.append(_opt(stueck))
+            self.volumen.append(_opt(volumen))
+
+    def __len__(self):
+        return len(self.tage)
+
+    def index_exakt(self, datum):
+        """ Position des Kurses genau zum Datum
+
+        :return: Index oder None
+        :rtype: int
+        """
+        return tag_index_exakt(self.tage, _ordinal(datum))
+
+    def index_bis(self, datum):
+        """ Position des letzten Kurses am oder vor dem Datum
+
+        :return: Index oder None
+        :rtype: int
+        """
+        i = tag_index_nach(self.tage, _ordinal(datum)) - 1
+        if i < 0:
+            return None
+        return i
+
+    def bereich(self, start=None, ende=None):
+        """ Indexbereich der Kurse von `start` bis `ende` (jeweils einschließlich)
+
+        :rtype: range
+        """
+        von = 0 if start is None else bisect.bisect_left(self.tage, _ordinal(start))
+        bis = len(self.tage) if ende is None else tag_index_nach(self.tage, _ordinal(ende))
+        return range(von, bis)
+
+    def werte(self, i:int) -> tuple:
+        """ Kurs als Tupel (Tag als Ordinalzahl, Schluss, Stück, Volumen)
+        """
+        return (self.tage[i], self.schluss[i], _unopt(self.stueck[i]), _unopt(self.volumen[i]))
+
+    def zeile(self, i:int) -> dict:
+        """ Kurs als dict wie aus der Datenbank
+        """
+        return {
+            "datum": datetime.date.fromordinal(self.tage[i]),
+            "fondsid": self.fondsid,
+            "schluss": self.schluss[i],
+            "stueck": _unopt(self.stueck[i]),
+            "volumen": _unopt(self.volumen[i])
+        }
+
+class KursCache:
+    def __init__(self, kursedb, *, max_punkte:int=KURSCACHE_MAX_PUNKTE):
+        self.kursedb = kursedb
+        self.max_punkte = max_punkte
+        self.reihen = OrderedDict()     # fondsid -> Kursreihe, zuletzt benutzte am Ende
+        self.punkte = 0
+        self.fonds = None               # isin -> (fondsid, waehrung)
+
+    def fonds_info(self, isin):
+        """ fondsid und Währung einer ISIN
+
+        :return: (fondsid, waehrung) oder None
+        :rtype: tuple
+        """
+        if self.fonds is None:
+            fonds = {}
+            with self.kursedb.cursor2() as cursor:
+                cursor.execute("SELECT isin, fondsid, waehrung FROM fonds ORDER BY fondsid")
+                for isin_db, fondsid, waehrung in cursor.fetchall():
+                    # wie bei `SELECT ... WHERE isin=?` gilt der erste Eintrag
+                    fonds.setdefault(isin_db, (fondsid, waehrung))
+            self.fonds = fonds
+        return self.fonds.get(isin)
+
+    def reihe(self, fondsid:int) -> Kursreihe:
+        reihe = self.reihen.get(fondsid)
+        if reihe is not None:
+            self.reihen.move_to_end(fondsid)
+            return reihe
+
+        with self.kursedb.cursor2() as cursor:
+            cursor.execute("SELECT datum, schluss, stueck, volumen FROM kurse WHERE fondsid=? ORDER BY datum", (fondsid,))
+            reihe = Kursreihe(fondsid, cursor.fetchall())
+
+        self.reihen[fondsid] = reihe
+        self.punkte += len(reihe)
+        # älteste Reihen verdrängen (die gerade geladene bleibt)
+        while self.punkte > self.max_punkte and len(self.reihen) > 1:
+            _, alt = self.reihen.popitem(last=False)
+            self.punkte -= len(alt)
+        return reihe
+
+    def geladene_reihe(self, fondsid:int):
+        """ Reihe, falls sie bereits im Speicher liegt (lädt nichts nach)
+
+        :rtype: Kursreihe or None
+        """
+        reihe = self.reihen.get(fondsid)
+        if reihe is not None:
+            self.reihen.move_to_end(fondsid)
+        return reihe
+
+    def invalidiere(self, fondsid=None) -> None:
+        """ Gespeicherte Kurse verwerfen
+
+        :param fondsid: nur diese Reihe, None = alles (inkl. Fonds), defaults to None
+        :type fondsid: int, optional
+        """
+        if fondsid is None:
+            self.reihen.clear()
+            self.punkte = 0
+            self.fonds = None
+            return
+        alt = self.reihen.pop(fondsid, None)
+        if alt is not None:
+            self.punkte -= len(alt)
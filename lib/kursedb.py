@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from lib.sqlite import DBClass, local_cursor_wrapper
+from lib.sqlite import DBClass, local_cursor_wrapper, DEFAULT_BATCH_SIZE
+from lib.kurscache import KursCache, KURSCACHE_MAX_PUNKTE
+from collections import namedtuple
 import datetime
+import itertools
 
 KURSEDB_ISIN = "isin"
 KURSEDB_FONDID = "fondsid"
@@ -14,7 +17,297 @@ KURSEDB_STUECK = "stück"
 
 KURSEDB_EXAKTES_DATUM = "exakt"    # bei Kursabfrage
 
+# Ergebnis von `upsert_kurse`
+KURSEDB_ANZ_NEU = "neu"
+KURSEDB_ANZ_GEAENDERT = "geändert"
+KURSEDB_ANZ_UNVERAENDERT = "unverändert"
+
+# Ergebnis von `kurs_uebersicht`
+KURSEDB_ANZAHL = "anzahl"
+KURSEDB_ERSTER_DATUM = "erster_datum"
+KURSEDB_ERSTER_SCHLUSSKURS = "erster_schluss"
+KURSEDB_LETZTER_DATUM = "letzter_datum"
+KURSEDB_LETZTER_SCHLUSSKURS = "letzter_schluss"
+
+# Ergebnis von `get_kurse_tupel`
+Kurs = namedtuple("Kurs", ["datum", "schluss", "stueck", "volumen"])
+
+# Gespeichert wird der Tag als Ordinalzahl (datetime.date.toordinal). Umgewandelt wird
+# nur beim Übergang zwischen Datenbank und Aufrufer.
+def _tag(datum) -> int:
+    if type(datum) is datetime.datetime:
+        datum = datum.date()
+    return datum.toordinal()
+
+def _ohne_nan(werte):
+    # NaN (z.B. aus array('d')) -> None
+    return [None if x != x else x for x in werte]
+
+def _datum(tag):
+    if tag is None:
+        return None
+    return datetime.date.fromordinal(tag)
+
+# Text (JJJJ-MM-TT) -> Ordinalzahl in SQL
+_TEXT_ZU_TAG = "CAST(julianday(%s) - 1721424.5 AS integer)"
+
+# Übersicht pro Fonds (Tabelle `kurse_info`): Anzahl der Kurse, erster und letzter Kurs
+#
+# Die Tabelle wird über Trigger bei jeder Änderung von `kurse` nachgeführt.
+# Erster und letzter Kurs werden nach dem Löschen über den Index (fondsid, datum)
+# neu bestimmt.
+
+# Einfügen eines Kurses (Platzhalter: NEW)
+_KURSINFO_EINFUEGEN = """
+    INSERT INTO kurse_info (fondsid, anzahl, erster_datum, erster_schluss, letzter_datum, letzter_schluss)
+        VALUES (NEW.fondsid, 1, NEW.datum, NEW.schluss, NEW.datum, NEW.schluss)
+        ON CONFLICT(fondsid) DO UPDATE SET
+            anzahl=anzahl+1,
+            erster_datum=CASE WHEN excluded.erster_datum<erster_datum THEN excluded.erster_datum ELSE erster_datum END,
+            erster_schluss=CASE WHEN excluded.erster_datum<=erster_datum THEN excluded.erster_schluss ELSE erster_schluss END,
+            letzter_datum=CASE WHEN excluded.letzter_datum>letzter_datum THEN excluded.letzter_datum ELSE letzter_datum END,
+            letzter_schluss=CASE WHEN excluded.letzter_datum>=letzter_datum THEN excluded.letzter_schluss ELSE letzter_schluss END;
+"""
+
+# Entfernen eines Kurses (Platzhalter: OLD)
+_KURSINFO_ENTFERNEN = """
+    UPDATE kurse_info SET
+        anzahl=anzahl-1,
+        erster_datum=(SELECT datum FROM kurse WHERE fondsid=OLD.fondsid ORDER BY datum LIMIT 1),
+        erster_schluss=(SELECT schluss FROM kurse WHERE fondsid=OLD.fondsid ORDER BY datum LIMIT 1),
+        letzter_datum=(SELECT datum FROM kurse WHERE fondsid=OLD.fondsid ORDER BY datum DESC LIMIT 1),
+        letzter_schluss=(SELECT schluss FROM kurse WHERE fondsid=OLD.fondsid ORDER BY datum DESC LIMIT 1)
+        WHERE fondsid=OLD.fondsid;
+    DELETE FROM kurse_info WHERE fondsid=OLD.fondsid AND anzahl<=0;
+"""
+
+# Trigger auf `kurse` (gehen verloren, wenn die Tabelle neu aufgebaut wird)
+_KURSINFO_TRIGGER = [
+    "CREATE TRIGGER ki_insert AFTER INSERT ON kurse BEGIN" + _KURSINFO_EINFUEGEN + "END",
+    # nur der Kurs ändert sich (UPSERT)
+    """CREATE TRIGGER ki_update AFTER UPDATE ON kurse
+        WHEN OLD.fondsid=NEW.fondsid AND OLD.datum=NEW.datum BEGIN
+        UPDATE kurse_info SET
+            erster_schluss=CASE WHEN erster_datum=NEW.datum THEN NEW.schluss ELSE erster_schluss END,
+            letzter_schluss=CASE WHEN letzter_datum=NEW.datum THEN NEW.schluss ELSE letzter_schluss END
+            WHERE fondsid=NEW.fondsid;
+    END""",
+    """CREATE TRIGGER ki_update_schluessel AFTER UPDATE ON kurse
+        WHEN OLD.fondsid<>NEW.fondsid OR OLD.datum<>NEW.datum BEGIN""" + _KURSINFO_ENTFERNEN + _KURSINFO_EINFUEGEN + "END",
+    "CREATE TRIGGER ki_delete AFTER DELETE ON kurse BEGIN" + _KURSINFO_ENTFERNEN + "END"
+]
+
+def _kursinfo_anlegen(datumtyp:str) -> list:
+    """ Anweisungen zum (Neu-)Anlegen und Füllen von `kurse_info`
+    """
+    return [
+        "DROP TRIGGER IF EXISTS ki_insert",
+        "DROP TRIGGER IF EXISTS ki_update",
+        "DROP TRIGGER IF EXISTS ki_update_schluessel",
+        "DROP TRIGGER IF EXISTS ki_delete",
+        "DROP TABLE IF EXISTS kurse_info",
+        """CREATE TABLE kurse_info (
+            fondsid integer primary key,
+            anzahl integer not null,
+            erster_datum %s,
+            erster_schluss float,
+            letzter_datum %s,
+            letzter_schluss float,
+            FOREIGN KEY(fondsid) REFERENCES fonds(fondsid)
+        )""" % (datumtyp, datumtyp)
+    ] + _KURSINFO_TRIGGER + [
+        # vorhandene Kurse übernehmen
+        """INSERT INTO kurse_info (fondsid, anzahl, erster_datum, erster_schluss, letzter_datum, letzter_schluss)
+            SELECT k.fondsid, k.anzahl,
+                k.erster, (SELECT schluss FROM kurse WHERE fondsid=k.fondsid AND datum=k.erster),
+                k.letzter, (SELECT schluss FROM kurse WHERE fondsid=k.fondsid AND datum=k.letzter)
+            FROM (SELECT fondsid, count(*) AS anzahl, min(datum) AS erster, max(datum) AS letzter FROM kurse GROUP BY fondsid) k"""
+    ]
+
+# Aufbau der Tabelle `kurse` (Platzhalter: Tabellenname)
+_KURSE_TABELLE = """CREATE TABLE %s (
+    id integer primary key autoincrement,
+    datum integer not null,                 -- Tag als Ordinalzahl (datetime.date.toordinal)
+    fondsid integer not null,
+    schluss real not null,
+    stueck real,
+    volumen real,
+    FOREIGN KEY(fondsid) REFERENCES fonds(fondsid)
+)"""
+
+_KURSE_TABELLE_OHNE_ROWID = """CREATE TABLE %s (
+    datum integer not null,                 -- Tag als Ordinalzahl (datetime.date.toordinal)
+    fondsid integer not null,
+    schluss real not null,
+    stueck real,
+    volumen real,
+    PRIMARY KEY(fondsid, datum),
+    FOREIGN KEY(fondsid) REFERENCES fonds(fondsid)
+) WITHOUT ROWID"""
+
+def _ist_ohne_rowid(cursor) -> bool:
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='kurse'")
+    return "WITHOUT ROWID" in cursor.fetchone()[0].upper()
+
+def _baue_kurse_neu(cursor, *, ohne_rowid:bool, datum_sql:str) -> None:
+    """ Tabelle `kurse` neu aufbauen (inkl. Index und Trigger)
+
+    :param ohne_rowid: als WITHOUT-ROWID-Tabelle
+    :type ohne_rowid: bool
+    :param datum_sql: Ausdruck für die Übernahme der Spalte `datum`
+    :type datum_sql: str
+    :note: Mehrere Kurse eines Tages: der zuletzt gespeicherte bleibt erhalten.
+    """
+    quelle_ohne_rowid = _ist_ohne_rowid(cursor)
+    reihenfolge = "" if quelle_ohne_rowid else " ORDER BY id"
+    cursor.execute("DROP INDEX IF EXISTS k_fonds_datum")
+    if ohne_rowid:
+        cursor.execute(_KURSE_TABELLE_OHNE_ROWID % "kurse_neu")
+        cursor.execute("INSERT OR REPLACE INTO kurse_neu (datum, fondsid, schluss, stueck, volumen) "
+                       "SELECT %s, fondsid, schluss, stueck, volumen FROM kurse%s" % (datum_sql, reihenfolge))
+    else:
+        cursor.execute(_KURSE_TABELLE % "kurse_neu")
+        cursor.execute("CREATE UNIQUE INDEX k_fonds_datum ON kurse_neu(fondsid, datum)")
+        spalte_id = "NULL" if quelle_ohne_rowid else "id"
+        cursor.execute("INSERT OR REPLACE INTO kurse_neu (id, datum, fondsid, schluss, stueck, volumen) "
+                       "SELECT %s, %s, fondsid, schluss, stueck, volumen FROM kurse%s" % (spalte_id, datum_sql, reihenfolge))
+    cursor.execute("DROP TABLE kurse")
+    cursor.execute("ALTER TABLE kurse_neu RENAME TO kurse")
+    for query in _KURSINFO_TRIGGER:
+        cursor.execute(query)
+
+def _migration_ganzzahlige_tage(cursor) -> None:
+    # Der Aufbau (mit/ohne rowid) bleibt erhalten
+    _baue_kurse_neu(cursor, ohne_rowid=_ist_ohne_rowid(cursor), datum_sql=_TEXT_ZU_TAG % "datum")
+    for query in _kursinfo_anlegen("integer"):
+        cursor.execute(query)
+
+# Schema-Migrationen
+#
+# `sql/kurse.sql` wird nur beim Anlegen der Datenbank ausgeführt. Alle späteren Änderungen
+# am Aufbau stehen hier als nummerierte Schritte. Die erreichte Version steht in
+# `PRAGMA user_version`; beim Öffnen werden die fehlenden Schritte ausgeführt.
+# Vorhandene Schritte niemals ändern, sondern einen neuen anhängen.
+KURSEDB_MIGRATIONEN = [
+    # 1: eindeutiger Schlüssel (fondsid, datum), überflüssige Indizes entfernen
+    #    Doppelte Kurse eines Tages: der zuletzt gespeicherte bleibt erhalten
+    (1, [
+        "DELETE FROM kurse WHERE id NOT IN (SELECT max(id) FROM kurse GROUP BY fondsid, datum)",
+        "DROP INDEX IF EXISTS k_datum",
+        "DROP INDEX IF EXISTS k_isin",
+        "CREATE UNIQUE INDEX IF NOT EXISTS k_fonds_datum ON kurse(fondsid, datum)"
+    ]),
+    # 2: Übersicht pro Fonds
+    (2, _kursinfo_anlegen("date")),
+    # 3: Tage als Ordinalzahl, Kurse als REAL
+    (3, _migration_ganzzahlige_tage)
+]
+
+# Spalten eines Kurses (unabhängig vom Aufbau der Tabelle)
+_KURS_SPALTEN = "datum, fondsid, schluss, stueck, volumen"
+_KURS_SPALTEN_K = "k.datum, k.fondsid, k.schluss, k.stueck, k.volumen"
+
+def _kurs_dict(row) -> dict:
+    """ Kurs (Spalten wie `_KURS_SPALTEN`) als dict
+    """
+    if row is None:
+        return None
+    return {
+        KURSEDB_DATUM: _datum(row[0]),
+        KURSEDB_FONDID: row[1],
+        KURSEDB_SCHLUSSKURS: row[2],
+        "stueck": row[3],
+        KURSEDB_VOLUMEN: row[4]
+    }
+
+def _kurs_tupel(cursor, row) -> Kurs:
+    # row_factory für `get_kurse_tupel`
+    return Kurs(datetime.date.fromordinal(row[0]), row[1], row[2], row[3])
+
+def _datum_schluss(cursor, row) -> tuple:
+    # row_factory für `iter_kurse`
+    return (datetime.date.fromordinal(row[0]), row[1])
+
 class KurseDB(DBClass):
+    def __init__(self, driver_dict):
+        super().__init__(driver_dict)
+        # Zwischenspeicher für Kursreihen, siehe `aktiviere_kurscache`
+        self.kurscache = None
+
+    @classmethod
+    def open_sqlite(cls, filename, schema=None, *, profile=None, readonly=False):
+        """ Öffne die Kursdatenbank und bringe ihren Aufbau auf den neusten Stand
+
+        :param profile: sqlite-Einstellungen, siehe `DBClass.open_sqlite`, defaults to None
+        :type profile: dict, optional
+        :param readonly: nur lesen (z.B. für Auswertungen während eines Imports), defaults to False
+        :type readonly: bool, optional
+        :note: Ist der Aufbau einer Datenbank veraltet, wird sie auch bei `readonly` einmalig
+        :note: zum Schreiben geöffnet und aktualisiert.
+        """
+        if not readonly:
+            kursedb = super().open_sqlite(filename, schema=schema, profile=profile)
+            kursedb.apply_migrations(KURSEDB_MIGRATIONEN)
+            return kursedb
+
+        kursedb = super().open_sqlite(filename, profile=profile, readonly=True)
+        version = kursedb.get_user_version()
+        if version == KURSEDB_MIGRATIONEN[-1][0]:
+            return kursedb
+
+        kursedb.close()
+        if version > KURSEDB_MIGRATIONEN[-1][0]:
+            raise ValueError("Kursdatenbank %s hat Version %d, unterstützt wird bis %d" % (filename, version, KURSEDB_MIGRATIONEN[-1][0]))
+        cls.open_sqlite(filename, profile=profile).close()
+        return super().open_sqlite(filename, profile=profile, readonly=True)
+
+    def ist_ohne_rowid(self) -> bool:
+        with self.cursor2() as cursor:
+            return _ist_ohne_rowid(cursor)
+
+    def reorganisiere_kurse(self) -> bool:
+        """ Baue die Tabelle `kurse` als WITHOUT-ROWID-Tabelle mit dem Schlüssel (fondsid, datum) auf
+
+        :return: False, falls die Tabelle schon so aufgebaut ist
+        :rtype: bool
+        :note: Die Kurse eines Fonds liegen danach physisch hintereinander; Bereichsabfragen
+        :note: lesen weniger Seiten und der zusätzliche Index entfällt.
+        """
+        if self.ist_ohne_rowid():
+            return False
+        if self.con.in_transaction:
+            self.con.commit()
+        with self.cursor2() as cursor:
+            try:
+                cursor.execute("BEGIN")
+                _baue_kurse_neu(cursor, ohne_rowid=True, datum_sql="datum")
+                self.con.commit()
+            except BaseException:
+                self.con.rollback()
+                raise
+            cursor.execute("VACUUM")
+        if self.kurscache is not None:
+            self.kurscache.invalidiere()
+        return True
+
+    def aktiviere_kurscache(self, *, max_punkte:int=KURSCACHE_MAX_PUNKTE) -> None:
+        """ Beantworte get_kurs, get_kurs_db und get_alle_kurse aus dem Speicher
+
+        :param max_punkte: maximale Anzahl gespeicherter Kurse, defaults to KURSCACHE_MAX_PUNKTE
+        :type max_punkte: int, optional
+        :note: Schreibzugriffe über `upsert_kurse` bzw. `insert_isin` verwerfen die betroffenen Daten.
+        """
+        self.kurscache = KursCache(self, max_punkte=max_punkte)
+
+    def _cache_reihe(self, isin_or_id, *, laden:bool=True):
+        if type(isin_or_id) is str:
+            info = self.kurscache.fonds_info(isin_or_id)
+            assert info is not None, "ISIN %s nicht in Kurse-DB" % isin_or_id
+            isin_or_id = info[0]
+        if not laden:
+            return self.kurscache.geladene_reihe(isin_or_id)
+        return self.kurscache.reihe(isin_or_id)
+
     @local_cursor_wrapper
     def all_isins(self, cursor=None):
         return [x[KURSEDB_ISIN] for x in self.fetchall("SELECT isin FROM fonds ORDER BY isin", None)]
@@ -23,30 +316,52 @@ class KurseDB(DBClass):
     def isin2index(self, isin, cursor=None):
         return self.fetchone("SELECT fondsid FROM fonds WHERE isin=?", (isin,), singleparam="fondsid", cursor=cursor)
 
+    @local_cursor_wrapper
+    def kurs_uebersicht(self, *, cursor=None):
+        """ Anzahl, erster und letzter Kurs aller Fonds (eine Abfrage)
+
+        :param cursor: cursor, defaults to None
+        :type cursor: cursor, optional
+        :return: Einträge mit KURSEDB_ISIN, KURSEDB_FONDID, KURSEDB_KURSWAEHRUNG, KURSEDB_ANZAHL,
+                 KURSEDB_ERSTER_DATUM, KURSEDB_ERSTER_SCHLUSSKURS, KURSEDB_LETZTER_DATUM, KURSEDB_LETZTER_SCHLUSSKURS
+        :rtype: list of dict
+        :note: Fonds ohne Kurse haben die Anzahl 0, die übrigen Werte sind None.
+        """
+        res = self.fetchall("SELECT f.isin, f.fondsid, f.waehrung, coalesce(i.anzahl, 0) AS anzahl, "
+                            "i.erster_datum, i.erster_schluss, i.letzter_datum, i.letzter_schluss "
+                            "FROM fonds f LEFT JOIN kurse_info i ON i.fondsid=f.fondsid ORDER BY f.isin", None, cursor=cursor)
+        for item in res:
+            item[KURSEDB_ERSTER_DATUM] = _datum(item[KURSEDB_ERSTER_DATUM])
+            item[KURSEDB_LETZTER_DATUM] = _datum(item[KURSEDB_LETZTER_DATUM])
+        return res
+
     @local_cursor_wrapper
     def count_kurse(self, *, isin=None, cursor=None):
         if isin is None:
-            return self.fetchone("SELECT count(*) FROM kurse", None, singleparam="count(*)", cursor=cursor)
-        ix = self.isin2index(isin)
+            return self.fetchone("SELECT coalesce(sum(anzahl), 0) AS anzahl FROM kurse_info", None, singleparam="anzahl", cursor=cursor)
+        ix = self.isin2index(isin, cursor=cursor)
         if ix is None:
             return None
 
-        return self.fetchone("SELECT count(*) FROM kurse WHERE fondsid=?", (ix,), singleparam="count(*)", cursor=cursor)
+        res = self.fetchone("SELECT anzahl FROM kurse_info WHERE fondsid=?", (ix,), singleparam="anzahl", cursor=cursor)
+        if res is None:
+            return 0
+        return res
 
     @local_cursor_wrapper
     def erster_letzter_kurs(self, *, isin=None, cursor=None):
         if isin is None:
             return None, None
-        ix = self.isin2index(isin)
+        ix = self.isin2index(isin, cursor=cursor)
         if ix is None:
             return None, None
 
-        res = self.fetchone("SELECT min(datum), max(datum) FROM kurse WHERE fondsid=?", (ix,), cursor=cursor)
-        if res is None:
-            return None, None
-
-        erste = self.fetchone("SELECT * FROM kurse WHERE datum=? and fondsid=?", (res["min(datum)"], ix), cursor=cursor)
-        letzte = self.fetchone("SELECT * FROM kurse WHERE datum=? and fondsid=?", (res["max(datum)"], ix), cursor=cursor)
+        cursor.execute("SELECT " + _KURS_SPALTEN_K + " FROM kurse_info i JOIN kurse k ON k.fondsid=i.fondsid AND k.datum=i.erster_datum "
+                       "WHERE i.fondsid=?", (ix,))
+        erste = _kurs_dict(cursor.fetchone())
+        cursor.execute("SELECT " + _KURS_SPALTEN_K + " FROM kurse_info i JOIN kurse k ON k.fondsid=i.fondsid AND k.datum=i.letzter_datum "
+                       "WHERE i.fondsid=?", (ix,))
+        letzte = _kurs_dict(cursor.fetchone())
 
         return erste, letzte
 
@@ -64,18 +379,35 @@ class KurseDB(DBClass):
     def insert_isin(self, isin, waehrung="EUR", cursor=None):
         cursor.execute(
             "INSERT INTO fonds (isin, waehrung) values (?,?)", (isin, waehrung))
+        if self.kurscache is not None:
+            self.kurscache.invalidiere()
+        return self.last_insert_id(cursor)
 
 
     @local_cursor_wrapper
-    def get_kurs_db(self, isin_or_id, datum, exact=True, cursor=None):
+    def get_kurs_db(self, isin_or_id, datum, exact=True, cursor=None, *, laden:bool=True):
+        # laden=False: die Reihe nur benutzen, wenn sie bereits im Zwischenspeicher liegt
+        reihe = None
+        if self.kurscache is not None:
+            reihe = self._cache_reihe(isin_or_id, laden=laden)
+        if reihe is not None:
+            if exact:
+                i = reihe.index_exakt(datum)
+            else:
+                i = reihe.index_bis(datum)
+            if i is None:
+                return None
+            return reihe.zeile(i)
+
         isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
 
         if exact:
-            return self.fetchone("SELECT * FROM kurse WHERE datum=? AND fondsid=?",
-                                 (datum, isin_id))
-
-        return self.fetchone("SELECT * FROM kurse WHERE datum<=? AND fondsid=? ORDER BY datum DESC LIMIT 1",
-                             (datum, isin_id), debug=False)
+            cursor.execute("SELECT " + _KURS_SPALTEN + " FROM kurse WHERE datum=? AND fondsid=?",
+                           (_tag(datum), isin_id))
+        else:
+            cursor.execute("SELECT " + _KURS_SPALTEN + " FROM kurse WHERE datum<=? AND fondsid=? ORDER BY datum DESC LIMIT 1",
+                           (_tag(datum), isin_id))
+        return _kurs_dict(cursor.fetchone())
 
     @local_cursor_wrapper
     def get_last_kurs(self, isin_or_id, *, cursor=None):
@@ -89,47 +421,178 @@ class KurseDB(DBClass):
         :rtype: Datenbankeintrag
         """
         isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
-        last = self.fetchone("SELECT max(datum) FROM kurse WHERE fondsid=?", (isin_id,), cursor=cursor)
-        if last is None:
-            return None
-        return self.fetchone("SELECT * FROM kurse WHERE datum=? and fondsid=?", (last["max(datum)"], isin_id), cursor=cursor)
+        cursor.execute("SELECT " + _KURS_SPALTEN_K + " FROM kurse_info i JOIN kurse k ON k.fondsid=i.fondsid AND k.datum=i.letzter_datum "
+                       "WHERE i.fondsid=?", (isin_id,))
+        return _kurs_dict(cursor.fetchone())
 
     @local_cursor_wrapper
     def get_alle_kurse(self, isin_or_id, *, start=None, ende=None, cursor=None):
+        if self.kurscache is not None:
+            reihe = self._cache_reihe(isin_or_id)
+            return [reihe.zeile(i) for i in reihe.bereich(start, ende)]
+
         isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
 
-        querystart = "SELECT * FROM kurse WHERE fondsid=?"
-        addwhere = ""
-        queryende = " ORDER BY datum"
+        query, params = self._query_bereich(_KURS_SPALTEN, isin_id, start, ende)
+        cursor.execute(query, params)
+        return [_kurs_dict(row) for row in cursor]
+
+    @staticmethod
+    def _query_bereich(spalten:str, isin_id:int, start, ende):
+        query = "SELECT " + spalten + " FROM kurse WHERE fondsid=?"
         params = [ isin_id ]
         if start is not None:
-            addwhere += " AND datum >= ?"
-            params.append(start)
+            query += " AND datum >= ?"
+            params.append(_tag(start))
         if ende is not None:
-            addwhere += " AND datum <= ?"
-            params.append(ende)
+            query += " AND datum <= ?"
+            params.append(_tag(ende))
+        return query + " ORDER BY datum", params
+
+    def get_kurse_tupel(self, isin_or_id, *, start=None, ende=None) -> list:
+        """ Kurse eines Zeitraums als Tupel (schneller und sparsamer als `get_alle_kurse`)
+
+        :param isin_or_id: ISIN oder Index
+        :type isin_or_id: str/int
+        :param start: erster Tag, None = ab dem ersten Kurs, defaults to None
+        :type start: date, optional
+        :param ende: letzter Tag, None = bis zum letzten Kurs, defaults to None
+        :type ende: date, optional
+        :return: Kurse nach Datum sortiert
+        :rtype: list of Kurs
+        """
+        if self.kurscache is not None:
+            reihe = self._cache_reihe(isin_or_id)
+            return [Kurs(_datum(tag), schluss, stueck, volumen) for tag, schluss, stueck, volumen in
+                    (reihe.werte(i) for i in reihe.bereich(start, ende))]
+
+        with self.cursor2() as cursor:
+            isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
+            query, params = self._query_bereich("datum, schluss, stueck, volumen", isin_id, start, ende)
+            # ohne sqlite3.Row und dict: jede Zeile wird direkt zum Tupel
+            cursor.row_factory = _kurs_tupel
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def iter_kurse(self, isin_or_id, *, start=None, ende=None, batch_size:int=DEFAULT_BATCH_SIZE):
+        """ Kurse eines Zeitraums nacheinander lesen (begrenzter Speicherbedarf bei langen Reihen)
 
-        query = querystart + addwhere + queryende
-        return self.fetchall(query, params, debug=False)
+        :param isin_or_id: ISIN oder Index
+        :type isin_or_id: str/int
+        :param start: erster Tag, None = ab dem ersten Kurs, defaults to None
+        :type start: date, optional
+        :param ende: letzter Tag, None = bis zum letzten Kurs, defaults to None
+        :type ende: date, optional
+        :param batch_size: Kurse pro Lesevorgang, defaults to DEFAULT_BATCH_SIZE
+        :type batch_size: int, optional
+        :return: Generator mit (Datum, Schlusskurs) nach Datum sortiert
+        :rtype: generator of (date, float)
+        :note: Der Zwischenspeicher wird nur benutzt, wenn die Reihe dort bereits liegt.
+        """
+        reihe = None
+        if self.kurscache is not None:
+            reihe = self._cache_reihe(isin_or_id, laden=False)
+        if reihe is not None:
+            for i in reihe.bereich(start, ende):
+                yield datetime.date.fromordinal(reihe.tage[i]), reihe.schluss[i]
+            return
+
+        isin_id = self.isin_or_id_to_index(isin_or_id)
+        query, params = self._query_bereich("datum, schluss", isin_id, start, ende)
+        yield from self.iterate(query, params, batch_size=batch_size, row_factory=_datum_schluss)
 
     @local_cursor_wrapper
-    def insert_kurse(self, isin_or_id, *, datalist, cursor=None):
+    def upsert_kurse(self, isin_or_id, *, datalist, cursor=None):
+        """ Kurse in einer Transaktion speichern (neu oder aktualisieren)
+
+        :param isin_or_id: ISIN oder Index
+        :type isin_or_id: str/int
+        :param datalist: Kurse mit KURSEDB_DATUM, KURSEDB_SCHLUSSKURS, optional KURSEDB_STUECK und KURSEDB_VOLUMEN
+        :type datalist: list of dict
+        :param cursor: cursor, defaults to None
+        :type cursor: cursor, optional
+        :return: Anzahl der neuen, geänderten und unveränderten Kurse
+        :rtype: dict
+        :note: Pro ISIN und Tag gibt es nur einen Kurs. Mehrfaches Einlesen derselben Daten ändert nichts.
+        """
         isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
+
+        neu = {}
         for item in datalist:
-            if type(item[KURSEDB_DATUM]) is datetime.datetime:
-                datum = item[KURSEDB_DATUM].date()
+            # bei mehreren Einträgen für einen Tag gilt der letzte
+            neu[_tag(item[KURSEDB_DATUM])] = (item[KURSEDB_SCHLUSSKURS], item.get(KURSEDB_STUECK), item.get(KURSEDB_VOLUMEN))
+        return self._upsert(isin_id, neu, cursor)
+
+    @local_cursor_wrapper
+    def upsert_kurs_spalten(self, isin_or_id, *, tage, schluss, stueck=None, volumen=None, cursor=None):
+        """ Kurse spaltenweise speichern, sonst wie `upsert_kurse`
+
+        :param isin_or_id: ISIN oder Index
+        :type isin_or_id: str/int
+        :param tage: Tage als Ordinalzahl
+        :type tage: sequence of int
+        :param schluss: Schlusskurse
+        :type schluss: sequence of float
+        :param stueck: Stückzahlen (None oder NaN = nicht vorhanden), defaults to None
+        :type stueck: sequence of float, optional
+        :param volumen: Volumen (None oder NaN = nicht vorhanden), defaults to None
+        :type volumen: sequence of float, optional
+        :param cursor: cursor, defaults to None
+        :type cursor: cursor, optional
+        :return: Anzahl der neuen, geänderten und unveränderten Kurse
+        :rtype: dict
+        """
+        isin_id = self.isin_or_id_to_index(isin_or_id, cursor=cursor)
+        stueck = itertools.repeat(None) if stueck is None else _ohne_nan(stueck)
+        volumen = itertools.repeat(None) if volumen is None else _ohne_nan(volumen)
+        neu = dict(zip(tage, zip(schluss, stueck, volumen)))
+        return self._upsert(isin_id, neu, cursor)
+
+    def _upsert(self, isin_id:int, neu:dict, cursor):
+        # neu: Tag (Ordinalzahl) -> (schluss, stueck, volumen)
+        res = {
+            KURSEDB_ANZ_NEU: 0,
+            KURSEDB_ANZ_GEAENDERT: 0,
+            KURSEDB_ANZ_UNVERAENDERT: 0
+        }
+        if len(neu) == 0:
+            return res
+
+        # vorhandene Einträge im Zeitraum
+        vorhanden = {}
+        cursor.execute("SELECT datum, schluss, stueck, volumen FROM kurse WHERE fondsid=? AND datum>=? AND datum<=?",
+                       (isin_id, min(neu), max(neu)))
+        for row in cursor.fetchall():
+            vorhanden[row[0]] = (row[1], row[2], row[3])
+
+        params = []
+        for datum, werte in neu.items():
+            alt = vorhanden.get(datum)
+            if alt is None:
+                res[KURSEDB_ANZ_NEU] += 1
+            elif alt == werte:
+                res[KURSEDB_ANZ_UNVERAENDERT] += 1
+                continue
             else:
-                datum = item[KURSEDB_DATUM]
-            query = "INSERT INTO kurse (datum, fondsid, schluss, stueck, volumen) VALUES (?,?,?,?,?)"
-            params = (
-                datum,
-                isin_id,
-                item[KURSEDB_SCHLUSSKURS],
-                item.get(KURSEDB_STUECK),
-                item.get(KURSEDB_VOLUMEN)
-            )
-            self.execute(query, params)
+                res[KURSEDB_ANZ_GEAENDERT] += 1
+            params.append((datum, isin_id) + werte)
+
+        query = "INSERT INTO kurse (datum, fondsid, schluss, stueck, volumen) VALUES (?,?,?,?,?) " \
+                "ON CONFLICT(fondsid, datum) DO UPDATE SET schluss=excluded.schluss, stueck=excluded.stueck, volumen=excluded.volumen"
+        try:
+            cursor.executemany(self.replace_joker(query), params)
+        except BaseException:
+            self.con.rollback()
+            raise
         self.commit()
+        if self.kurscache is not None:
+            self.kurscache.invalidiere(isin_id)
+        return res
+
+    @local_cursor_wrapper
+    def insert_kurse(self, isin_or_id, *, datalist, cursor=None):
+        # Bereits vorhandene Tage werden aktualisiert, siehe `upsert_kurse`
+        return self.upsert_kurse(isin_or_id, datalist=datalist, cursor=cursor)
 
     @local_cursor_wrapper
     def get_waehrungs_faktor(self, transaktionswaehrung, bewertungswaehrung, datum, cursor=None):
@@ -141,6 +604,14 @@ class KurseDB(DBClass):
             raise ValueError("Keine Umrechungseinträge für %s -> %s" % (transaktionswaehrung, bewertungswaehrung))
         return 1.0 / res[KURSEDB_SCHLUSSKURS]
 
+    # Kurs zum Datum oder (falls nicht vorhanden) der letzte davor, in einer Abfrage.
+    # Der Text der Abfrage ist konstant, damit sqlite die vorbereitete Abfrage wiederverwendet.
+    # (fondsid als Unterabfrage, damit sqlite den Index (fondsid, datum) rückwärts lesen kann)
+    _QUERY_KURS_ASOF = "SELECT " + _KURS_SPALTEN_K + ", " \
+                       "(SELECT waehrung FROM fonds WHERE fondsid=k.fondsid), k.datum=? " \
+                       "FROM kurse k WHERE k.fondsid=(SELECT fondsid FROM fonds WHERE isin=?) AND k.datum<=? " \
+                       "ORDER BY k.datum DESC LIMIT 1"
+
     @local_cursor_wrapper
     def get_kurs(self, isin, datum, *, cursor=None):
         """Holt Kurs zu einem bestimmten Datum
@@ -157,23 +628,31 @@ class KurseDB(DBClass):
         :note: wird `exact` auf False gesetzt und vom Datum davor zurückgegeben.
         :note: Falls er existiert, ist `exact` True
         """
-        res = self.fetchone("SELECT * FROM fonds WHERE isin=?", (isin,), cursor=cursor)
-        if res is None:
-            return None
-        isin_id = res[KURSEDB_FONDID]
-        kurswaehrung = res[KURSEDB_KURSWAEHRUNG]
-
-        res = self.fetchone("SELECT * FROM kurse WHERE datum=? AND fondsid=?",
-                                 (datum, isin_id), cursor=cursor)
-        if res is not None:
-            res[KURSEDB_EXAKTES_DATUM] = True
-        else:
-            res = self.fetchone("SELECT * FROM kurse WHERE datum<=? AND fondsid=? ORDER BY datum DESC LIMIT 1",
-                             (datum, isin_id), debug=False, cursor=cursor)
+        if self.kurscache is not None:
+            info = self.kurscache.fonds_info(isin)
+            if info is None:
+                return None
+            reihe = self.kurscache.reihe(info[0])
+            i = reihe.index_bis(datum)
+            if i is None:
+                return None
+            res = reihe.zeile(i)
+            res[KURSEDB_KURSWAEHRUNG] = info[1]
+            res[KURSEDB_EXAKTES_DATUM] = res[KURSEDB_DATUM] == datum
+            return res
 
-            if res is not None:
-                res[KURSEDB_EXAKTES_DATUM] = False
-        if res is not None:
-            res[KURSEDB_KURSWAEHRUNG] = kurswaehrung
-        return res
+        tag = _tag(datum)
+        cursor.execute(self._QUERY_KURS_ASOF, (tag, isin, tag))
+        row = cursor.fetchone()
+        if row is None:
+            return None
 
+        return {
+            KURSEDB_DATUM: _datum(row[0]),
+            KURSEDB_FONDID: row[1],
+            KURSEDB_SCHLUSSKURS: row[2],
+            "stueck": row[3],
+            KURSEDB_VOLUMEN: row[4],
+            KURSEDB_KURSWAEHRUNG: row[5],
+            KURSEDB_EXAKTES_DATUM: row[6] == 1
+        }
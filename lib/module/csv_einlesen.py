@@ -175,25 +175,17 @@ class ArivaCsvReader(CsvReader):
             create_new_fonds=create_new_fonds,
             verbose=verbose)
 
-        # Stammdaten durchsuchen
-        # Zuordnung `wkn` => `isin`
-        self.wkn2isin = {}
-        for item in stammdaten.iter_entries():
-            notation = item.get(STAMMDATEN_WKN)
-            if notation is not None:
-                self.wkn2isin[notation] = item[STAMMDATEN_ISIN]
-
     def lese_csv(self, scanitem):
         ma = self.ARIVA_CSV_NAME_CO.search(scanitem.name)
         if ma is None:
             raise DateinameEntsprichtNichtAnforderungError(scanitem.name)
 
+        # Zuordnung `wkn` => `isin` über den Index der Stammdaten
         wkn = int(ma.group(1))
-        isin = self.wkn2isin.get(wkn)
-        if isin is None:
+        isin_entry = self.stammdaten.get_entry_by_wkn(wkn)
+        if isin_entry is None:
             raise ValueError("WKN %s in Stammdaten nicht gefunden" % wkn)
-        isin_entry = self.stammdaten.get_entry(isin)
-        assert isin_entry is not None
+        isin = isin_entry[STAMMDATEN_ISIN]
 
         kurswaehrung = isin_entry[STAMMDATEN_KURSWAEHRUNG]
         daten = []
@@ -252,26 +244,17 @@ class OnvistaCsvReader(CsvReader):
             only_newer_entries=only_newer_entries,
             verbose=verbose)
 
-        # Stammdaten durchsuchen
-        # Zuordnung `onvista_notation` => `isin`
-        self.notation2isin = {}
-        for item in self.stammdaten.iter_entries():
-            notation = item.get("onvista_notation")
-            if notation is not None:
-                self.notation2isin[notation] = item[STAMMDATEN_ISIN]
-
     def lese_csv(self, scanitem):
         ma = self.ONVISTA_CSV_NAME_CO.search(scanitem.name)
         if ma is None:
             raise DateinameEntsprichtNichtAnforderungError(scanitem.name)
 
+        # Zuordnung `onvista_notation` => `isin` über den Index der Stammdaten
         nota = int(ma.group(1))
-        isin = self.notation2isin.get(nota)
-        if isin is None:
+        isin_entry = self.stammdaten.get_entry_by_onvista_notation(nota)
+        if isin_entry is None:
             raise ValueError("Keine Onvista-Notation %s in Stammdaten gefunden" % nota)
-
-        isin_entry = self.stammdaten.get_entry(isin)
-        assert isin_entry is not None                 # darf nicht vorkommen
+        isin = isin_entry[STAMMDATEN_ISIN]
 
         kurswaehrung = isin_entry[STAMMDATEN_KURSWAEHRUNG]
 
@@ -8,32 +8,30 @@ from lib.utils import dstr, p2k
 def alle_db_isins(*, kursedb, stammdaten):
 
     print("ISIN   Verwend. Währ. # Daten  erster Kurs letzter   Name\n")
-    with kursedb.cursor2() as cursor:
-        for isin in kursedb.all_isins(cursor=cursor):
-            dat = stammdaten.get_entry(isin)
-            assert dat is not None, "Keine Stammdaten für " + isin
+    for info in kursedb.kurs_uebersicht():
+        isin = info[KURSEDB_ISIN]
+        dat = stammdaten.get_entry(isin)
+        assert dat is not None, "Keine Stammdaten für " + isin
 
-            anz_kurse = kursedb.count_kurse(isin=isin, cursor=cursor)
-            first, last = kursedb.erster_letzter_kurs(isin=isin, cursor=cursor)
-            if first is None:
-                fday = "--.--.----"
-            else:
-                fday = dstr(first[KURSEDB_DATUM])
+        if info[KURSEDB_ERSTER_DATUM] is None:
+            fday = "--.--.----"
+        else:
+            fday = dstr(info[KURSEDB_ERSTER_DATUM])
 
-            if last is None:
-                lday = "--.--.----"
-            else:
-                lday = dstr(last[KURSEDB_DATUM])
+        if info[KURSEDB_LETZTER_DATUM] is None:
+            lday = "--.--.----"
+        else:
+            lday = dstr(info[KURSEDB_LETZTER_DATUM])
 
-            print("%-13s %s %s  %7s  %s %s  %s" % (
-                isin,
-                theausierend_mark(dat, " "),
-                dat[STAMMDATEN_KURSWAEHRUNG],
-                anz_kurse,
-                fday,
-                lday,
-                dat[STAMMDATEN_NAME]
-            ))
+        print("%-13s %s %s  %7s  %s %s  %s" % (
+            isin,
+            theausierend_mark(dat, " "),
+            dat[STAMMDATEN_KURSWAEHRUNG],
+            info[KURSEDB_ANZAHL],
+            fday,
+            lday,
+            dat[STAMMDATEN_NAME]
+        ))
 
 def kursabfrage(*, isin, datum, kursedb, stammdaten):
     stammd = stammdaten.get_entry(isin)
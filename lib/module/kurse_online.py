@@ -7,13 +7,19 @@ from lib.stammdaten import *
 from lib.onlinekursabfrage.base import *
 from lib.onlinekursabfrage import init_abfragemodule
 from lib.messages import messages
+from lib.drosselung import GedrosselterDownloader, AbfrageAbgebrochen, abbruch_im_thread
+from lib.handelskalender import KALENDER_XETRA, letzter_handelstag, anzahl_handelstage
 
-import random, time
+import concurrent.futures
+import threading
 
-# Keys bei der Onvista-Online-Abfrage
-OV_ONLINE_DATUM = "datum"
-OV_ONLINE_LAST = "last"
-OV_ONLINE_VOLUME = "volume"
+# parallele Abfragen bei "refresh"
+REFRESH_THREADS = 4
+
+def _pruefe_abbruch(abbruch) -> None:
+    # z.B. hat ein anderes Abfragemodul bereits gültige Kurse geliefert
+    if abbruch is not None and abbruch.is_set():
+        raise AbfrageAbgebrochen()
 
 def online_kurs_lookup(*, downloader, isin, abfragedatum, stammdaten, config):
     def testdate():
@@ -38,158 +44,433 @@ def online_kurs_lookup(*, downloader, isin, abfragedatum, stammdaten, config):
         stammdaten=stammdaten
     )
 
-    for qu in abfrager:
+    # alle Abfragemodule gleichzeitig fragen, ausgegeben wird in der gewohnten Reihenfolge
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(abfrager))) as executor:
+        futures = [executor.submit(qu["poi"].query_isin, isin=isin, startdate=beginn) for qu in abfrager]
+
+    for qu, future in zip(abfrager, futures):
         print(">>> Abfrage", qu["name"])
         print("\nDatum              Schluss   Volumen")
-        data = qu["poi"].query_isin(isin=isin, startdate=beginn)
+        data = als_kursspalten(future.result())
 
         # print("Ergebnis Onlineabfrage:", data)
 
         first = True
-        for item in data:
-            thisdate = datetime.date(year=item["datum"].year, month=item["datum"].month,
-                                    day=item["datum"].day)
+        for i in range(len(data) if data is not None else 0):
+            thisdate = data.datum(i)
             if thisdate > abfragedatum:
                 testdate()
-            print("%s %9.3f %7.1f" % (item["datum"].strftime("%d.%m.%Y %H:%M"), item["last"], item["volume"]))
+            print("%s       %9.3f %7.1f" % (dstr(thisdate), data.last[i], data.volume[i]))
             if thisdate == abfragedatum:
                 testdate()
 
 
-def refresh_datenbank(*, config, downloader, kursedb, stammdaten, ignore=None, verbose=False):
-    # Initialisierung der Onlineabfrage
-
-    abfrager = init_abfragemodule(
-        downloader=downloader,
-        config=config,
-        stammdaten=stammdaten
-    )
-
-    for isin in kursedb.all_isins():
-        print(isin, end=" ")
-
-        res = stammdaten.get_entry(isin)
-        if res is None:
-            raise ValueError(f"*** {isin} nicht in Stammdaten")
-
-        isin_name = res[STAMMDATEN_NAME]
-        isin_waehrung = res[STAMMDATEN_KURSWAEHRUNG]
-        print("- ", isin_name)
-
-        if verbose:
-            print("ISIN:", isin, "-", isin_name)
-            print("interne Nummer", kursedb.isin2index(isin))
-
-        last = kursedb.get_last_kurs(isin)
-        letztes_datum = last[KURSEDB_DATUM]
-        letzter_kurs = last[KURSEDB_SCHLUSSKURS]
-
-        if verbose:
-            print("last:", last)
-
-        for qu in abfrager:
-            if verbose:
-                print("* Abfrage", qu["name"])
-
-            # zufällige Wartezeit zwischen zwei Abfragen,
-            # um Website nicht zu überlasten
-
-            s = 7 + random.random() * 7.0
-            print("* Warte %.1f s" % s)
-            time.sleep(s)
-
+def _pruefe_anschluss(isin:str, soll_datum, soll_kurs:float, seite, *, ignore, warnungen:list, verbose:bool) -> None:
+    # Stimmt der erste Kurs einer Abfrage (Kursspalten) mit dem bereits bekannten Kurs überein?
+    first_date = seite.datum(0)
+    first_kurs = seite.last[0]
+    if (soll_datum == first_date) and (soll_kurs == first_kurs):
+        return
+
+    abw = abs(soll_kurs-first_kurs)
+
+    if verbose:
+        print("%s: Anschluss stimmt nicht" % isin)
+        print("Bekannt...:", dstr(soll_datum), soll_kurs)
+        print("Online....:", dstr(first_date), first_kurs)
+        print("Abweichung:", p2k(abw))
+        print("Ignoriere.:", ignore)
+
+    if (ignore is not None) and (abw <= ignore):
+        warnungen.append("Ignoriere Unstimmigkeit beim Anschluss von %s: %s" % (
+            isin,
+            p2k(abw)
+        ))
+    else:
+        raise ValueError("Anschluss nicht möglich bei %s, Abweichung %s" % (
+            isin,
+            p2k(abw)
+        ))
+
+def plane_fenster(letztes_datum, bis, fenster_tage:int) -> list:
+    """ Startdaten der Abfragen, um die Lücke nach dem letzten gespeicherten Kurs zu füllen
+
+    Die Abfragen beginnen im Abstand von `fenster_tage` Tagen. Jede muss deutlich mehr Tage liefern,
+    damit sich aufeinanderfolgende Abfragen um einige Handelstage überlappen (Prüfung des Anschlusses).
+
+    :param letztes_datum: Datum des letzten gespeicherten Kurses
+    :type letztes_datum: date
+    :param bis: letzter benötigter Tag (i.d.R. heute)
+    :type bis: date
+    :param fenster_tage: Abstand der Abfragen in Tagen
+    :type fenster_tage: int
+    :return: Startdaten (mindestens eines)
+    :rtype: list of date
+    """
+    starts = [letztes_datum]
+    schritt = datetime.timedelta(days=fenster_tage)
+    while starts[-1] + schritt < bis:
+        starts.append(starts[-1] + schritt)
+    return starts
+
+def abfrage_kosten(letztes_datum, bis, fenster_tage) -> int:
+    """ Zahl der Web-Abfragen, um die Lücke nach dem letzten gespeicherten Kurs zu füllen
+
+    :param fenster_tage: Abstand der Abfragen eines Abfragemoduls in Tagen (None = 1 Abfrage) oder Liste
+                         für mehrere Abfragemodule, die alle gefragt werden
+    :type fenster_tage: int or list
+    :rtype: int
+    """
+    if not isinstance(fenster_tage, list):
+        fenster_tage = [fenster_tage]
+    return sum(len(plane_fenster(letztes_datum, bis, x)) if x else 1 for x in fenster_tage)
+
+class _Budget:
+    # Rest des Budgets für Abfragemodule, die erst nachträglich gefragt werden (threadsicher)
+    def __init__(self, rest:int):
+        self.rest = rest
+        self.lock = threading.Lock()
+
+    def reserviere(self, anzahl:int) -> bool:
+        with self.lock:
+            if anzahl > self.rest:
+                return False
+            self.rest -= anzahl
+            return True
+
+def _hole_fenster(qu, *, isin:str, letztes_datum, letzter_kurs:float, bis, executor, ignore, warnungen:list, verbose:bool,
+                  abbruch=None):
+    # Alle Fenster auf einmal abfragen (gedrosselt wird im Downloader), dann zusammenfügen
+    starts = plane_fenster(letztes_datum, bis, qu["poi"].FENSTER_TAGE)
+    if verbose:
+        print("* %s: %d Abfragen ab %s" % (isin, len(starts), dstr(letztes_datum)))
+
+    def abfrage(start):
+        _pruefe_abbruch(abbruch)
+        with abbruch_im_thread(abbruch):
+            return als_kursspalten(qu["poi"].query_isin(isin=isin, startdate=start))
+
+    if executor is None or len(starts) == 1:
+        seiten = [abfrage(start) for start in starts]
+    else:
+        seiten = list(executor.map(abfrage, starts))
+
+    # Anschluss: erstes Fenster an die Datenbank, jedes weitere an die bereits geladenen Kurse.
+    # Übernommen werden von jeder Seite nur die Tage nach dem bisher letzten (Teilstücke der Arrays).
+    # Ist eine Seite leer oder fehlen Handelstage vor ihrem ersten Tag, endet das Zusammenfügen:
+    # gespeichert wird nur, was bis dahin lückenlos geladen wurde.
+    neue = Kursspalten()
+    letzter_tag = letztes_datum.toordinal()
+    for nr, seite in enumerate(seiten):
+        if not seite:
+            if any(seiten[nr+1:]):
+                warnungen.append("%s: Abfrage ab %s ohne Kurse, übernommen bis %s" % (
+                    isin, dstr(starts[nr]), dstr(datetime.date.fromordinal(letzter_tag))))
+            break
+        if nr == 0:
+            _pruefe_anschluss(isin, letztes_datum, letzter_kurs, seite, ignore=ignore, warnungen=warnungen, verbose=verbose)
+        else:
+            i = neue.index_exakt(seite.tage[0])
+            if i is not None:
+                _pruefe_anschluss(isin, neue.datum(i), neue.last[i], seite, ignore=ignore, warnungen=warnungen, verbose=verbose)
+            elif seite.tage[0] == letztes_datum.toordinal():
+                _pruefe_anschluss(isin, letztes_datum, letzter_kurs, seite, ignore=ignore, warnungen=warnungen, verbose=verbose)
+            elif seite.tage[0] > letzter_tag and \
+                    anzahl_handelstage(datetime.date.fromordinal(letzter_tag), seite.datum(0) - datetime.timedelta(days=1)) > 0:
+                warnungen.append("%s: Lücke vor %s, übernommen bis %s" % (
+                    isin, dstr(seite.datum(0)), dstr(datetime.date.fromordinal(letzter_tag))))
+                break
+            else:
+                # kein gemeinsamer Kurs mit den bereits geladenen
+                warnungen.append("%s: Anschluss der Abfrage ab %s nicht prüfbar (kein Kurs am %s)" % (
+                    isin, dstr(starts[nr]), dstr(seite.datum(0))))
+
+        von = seite.index_nach(letzter_tag)
+        if von < len(seite):
+            neue.anhaengen(seite, von)
+            letzter_tag = neue.tage[-1]
+
+    if not seiten[0]:
+        return None
+    return neue
+
+def _hole_seitenweise(qu, *, isin:str, letztes_datum, letzter_kurs:float, ignore, warnungen:list, verbose:bool,
+                      abbruch=None):
+    # Ab dem letzten gelieferten Kurs so lange erneut abfragen, bis nichts Neues mehr kommt
+    data = als_kursspalten(qu["poi"].query_isin(isin=isin, startdate=letztes_datum))
+    if not data:
+        return None
+
+    neue = Kursspalten()
+    # Wird nur ein Kurs zurückgegeben, ist es der mit dem letzten Datum
+    # => keine neuen Kurse
+    while data and len(data) > 1:
+        _pruefe_anschluss(isin, letztes_datum, letzter_kurs, data, ignore=ignore, warnungen=warnungen, verbose=verbose)
+
+        von = data.index_nach(letztes_datum.toordinal())
+        if von == len(data):
+            break
+        neue.anhaengen(data, von)
+
+        # neues Anschlussdatum (entspricht dem letzten Kurs nach dem Speichern)
+        letztes_datum = neue.datum(-1)
+        letzter_kurs = neue.last[-1]
+
+        _pruefe_abbruch(abbruch)
+        data = als_kursspalten(qu["poi"].query_isin(isin=isin, startdate=letztes_datum))
+    return neue
+
+def _hole_von_abfrage(qu, *, isin:str, letztes_datum, letzter_kurs:float, ignore, verbose, bis, executor, abbruch=None):
+    # Kurse von einem Abfragemodul: (Kursspalten oder None, Warnungen)
+    warnungen = []
+    if getattr(qu["poi"], "FENSTER_TAGE", None):
+        neue_daten = _hole_fenster(qu, isin=isin, letztes_datum=letztes_datum, letzter_kurs=letzter_kurs,
+                                   bis=bis, executor=executor, ignore=ignore, warnungen=warnungen, verbose=verbose,
+                                   abbruch=abbruch)
+    else:
+        with abbruch_im_thread(abbruch):
+            neue_daten = _hole_seitenweise(qu, isin=isin, letztes_datum=letztes_datum, letzter_kurs=letzter_kurs,
+                                           ignore=ignore, warnungen=warnungen, verbose=verbose, abbruch=abbruch)
+    return neue_daten, warnungen
+
+def _hole_gleichzeitig(abfrager, *, isin:str, abfrage_executor, verbose, **kwargs):
+    # Alle Abfragemodule gleichzeitig fragen (jedes mit seiner eigenen Drosselung).
+    # Das erste Ergebnis, das Plausibilitäts- und Anschlussprüfung besteht, gilt; die übrigen
+    # Abfragen werden abgebrochen (noch nicht gestartete sofort, laufende vor ihrer nächsten Web-Abfrage,
+    # auch wenn sie gerade in der Drosselung warten, siehe `abbruch_im_thread`).
+    abbruch = threading.Event()
+    futures = {abfrage_executor.submit(_hole_von_abfrage, qu, isin=isin, verbose=verbose, abbruch=abbruch, **kwargs): nr
+               for nr, qu in enumerate(abfrager)}
+    warnungen = []
+    fehler = {}             # Position in `abfrager` -> Exception
+    try:
+        for future in concurrent.futures.as_completed(futures):
+            qu = abfrager[futures[future]]
             try:
-                data = qu["poi"].query_isin(isin=isin, startdate=letztes_datum)
+                neue_daten, qu_warnungen = future.result()
             except FehlendeISINAbfrageParameterException as msg:
-                messages.warning(msg)
+                warnungen.append(str(msg))
+                continue
+            except Exception as msg:
+                # z.B. PlausibilitaetskontrolleException, Anschluss nicht möglich, Verbindungsfehler
+                fehler[futures[future]] = msg
+                warnungen.append(f"* {qu['name']}: {msg}")
+                continue
+            if neue_daten is None:
+                warnungen.extend(qu_warnungen)
+                warnungen.append(f"* {qu['name']} gibt keine Kurse für {isin} zurück")
                 continue
-
             if verbose:
-                print("Ergebnis Onlineabfrage:", data)
-
-            anz_kurse = len(data)
-            if anz_kurse == 0:
-                messages.warning(f"* {qu['name']} gibt keine Kurse für {isin} zurück")
-                # Versuche nächsten abfrager
+                print("* %s: Kurse von %s" % (isin, qu["name"]))
+            return neue_daten, warnungen + qu_warnungen
+    finally:
+        abbruch.set()
+        for future in futures:
+            future.cancel()
+
+    # kein gültiges Ergebnis: Fehler des ersten Abfragemoduls wie bei der Abfrage nacheinander
+    if fehler:
+        raise fehler[min(fehler)]
+    return Kursspalten(), warnungen
+
+def _hole_neue_kurse(abfrager, *, isin:str, letztes_datum, letzter_kurs:float, ignore=None, verbose=False,
+                     bis=None, executor=None, abfrage_executor=None, budget=None):
+    """ Neue Kurse einer ISIN online abfragen
+
+    Läuft in einem eigenen Thread und greift deshalb nicht auf die Kurse-DB zu.
+
+    :param abfrager: Abfragen (siehe `init_abfragemodule`), die erste mit Kursen wird genommen
+    :param isin: ISIN
+    :param letztes_datum: Datum des letzten gespeicherten Kurses
+    :param letzter_kurs: letzter gespeicherter Kurs
+    :param ignore: erlaubte Abweichung beim Anschluss, defaults to None
+    :param bis: letzter benötigter Tag, defaults to None (heute)
+    :param executor: für die Abfragen mehrerer Fenster, defaults to None (nacheinander)
+    :param abfrage_executor: alle Abfragen gleichzeitig fragen, das erste gültige Ergebnis gilt,
+                             defaults to None (nacheinander)
+    :param budget: Rest des Budgets für das zweite und alle weiteren Abfragemodule (die Abfragen
+                   des ersten sind bereits eingeplant), defaults to None (unbegrenzt)
+    :type budget: _Budget, optional
+    :raises ValueError: Anschluss nicht möglich
+    :return: neue Kurse (für `upsert_kurs_spalten`), Warnungen
+    :rtype: tuple(Kursspalten, list of str)
+    """
+    if bis is None:
+        bis = datetime.date.today()
+
+    if abfrage_executor is not None and len(abfrager) > 1:
+        return _hole_gleichzeitig(abfrager, isin=isin, abfrage_executor=abfrage_executor, verbose=verbose,
+                                  letztes_datum=letztes_datum, letzter_kurs=letzter_kurs, ignore=ignore,
+                                  bis=bis, executor=executor)
+
+    warnungen = []
+    for nr, qu in enumerate(abfrager):
+        if verbose:
+            print("* Abfrage", qu["name"], isin)
+
+        if nr > 0 and budget is not None and \
+                not budget.reserviere(abfrage_kosten(letztes_datum, bis, getattr(qu["poi"], "FENSTER_TAGE", None))):
+            warnungen.append(f"* {qu['name']}: Budget reicht nicht für {isin}")
+            continue
+
+        try:
+            neue_daten, qu_warnungen = _hole_von_abfrage(qu, isin=isin, letztes_datum=letztes_datum,
+                                                         letzter_kurs=letzter_kurs, ignore=ignore, verbose=verbose,
+                                                         bis=bis, executor=executor)
+        except FehlendeISINAbfrageParameterException as msg:
+            warnungen.append(str(msg))
+            continue
+        warnungen.extend(qu_warnungen)
+
+        if neue_daten is None:
+            warnungen.append(f"* {qu['name']} gibt keine Kurse für {isin} zurück")
+            # Versuche nächsten abfrager
+            continue
+        return neue_daten, warnungen
+
+    return Kursspalten(), warnungen
+
+def waehle_auftraege(uebersicht, *, heute, fenster_tage=None, budget=None, alle=False, kalender=KALENDER_XETRA):
+    """ ISINs für "refresh" auswählen und nach Alter ordnen
+
+    Aktuell ist eine ISIN, wenn der letzte Kurs vom letzten Handelstag vor `heute` (oder neuer)
+    stammt; der Kurs von heute steht meist erst am Abend fest.
+
+    :param uebersicht: Einträge von `KurseDB.kurs_uebersicht` (nur ISINs mit Kursen)
+    :param heute: Tag des Aufrufs
+    :param fenster_tage: Abstand der Abfragen in Tagen (für deren Zahl, siehe `abfrage_kosten`), defaults to None (1 Abfrage pro ISIN)
+    :param budget: höchstens so viele Abfragen, defaults to None (unbegrenzt)
+    :param alle: auch aktuelle ISINs abfragen, defaults to False
+    :return: ausgewählte Einträge (die ältesten zuerst), aktuelle ISINs, wegen `budget` übersprungene ISINs
+    :rtype: tuple(list of dict, list of str, list of str)
+    """
+    erwartet = letzter_handelstag(heute - datetime.timedelta(days=1), kalender)
+
+    aktuell = []
+    kandidaten = []
+    for item in uebersicht:
+        if not alle and item[KURSEDB_LETZTER_DATUM] >= erwartet:
+            aktuell.append(item[KURSEDB_ISIN])
+        else:
+            fehlend = anzahl_handelstage(item[KURSEDB_LETZTER_DATUM], erwartet, kalender)
+            kandidaten.append((fehlend, item))
+    kandidaten.sort(key=lambda x: x[0], reverse=True)
+
+    auswahl = []
+    uebersprungen = []
+    rest = budget
+    for _, item in kandidaten:
+        kosten = abfrage_kosten(item[KURSEDB_LETZTER_DATUM], heute, fenster_tage)
+        if rest is not None:
+            if kosten > rest:
+                uebersprungen.append(item[KURSEDB_ISIN])
                 continue
-
-            if anz_kurse == 1:
-                # Es wurden Kurse zurückgegeben, aber nur der mit dem letzten Datum
-                # => keine neuen Kurse
-                break
-
-            while True:
-                # Es wurden mehrere Kurse zurückgegeben
-                # Prüfe, ob der erste zurückgegebene mit dem letzten
-                # gespeicherten Kurs übereinstimmt
-                first_date = data[0][KURSABFRAGE_DATUM].date()
-                first_kurs = data[0][KURSABFRAGE_LAST]
-
-                if (letztes_datum != first_date) or (letzter_kurs != first_kurs):
-                    # Fehler: Debug-Ausgabe
-                    # ak = kursedb.get_alle_kurse(isin)
-                    # for item in ak:
-                    #     print(item[KURSEDB_DATUM].strftime("%d.%m.%Y"), item[KURSEDB_SCHLUSSKURS])
-
-                    abw = abs(letzter_kurs-first_kurs)
-
+            rest -= kosten
+        auswahl.append(item)
+    return auswahl, aktuell, uebersprungen
+
+def refresh_datenbank(*, config, downloader, kursedb, stammdaten, ignore=None, verbose=False,
+                      abfrager=None, threads:int=REFRESH_THREADS, heute=None, budget=None, alle=False,
+                      gleichzeitig=False):
+    """ Neue Kurse für die ISINs der Kurse-DB holen
+
+    Abgefragt werden nur ISINs, denen laut Handelskalender Kurse fehlen, die ältesten zuerst
+    (siehe `waehle_auftraege`).
+
+    Die Abfragen laufen parallel in `threads` Threads. Fehlen bei einer ISIN mehrere Wochen,
+    werden alle dafür nötigen Abfragen (siehe `plane_fenster`) auf einmal gestartet. Die
+    Abstände zwischen den Abfragen an dieselbe Website regelt `GedrosselterDownloader`.
+    Gelesen und geschrieben wird die Kurse-DB nur im aufrufenden Thread.
+
+    :param abfrager: Abfragen, defaults to None (alle aktiven Abfragemodule mit gedrosseltem `downloader`)
+    :param threads: Anzahl paralleler Abfragen, defaults to REFRESH_THREADS
+    :param heute: Tag des Aufrufs, defaults to None (heute)
+    :param budget: höchstens so viele Web-Abfragen, defaults to None (unbegrenzt)
+    :param alle: auch aktuelle ISINs abfragen, defaults to False
+    :param gleichzeitig: alle Abfragemodule gleichzeitig fragen, das erste gültige Ergebnis gilt,
+                         defaults to False (nacheinander, bis eines Kurse liefert)
+    """
+    # Initialisierung der Onlineabfrage (Aufzeichnungen ohne Drosselung, siehe lib/aufzeichnung.py)
+    if abfrager is None:
+        if not getattr(downloader, "ohne_drosselung", False):
+            downloader = GedrosselterDownloader(downloader)
+        abfrager = init_abfragemodule(
+            downloader=downloader,
+            config=config,
+            stammdaten=stammdaten
+        )
+
+    if heute is None:
+        heute = datetime.date.today()
+
+    # Anschlussdaten aller ISINs aus der Datenbank (eine Abfrage)
+    uebersicht = []
+    for item in kursedb.kurs_uebersicht():
+        isin = item[KURSEDB_ISIN]
+        if stammdaten.get_entry(isin) is None:
+            raise ValueError(f"*** {isin} nicht in Stammdaten")
+        if item[KURSEDB_ANZAHL] == 0:
+            messages.warning(f"{isin}: keine Kurse in der Datenbank, erste Kurse bitte per CSV einlesen")
+            continue
+        uebersicht.append(item)
+
+    # Budget: eingeplant werden die Abfragen des ersten Abfragemoduls, bei `gleichzeitig` die
+    # aller Abfragemodule. Weitere Abfragemodule werden nur gefragt, solange der Rest reicht.
+    anz_abfrager = len(abfrager) if gleichzeitig and len(abfrager) > 1 else 0
+    fenster_tage = [getattr(qu["poi"], "FENSTER_TAGE", None) for qu in abfrager[:max(1, anz_abfrager)]]
+    auswahl, aktuell, uebersprungen = waehle_auftraege(uebersicht, heute=heute, fenster_tage=fenster_tage,
+                                                       budget=budget, alle=alle)
+    rest = None
+    if budget is not None:
+        rest = _Budget(budget - sum([abfrage_kosten(item[KURSEDB_LETZTER_DATUM], heute, fenster_tage) for item in auswahl]))
+    print("%d ISINs aktuell, %d abzufragen" % (len(aktuell), len(auswahl)))
+    if uebersprungen:
+        messages.info("Refresh: Budget von %d Abfragen reicht nicht für %s" % (budget, ", ".join(uebersprungen)))
+
+    auftraege = []
+    for item in auswahl:
+        isin = item[KURSEDB_ISIN]
+        isin_name = stammdaten.get_entry(isin)[STAMMDATEN_NAME]
+        if verbose:
+            print("ISIN:", isin, "-", isin_name)
+            print("interne Nummer", item[KURSEDB_FONDID])
+            print("last:", item[KURSEDB_LETZTER_DATUM], item[KURSEDB_LETZTER_SCHLUSSKURS])
+        auftraege.append((isin, isin_name, item[KURSEDB_LETZTER_DATUM], item[KURSEDB_LETZTER_SCHLUSSKURS]))
+
+    # eigene Pools für die Abfragemodule und die Fenster, da die Threads der ISINs bzw.
+    # Abfragemodule auf deren Ergebnis warten
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=threads * max(1, anz_abfrager)) as fenster_executor, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=threads * max(1, anz_abfrager)) as abfrage_executor:
+        futures = {}
+        for isin, isin_name, letztes_datum, letzter_kurs in auftraege:
+            future = executor.submit(_hole_neue_kurse, abfrager,
+                                     isin=isin, letztes_datum=letztes_datum, letzter_kurs=letzter_kurs,
+                                     ignore=ignore, verbose=verbose, bis=heute, executor=fenster_executor,
+                                     abfrage_executor=abfrage_executor if anz_abfrager else None, budget=rest)
+            futures[future] = (isin, isin_name)
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                isin, isin_name = futures[future]
+                neue_daten, warnungen = future.result()
+                for warnung in warnungen:
+                    messages.warning(warnung)
+                print("%s - %s: %d neue Kurse" % (isin, isin_name, len(neue_daten)))
+
+                # speichere neue Daten in Datenbank (nur hier wird geschrieben)
+                if len(neue_daten) > 0:
+                    kursedb.upsert_kurs_spalten(isin, tage=neue_daten.tage, schluss=neue_daten.last,
+                                                volumen=neue_daten.volume)
                     if verbose:
-                        print("%s (intern %s): %s" % (isin, kursedb.isin2index(isin), isin_name))
-                        print("Anschluss stimmt nicht")
-                        print("Datenbank.:", dstr(letztes_datum), letzter_kurs)
-                        print("Online....:", dstr(first_date), first_kurs)
-                        print("Abweichung:", p2k(abw))
-                        print("Ignoriere.:", ignore)
-
-                    if (ignore is not None) and (abw <= ignore):
-                        messages.warning("Ignoriere Unstimmigkeit beim Anschluss von %s: %s" % (
-                            isin,
-                            p2k(abw)
-                        ))
-                    else:
-                        raise ValueError("Anschluss nicht möglich bei %s, Abweichung %s" % (
-                            isin,
-                            p2k(abw)
-                        ))
-
-                # Bestimme neue Daten
-                if verbose:
-                    print("letztes Datum:", letztes_datum, letzter_kurs)
-
-                neue_daten = []
-                for item in data:
-                      if item[OV_ONLINE_DATUM].date() > letztes_datum:
-                        neu = {
-                            KURSEDB_DATUM: item [OV_ONLINE_DATUM],
-                            KURSEDB_SCHLUSSKURS: item[OV_ONLINE_LAST],
-                            KURSEDB_VOLUMEN: item[OV_ONLINE_VOLUME]
-                        }
-                        neue_daten.append(neu)
-                        if verbose:
-                            print(neu)
-
-                if verbose:
-                    print("ISIN............:", isin)
-                    print("Einträge vorher.:", kursedb.count_kurse())
-                    print("Anzahl neu......:", len(neue_daten))
-                    print("Neue Daten......:", neue_daten)
-
-                # speichere neue Daten in Datenbank
-                kursedb.insert_kurse(isin, datalist=neue_daten)
-                if verbose:
-                    print("Einträge nachher:", kursedb.count_kurse())
-                    res = stammdaten.get_entry(isin)
-                    print(isin_name)
-                    print(isin_waehrung)
-
-                # Suche (neues) Anschlussdatum in der Datenbank
-                k = kursedb.get_last_kurs(isin)
-                letztes_datum = k[KURSEDB_DATUM]
-                letzter_kurs = k[KURSEDB_SCHLUSSKURS]
-
-                data = qu["poi"].query_isin(isin=isin, startdate=letztes_datum)
-                anz_kurse = len(data)
-                if anz_kurse <= 1:
-                    break
-            break
-
+                        print("Einträge nachher:", kursedb.count_kurse())
+        except BaseException:
+            # keine weiteren Abfragen starten und wartende Threads wecken, sonst wartet das
+            # Verlassen des `with` auf die Drosselung (bis zu 14 s pro Thread)
+            abbrechen = getattr(downloader, "abbrechen", None)
+            if abbrechen is not None:
+                abbrechen()
+            executor.shutdown(wait=False, cancel_futures=True)
+            fenster_executor.shutdown(wait=False, cancel_futures=True)
+            abfrage_executor.shutdown(wait=False, cancel_futures=True)
+            raise
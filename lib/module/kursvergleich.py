@@ -6,6 +6,7 @@ from lib.kursedb import *
 from lib.stammdaten import *
 from lib.config import Config
 from lib.utils import dstr
+from lib.waehrung import Waehrungsfaktoren, KeinWaehrungskursError
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -47,6 +48,8 @@ def db_kursvergleich(isins, startdatum:str, kursedb, stammdaten, savesvg=True):
         stammd[isin] = stammdaten.get_entry(isin)
         assert stammd is not None, "Keine Stammdaten für " + isin
 
+    waehrungsfaktoren = Waehrungsfaktoren(kursedb, bewertungswaehrung=BEWERTUNGSWAEHRUNG)
+
     COLORS = ["red", "blue", "green", "black", "grey", "pink"]
 
     ax_counter = -1
@@ -56,39 +59,34 @@ def db_kursvergleich(isins, startdatum:str, kursedb, stammdaten, savesvg=True):
 
 
 
-        kx = kursedb.get_alle_kurse(isin, start=startdatum, ende=enddatum)
-
-        if kx is None:
+        # nur einzelne Kurse lesen, die Reihe wird unten nacheinander gelesen (ohne Zwischenspeicher)
+        startkurs = kursedb.get_kurs_db(isin, startdatum, exact=False, laden=False)
+        if startkurs is None:
             raise ValueError("Keine Daten für %s in Kursdatenbank" % isin)
-
-        startkurs = kursedb.get_kurs_db(isin, startdatum, exact=False)[KURSEDB_SCHLUSSKURS]
-        if stammd[isin][STAMMDATEN_KURSWAEHRUNG] in [BEWERTUNGSWAEHRUNG, "Pkt."]:
-            # keine Umrechnung erforderlich
-            proz_kurs = [(x[KURSEDB_SCHLUSSKURS]-startkurs)/startkurs*100.0 for x in kx]
-        else:
-            # mit Währungs-Tageskurs bewerten
-            waehrungsfaktor = kursedb.get_waehrungs_faktor(stammd[isin][STAMMDATEN_KURSWAEHRUNG], BEWERTUNGSWAEHRUNG, startdatum)
-            if waehrungsfaktor in [None, 0]:
-                raise ValueError("ISIN %s: keine Währungsumrechnung gefunden für %s am %s" % (
-                    isin,
-                    stammd[isin][STAMMDATEN_KURSWAEHRUNG],
-                    dstr(startdatum)
-                ))
-            startkurs = startkurs * waehrungsfaktor
-            proz_kurs = []
-            for x in kx:
-                dat = x[KURSEDB_DATUM]
-                waehrungsfaktor = kursedb.get_waehrungs_faktor(stammd[isin][STAMMDATEN_KURSWAEHRUNG], BEWERTUNGSWAEHRUNG, dat)
-                if waehrungsfaktor in [None, 0]:
-                    raise ValueError("ISIN %s: keine Währungsumrechnung gefunden für %s am %s" % (
-                        isin,
-                        stammd[isin][STAMMDATEN_KURSWAEHRUNG],
-                        dstr(dat)
-                    ))
-                proz_kurs.append((x[KURSEDB_SCHLUSSKURS]*waehrungsfaktor-startkurs)/startkurs*100.0)
-
-        datx = [np.datetime64(x["datum"]) for x in kx]
-        daty = [x["schluss"] for x in kx]
+        startkurs = startkurs[KURSEDB_SCHLUSSKURS]
+
+        waehrung = stammd[isin][STAMMDATEN_KURSWAEHRUNG]
+        umrechnen = waehrung not in [BEWERTUNGSWAEHRUNG, "Pkt."]
+        if umrechnen:
+            # mit Währungs-Tageskurs bewerten (Kurse des Währungspaars mit einer Abfrage)
+            try:
+                startkurs = startkurs * waehrungsfaktoren.faktor(waehrung, startdatum)
+            except KeinWaehrungskursError as e:
+                raise ValueError("ISIN %s: %s" % (isin, e))
+
+        # Kurse nur einmal durchlaufen, statt sie zusätzlich als Liste zu halten
+        datx = []
+        daty = []
+        proz_kurs = []
+        try:
+            for datum, schluss in kursedb.iter_kurse(isin, start=startdatum, ende=enddatum):
+                datx.append(np.datetime64(datum))
+                daty.append(schluss)
+                if umrechnen:
+                    schluss = schluss * waehrungsfaktoren.faktor(waehrung, datum)
+                proz_kurs.append((schluss-startkurs)/startkurs*100.0)
+        except KeinWaehrungskursError as e:
+            raise ValueError("ISIN %s: %s" % (isin, e))
 
         axs[ax_counter].set_title("%s\n%s (%s)" % (stammd[isin][STAMMDATEN_NAME], isin, stammd[isin][STAMMDATEN_KURSWAEHRUNG]))
         axs[ax_counter].title.set_size(10)
@@ -7,6 +7,7 @@ from lib.vorabpauschale import get_basiszins_proz
 from lib.kursedb import *
 from lib.stammdaten import *
 from lib.tranche import *
+from lib.waehrung import Waehrungsfaktoren
 
 import datetime
 
@@ -20,23 +21,23 @@ def berechne_realisierte_GuV(*, isin:str, depot:str, jahr:int, transaktionen, ku
     summe_gewinn_im_jahr = 0.0
 
     kaeufe = []
-    for item in transaktionen.get_by_isin(isin, depot=depot):
-        ttyp = item[TRANSAKTION_TYP].lower()
-        tdatum = dparse(item[TRANSAKTION_DATUM])
+    for buchung in transaktionen.get_buchungen_by_isin(isin, depot=depot):
+        ttyp = buchung.typ.lower()
+        tdatum = buchung.datum
         if ttyp == TRANSAKTION_TYP_KAUF:
-            wfaktor = kursedb.get_waehrungs_faktor(item[TRANSAKTION_WAEHRUNG], BEWERTUNGSWAEHRUNG, tdatum)
+            wfaktor = kursedb.get_waehrungs_faktor(buchung.waehrung, BEWERTUNGSWAEHRUNG, tdatum)
             tr = Transaktion(
                 typ=TRANSAKTION_TYP_KAUF,
                 datum=tdatum,
-                anzahl=k2p(item[TRANSAKTION_ANZAHL]),
-                kurs_zum_datum=k2p(item[TRANSAKTION_KURS]),
+                anzahl=buchung.anzahl,
+                kurs_zum_datum=buchung.kurs,
                 waehrungsfaktor_zum_datum=wfaktor
             )
             kaeufe.append(tr)
         elif ttyp == TRANSAKTION_TYP_VERKAUF:
             # suche zugehörige Tranche
-            verkaufs_rest = k2p(item[TRANSAKTION_ANZAHL])
-            verkaufs_kurs = k2p(item[TRANSAKTION_KURS])
+            verkaufs_rest = buchung.anzahl
+            verkaufs_kurs = buchung.kurs
             for kauf in kaeufe:
                 if kauf.variable_anzahl == 0:
                     continue
@@ -125,25 +126,22 @@ def do_vorabpauschale(isin:str, depot:str, jahr:int, stammdaten, transaktionen,
 
     # Bestimme Anzahl der Anteil zu Jahresbeginn
     anteile_jahresanfang = 0.0
-    first = True
-    for item in transaktionen.get_by_isin(isin, depot=depot):
-        first = False
-        da = dparse(item[TRANSAKTION_DATUM])
-        if da < jahresstart:
-            if item[TRANSAKTION_TYP] == TRANSAKTION_TYP_KAUF:
-                anteile_jahresanfang += k2p(item["anzahl"])
-            elif item[TRANSAKTION_TYP] == TRANSAKTION_TYP_VERKAUF:
-                anteile_jahresanfang -= k2p(item["anzahl"])
-            elif item[TRANSAKTION_TYP] == TRANSAKTION_TYP_AUSSCHUETTUNG:
-                continue
-            else:
-                raise ValueError("ungültige Transaktion: "+item[TRANSAKTION_TYP])
-        else:
-            break
-
-    if first:
+    buchungen = transaktionen.get_buchungen_by_isin(isin, depot=depot)
+    if len(buchungen) == 0:
         raise ValueError("Keine Daten vorhanden für %s" % isin)
 
+    for buchung in buchungen:
+        if buchung.datum >= jahresstart:
+            break
+        if buchung.typ == TRANSAKTION_TYP_KAUF:
+            anteile_jahresanfang += buchung.anzahl
+        elif buchung.typ == TRANSAKTION_TYP_VERKAUF:
+            anteile_jahresanfang -= buchung.anzahl
+        elif buchung.typ == TRANSAKTION_TYP_AUSSCHUETTUNG:
+            continue
+        else:
+            raise ValueError("ungültige Transaktion: "+buchung.typ)
+
     print("ISIN ...........:", isin)
     print("Name ...........:", stammdat[STAMMDATEN_NAME])
     print("Depot ..........:", depot)
@@ -164,13 +162,15 @@ def do_vorabpauschale(isin:str, depot:str, jahr:int, stammdaten, transaktionen,
     jahresanfang = kursedb.get_kurs(isin, jahresstart)
     assert jahresanfang is not None, "Keine Kursdaten für " + isin
     kurs_jahresanfang = jahresanfang[KURSEDB_SCHLUSSKURS]
-    waehrungsfaktor_jahresanfang = kursedb.get_waehrungs_faktor(kurs_waehrung, BEWERTUNGSWAEHRUNG, jahresstart)
+    # Währungskurse auf einmal laden
+    waehrungsfaktoren = Waehrungsfaktoren(kursedb, bewertungswaehrung=BEWERTUNGSWAEHRUNG)
+    waehrungsfaktor_jahresanfang = waehrungsfaktoren.faktor(kurs_waehrung, jahresstart)
 
     # Bestimme letzten Kurs, des Jahres
     kursedat_last = kursedb.get_kurs(isin, jahresende)
     kurs_last = kursedat_last[KURSEDB_SCHLUSSKURS]
     kurs_last_datum = kursedat_last[KURSEDB_DATUM]
-    waehrungsfaktor_last = kursedb.get_waehrungs_faktor(kurs_waehrung, BEWERTUNGSWAEHRUNG, kurs_last_datum)
+    waehrungsfaktor_last = waehrungsfaktoren.faktor(kurs_waehrung, kurs_last_datum)
 
 
     print("Letzter Kurs vom:", dstr(kurs_last_datum), "-", p2k(kurs_last,4))
@@ -193,7 +193,8 @@ def do_vorabpauschale(isin:str, depot:str, jahr:int, stammdaten, transaktionen,
     )
     ja.do_transaktionen(transaktionen=alletrans,
                         fondwaehrung=kurs_waehrung,
-                        kursedb=kursedb)
+                        kursedb=kursedb,
+                        waehrungsfaktoren=waehrungsfaktoren)
     res = ja.bewertung(
         jahr=jahr,
         jahresstartkurs=kurs_jahresanfang,
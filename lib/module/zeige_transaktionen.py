@@ -26,7 +26,7 @@ def zeige_transaktionen(*, transaktionen, stammdaten, isin, depot):
                 item[TRANSAKTION_TYP]
               ), end=" ")
 
-        if item[TRANSAKTION_TYP] == TRANSAKTION_AUSSCHUETTUNG:
+        if item[TRANSAKTION_TYP] == TRANSAKTION_TYP_AUSSCHUETTUNG:
             print("%7s" % p2k(k2p(item.get(AUSSCHUETTUNG_BETRAG)),2))
         else:
             print("%21s %10s" % (
@@ -4,54 +4,96 @@
 import os
 import importlib
 
-module_list = None
-
 # Zu berücksichtigende Pyhton-Dateien starten mit:
 NAMESTART = "query_"
 
-# Structure of MODULES_INFOS
+# Registry der Abfragemodule
+#
+# Beim ersten Zugriff wird nur das Verzeichnis gelesen. Die ID eines Moduls ergibt sich
+# aus dem Dateinamen (query_<ID>.py) und muss mit Onlineabfrage.ID übereinstimmen.
+# Importiert wird ein Modul erst, wenn es wirklich gebraucht wird. Das Ergebnis bleibt
+# für die Laufzeit des Programms gespeichert.
 #
-# list of dicts items
+# _REGISTRY       dict: ID -> Modulname (ohne Import ermittelt)
+# _GELADEN        dict: ID -> Modul-Info oder None (SKIP_ME gesetzt)
+#
+# Structure of the module infos
 #
 # name                        name of the module (from Onlineabfrage.ID)
-# mpoi                        module pointer
+# module                      module pointer
 
-MODULES_INFOS = []
+_REGISTRY = None
+_GELADEN = {}
 
-def get_modules_info():
-    filelist = os.listdir(os.path.dirname(__file__))
-    allmodlist = [x[:-3] for x in filelist if x.endswith(
-        '.py') and x.startswith(NAMESTART)]
+def _registry():
+    global _REGISTRY
+    if _REGISTRY is None:
+        filelist = sorted(os.listdir(os.path.dirname(__file__)))
+        _REGISTRY = {}
+        for x in filelist:
+            if x.endswith('.py') and x.startswith(NAMESTART):
+                modname = x[:-3]
+                _REGISTRY[modname[len(NAMESTART):]] = modname
+    return _REGISTRY
+
+def get_abfrage_ids():
+    """ IDs aller vorhandenen Abfragemodule (ohne sie zu importieren)
+
+    :return: IDs
+    :rtype: list of str
+    """
+    return list(_registry().keys())
+
+def _lade_abfrage(siteid):
+    if siteid in _GELADEN:
+        return _GELADEN[siteid]
 
+    modname = _registry()[siteid]
+    mpoi = importlib.import_module("." + modname, package=__name__)
+    assert mpoi.Onlineabfrage.ID == siteid, "ID %s passt nicht zu %s" % (mpoi.Onlineabfrage.ID, modname)
+
+    minfo = None
+    if not mpoi.SKIP_ME:
+        minfo = {
+            'name': mpoi.Onlineabfrage.ID,
+            'module': mpoi
+        }
+    _GELADEN[siteid] = minfo
+    return minfo
+
+def get_modules_info():
     active_mods = []
-    for modname in allmodlist:
-        # print("modname", modname)
-
-        mpoi = importlib.import_module("." + modname, package=__name__)
-        if not mpoi.SKIP_ME:
-            minfo = {
-                'name': mpoi.Onlineabfrage.ID,
-                'module': mpoi
-            }
+    for siteid in get_abfrage_ids():
+        minfo = _lade_abfrage(siteid)
+        if minfo is not None:
             active_mods.append(minfo)
     return active_mods
 
 # Zugriff auf bestimmte Abfrage
 def get_abfrage_by_id(siteid):
-    for mods in get_modules_info():
-        if siteid != mods['name']:
-            continue
-
-        return mods
-    return None
+    if siteid not in _registry():
+        return None
+    return _lade_abfrage(siteid)
 
 def iter_modules():
-    for mod in MODULES_INFOS:
+    for mod in get_modules_info():
         yield mod
 
-def init_abfragemodule(*, downloader, config, stammdaten):
+def init_abfragemodule(*, downloader, config, stammdaten, ids=None):
+    """ Erzeuge die Abfrage-Objekte
+
+    :param ids: nur diese Abfragen (None = alle aktiven), defaults to None
+    :type ids: list of str, optional
+    :return: Liste von dicts mit "name" und "poi"
+    :rtype: list
+    """
+    if ids is None:
+        mods = get_modules_info()
+    else:
+        mods = [x for x in [get_abfrage_by_id(siteid) for siteid in ids] if x is not None]
+
     abfrager = []
-    for qu in iter_modules():
+    for qu in mods:
         name = qu["name"]
         poi = qu["module"].Onlineabfrage(
             downloader= downloader,
@@ -61,5 +103,3 @@ def init_abfragemodule(*, downloader, config, stammdaten):
             { "name": name, "poi": poi}
         )
     return abfrager
-
-MODULES_INFOS = get_modules_info()
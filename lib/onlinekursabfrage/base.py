@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from array import array
 import datetime
+import math
 
-# Name der Dict-Elemente
+from ..kurscache import tag_index_exakt, tag_index_nach
+
+# Name der Dict-Elemente (Kurse zeilenweise, siehe `Kursspalten.aus_zeilen`)
 KURSABFRAGE_DATUM = "datum"   # Datum des Kurses (datetime.datetime)
 KURSABFRAGE_LAST = "last"     # Schlusskurs (float)
+KURSABFRAGE_LOW = "low"       # optional
+KURSABFRAGE_HIGH = "high"     # optional
+KURSABFRAGE_VOLUME = "volume" # optional
+
+_UNIX_EPOCHE = datetime.date(1970, 1, 1).toordinal()
+_SEKUNDEN_PRO_TAG = 86400
 
 SKIP_ME = False               # auf True setzen, wenn abgeleitetes Modul nicht mehr verwendet werden soll
 
@@ -17,15 +27,105 @@ class PlausibilitaetskontrolleException(Exception):
     "Plausibilitätskontrolle fehlgeschlagen"
     pass
 
+def unix_zu_tagen(zeitstempel) -> array:
+    """ Unix-Zeitstempel -> Tage (UTC) als Ordinalzahl, ohne datetime-Objekte
+
+    :param zeitstempel: Sekunden seit 1.1.1970
+    :type zeitstempel: list of int/float
+    :rtype: array('l')
+    """
+    return array('l', [int(ts // _SEKUNDEN_PRO_TAG) + _UNIX_EPOCHE for ts in zeitstempel])
+
+def _spalte(werte) -> array:
+    # None (bzw. null im JSON) -> NaN
+    try:
+        return array('d', werte)
+    except TypeError:
+        return array('d', [math.nan if x is None else x for x in werte])
+
+class Kursspalten:
+    """ Ergebnis einer Kursabfrage spaltenweise (gleich lange Arrays, Tage aufsteigend)
+
+    tage      array('l')  Tag als Ordinalzahl (datetime.date.toordinal)
+    last      array('d')  Schlusskurs
+    low       array('d')  NaN = nicht vorhanden
+    high      array('d')  NaN = nicht vorhanden
+    volume    array('d')  NaN = nicht vorhanden
+    """
+    __slots__ = ("tage", "last", "low", "high", "volume")
+
+    def __init__(self, tage=(), last=(), low=None, high=None, volume=None):
+        self.tage = tage if isinstance(tage, array) else array('l', tage)
+        self.last = _spalte(last)
+        self.low = self._leer() if low is None else _spalte(low)
+        self.high = self._leer() if high is None else _spalte(high)
+        self.volume = self._leer() if volume is None else _spalte(volume)
+        assert len(self.last) == len(self.tage), "Kursspalten unterschiedlich lang"
+
+    def _leer(self) -> array:
+        return array('d', [math.nan]) * len(self.tage)
+
+    @classmethod
+    def aus_zeilen(cls, zeilen):
+        """ Kurse als Liste von dicts (KURSABFRAGE_DATUM, KURSABFRAGE_LAST, ...) umwandeln
+
+        :rtype: Kursspalten
+        """
+        return cls(tage=[x[KURSABFRAGE_DATUM].toordinal() for x in zeilen],
+                   last=[x[KURSABFRAGE_LAST] for x in zeilen],
+                   low=[x.get(KURSABFRAGE_LOW) for x in zeilen],
+                   high=[x.get(KURSABFRAGE_HIGH) for x in zeilen],
+                   volume=[x.get(KURSABFRAGE_VOLUME) for x in zeilen])
+
+    def __len__(self):
+        return len(self.tage)
+
+    def datum(self, i:int) -> datetime.date:
+        return datetime.date.fromordinal(self.tage[i])
+
+    def index_nach(self, tag:int) -> int:
+        """ Position des ersten Kurses nach dem Tag (Ordinalzahl)
+        """
+        return tag_index_nach(self.tage, tag)
+
+    def index_exakt(self, tag:int):
+        """ Position des Kurses genau am Tag (Ordinalzahl)
+
+        :return: Index oder None
+        :rtype: int
+        """
+        return tag_index_exakt(self.tage, tag)
+
+    def anhaengen(self, andere, von:int=0) -> None:
+        """ Kurse von `andere` ab Position `von` anhängen (ganze Teilstücke der Arrays)
+        """
+        self.tage.extend(andere.tage[von:])
+        self.last.extend(andere.last[von:])
+        self.low.extend(andere.low[von:])
+        self.high.extend(andere.high[von:])
+        self.volume.extend(andere.volume[von:])
+
+def als_kursspalten(data):
+    """ Ergebnis von `query_isin` als Kursspalten (ältere Module liefern eine Liste von dicts)
+
+    :return: Kursspalten oder None (keine Kurse)
+    """
+    if data is None or isinstance(data, Kursspalten):
+        return data
+    return Kursspalten.aus_zeilen(data)
+
 class BaseOnlineabfrage:
     ID = None           # eindeutige ID - muss implementiert werden
+    FENSTER_TAGE = None # Tage, die eine Abfrage ab `startdate` mindestens liefert (None = unbekannt,
+                        # dann wird ab dem letzten gelieferten Kurs erneut abgefragt)
 
     def __init__(self, *, downloader, stammdaten, iniconfig):
         self.downloader = downloader   # Web-Zugriff
         self.stammdaten = stammdaten   # Alle Fondsdaten => ID des Fonds für die API
         self.iniconfig = iniconfig     # => Zugangsdaten
 
-    # Die Kursabfrage gibt nur die Kurse zurück.
+    # Die Kursabfrage gibt nur die Kurse zurück (als `Kursspalten`; eine Liste von dicts mit
+    # KURSABFRAGE_DATUM, KURSABFRAGE_LAST, ... wird weiterhin akzeptiert).
     # Die `query_isin` muss aber auch eine Plausibilitätsprüfung durchführen:
     # - falls die Onlinedaten eine Währung bzw. einen Markt beinhalten, MUSS diese mit den
     #   Stammdaten verglichen und ggf. eine Exception geworfen werden.
@@ -12,8 +12,15 @@ SKIP_ME = False
 # Keys in Stammdaten für Onvista
 ONVISTA_ENTITY = "onvista_entity"
 ONVISTA_NOTATION = "onvista_notation"
+
+# Adresse der API, kann in der Konfigdatei geändert werden ([onvista] api_url, z.B. für `StandInServer`)
+ONVISTA_API_URL = "https://api.onvista.de"
+
 class Onlineabfrage(BaseOnlineabfrage):
     ID = "onvista"
+    # range=M1 liefert mindestens 28 Tage; der Abstand der Abfragen ist deutlich kürzer, damit sich
+    # aufeinanderfolgende Abfragen immer um einige Handelstage überlappen (Prüfung des Anschlusses)
+    FENSTER_TAGE = 21
 
     def query_isin(self, *, isin:str, startdate:datetime.date):
         dat = self.stammdaten.get_entry(isin)
@@ -35,6 +42,12 @@ class Onlineabfrage(BaseOnlineabfrage):
             entitytype=entitytype
         )
 
+    def _api_url(self) -> str:
+        section = self.iniconfig.get_section("onvista") if self.iniconfig is not None else None
+        if section is not None and "api_url" in section:
+            return section["api_url"].rstrip("/")
+        return ONVISTA_API_URL
+
     def _query(self, *, fondid:str, notation:str, startdate:datetime.date, fondswaehrung:str, entitytype=None):
         global stammdaten
 
@@ -53,7 +66,7 @@ class Onlineabfrage(BaseOnlineabfrage):
             check_kvg = False
 
         start_str = startdate.strftime("%Y-%m-%d")
-        query = f'https://api.onvista.de/api/v1/instruments/{inst}/{fondid}/eod_history?idNotation={notation}&range=M1&startDate={start_str}&withEarnings=false'
+        query = f'{self._api_url()}/api/v1/instruments/{inst}/{fondid}/eod_history?idNotation={notation}&range=M1&startDate={start_str}&withEarnings=false'
 
         status, data, _ = self.downloader.get_url(query)
         if status // 100 != 2:
@@ -71,15 +84,10 @@ class Onlineabfrage(BaseOnlineabfrage):
                 dj["isoCurrency"], fondid, fondswaehrung
             ))
 
-        kurse = []
-        for item in zip(dj["datetimeLast"], dj["last"], dj["low"], dj["high"], dj["volume"]):
-            kurse.append(
-                {
-                    "datum": datetime.datetime.utcfromtimestamp(item[0]),
-                    "last": item[1],
-                    "low": item[2],
-                    "high": item[3],
-                    "volume": item[4]
-                }
-            )
-        return kurse
+        return Kursspalten(
+            tage=unix_zu_tagen(dj["datetimeLast"]),
+            last=dj["last"],
+            low=dj["low"],
+            high=dj["high"],
+            volume=dj["volume"]
+        )
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Prüfung der Yaml-Eingabedaten
+#
+# Jede Datei wird genau einmal durchlaufen. Auf jedes Dokument werden dabei alle
+# Prüfregeln angewendet. Eine Prüfregel ist eine Funktion, die den Yaml-Eintrag
+# erhält und bei einem Fehler einen ValueError (bzw. AssertionError) wirft.
+#
+# Die Fehler werden gesammelt und erst am Ende gemeinsam gemeldet.
+#
+# Optional wird das Ergebnis pro Dokument (Schlüssel: Hash des Inhalts) gespeichert.
+# Bei späteren Läufen werden dann nur neue oder geänderte Dokumente geprüft.
+# Der "Kontext" beschreibt alles, wovon die Regeln außer dem Dokument abhängen
+# (z.B. die ISINs der Stammdaten). Ändert er sich, wird alles neu geprüft.
+
+import hashlib
+import os
+import pickle
+
+from .utils import lade_pickle, speichere_pickle
+
+# Verzeichnis für die gespeicherten Prüfergebnisse (None = nicht speichern)
+PRUEFCACHE_VERZEICHNIS = os.path.expanduser("~/.cache/depotauswertung/pruefung")
+
+# Bei Änderungen an den Prüfregeln erhöhen
+REGELVERSION = 1
+
+class Verstoss:
+    def __init__(self, dateiname:str, index:int, text:str):
+        self.dateiname = dateiname
+        self.index = index              # Nummer des Dokuments in der Datei (ab 1)
+        self.text = text
+
+    def __str__(self):
+        return "%s, Eintrag %d: %s" % (self.dateiname, self.index, self.text)
+
+class PruefungFehlgeschlagenError(ValueError):
+    def __init__(self, verstoesse):
+        self.verstoesse = verstoesse
+        super().__init__("%d Fehler in den Eingabedaten\n%s" % (
+            len(verstoesse),
+            "\n".join([str(x) for x in verstoesse])
+        ))
+
+class YamlPruefer:
+    def __init__(self):
+        self.verstoesse = []
+
+    def pruefe(self, yamlobj, regeln, *, kontext=None) -> None:
+        """ Wende alle Regeln in einem Durchlauf auf alle Einträge an
+
+        :param yamlobj: zu prüfende Datei
+        :type yamlobj: YamlBase
+        :param regeln: Prüfregeln
+        :type regeln: list of function
+        :param kontext: Abhängigkeiten der Regeln, None = Ergebnisse nicht speichern, defaults to None
+        :type kontext: str, optional
+        :note: Fehlen erforderliche Einträge, werden die Regeln für dieses Dokument nicht angewendet.
+        :note: Mit `kontext` dürfen die Regeln nur vom Dokument selbst (und dem Kontext) abhängen.
+        """
+        cachename = None
+        alt = {}
+        if kontext is not None and PRUEFCACHE_VERZEICHNIS is not None:
+            pfad = os.path.abspath(yamlobj.filename)
+            cachename = os.path.join(PRUEFCACHE_VERZEICHNIS, hashlib.sha1(pfad.encode("utf8")).hexdigest() + ".pickle")
+            kontext = "%s|%s|%s" % (REGELVERSION, sorted(yamlobj.mandatory_keys), kontext)
+            gespeichert = lade_pickle(cachename)
+            if type(gespeichert) is dict and gespeichert.get("pfad") == pfad and gespeichert.get("kontext") == kontext:
+                alt = gespeichert["ergebnisse"]
+
+        neu = {}
+        for index, item in enumerate(yamlobj.iter_entries(), start=1):
+            if cachename is not None:
+                dokhash = hashlib.sha1(pickle.dumps(item, protocol=4)).digest()
+                texte = alt.get(dokhash)
+                if texte is None:
+                    texte = self._pruefe_dokument(yamlobj, item, regeln)
+                neu[dokhash] = texte
+            else:
+                texte = self._pruefe_dokument(yamlobj, item, regeln)
+
+            for text in texte:
+                self._add(yamlobj.filename, index, text)
+
+        if cachename is not None and neu != alt:
+            speichere_pickle(cachename, {
+                "pfad": pfad,
+                "kontext": kontext,
+                "ergebnisse": neu
+            })
+
+    @staticmethod
+    def _pruefe_dokument(yamlobj, item, regeln) -> list:
+        """ Alle Regeln auf ein Dokument anwenden
+
+        :return: Fehlertexte
+        :rtype: list of str
+        """
+        if not isinstance(item, dict):
+            return ["Eintrag ist kein Datensatz"]
+
+        fehlend = yamlobj.mandatory_keys - set(item.keys())
+        if fehlend != set():
+            return ["Es fehlen: " + ", ".join(sorted(fehlend))]
+
+        texte = []
+        for regel in regeln:
+            try:
+                regel(item)
+            except (ValueError, AssertionError) as msg:
+                texte.append(str(msg).strip())
+        return texte
+
+    def _add(self, dateiname:str, index:int, text:str) -> None:
+        self.verstoesse.append(Verstoss(dateiname, index, text))
+
+    def ok(self) -> bool:
+        return self.verstoesse == []
+
+    def ergebnis(self) -> None:
+        """ Melde alle gesammelten Verstöße
+
+        :raises PruefungFehlgeschlagenError: mindestens ein Verstoß
+        """
+        if not self.ok():
+            raise PruefungFehlgeschlagenError(self.verstoesse)
+
+def pruefe_eingabedaten(*, stammdaten, depots, transaktionen=None) -> None:
+    """ Prüfe alle Yaml-Dateien inkl. der Verweise auf Stammdaten und Depots
+
+    :param stammdaten: Wertpapier-Stammdaten
+    :type stammdaten: Stammdaten
+    :param depots: Depots
+    :type depots: Depot_Stammdaten
+    :param transaktionen: Käufe, Verkäufe und Ausschüttungen, defaults to None (nicht prüfen)
+    :type transaktionen: Transaktionen, optional
+    :raises PruefungFehlgeschlagenError: Liste aller Verstöße
+    """
+    pruefer = YamlPruefer()
+
+    # Die Schlüssel werden beim Durchlauf gesammelt und dann für die Verweise benutzt
+    isins = set()
+    depotids = set()
+
+    pruefer.pruefe(stammdaten, stammdaten.pruefregeln(gesehen=isins))
+    pruefer.pruefe(depots, depots.pruefregeln(gesehen=depotids))
+    if transaktionen is not None:
+        transaktionen.pruefe(pruefer, isins=isins, depotids=depotids)
+
+    pruefer.ergebnis()
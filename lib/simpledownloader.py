@@ -1,20 +1,151 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# Einfacher Downloader für die Onlineabfragen
+#
+# Alle Abfragen laufen über eine `requests.Session`: Verbindungen werden pro Host in einem
+# Pool gehalten und wiederverwendet (keep-alive), Antworten komprimiert übertragen.
+# Verbindungsfehler, Zeitüberschreitungen und 5xx-Antworten werden mit wachsendem Abstand
+# wiederholt. Ausnahme: Antworten mit `Retry-After` gehen direkt an den Aufrufer, damit
+# z.B. `GedrosselterDownloader` den ganzen Host sperren kann. Dieser schaltet außerdem mit
+# `ueberlastung_weitergeben` die Wiederholung von 429/503 hier ab (er wiederholt sie selbst).
+#
+# Optional werden Antworten in einem `HttpCache` zwischengespeichert.
+
+import threading
+import time
+import urllib.parse
+
 import requests
+import requests.adapters
+
+DOWNLOAD_TIMEOUT = (5.0, 30.0)          # s Verbindungsaufbau, s Lesen
+DOWNLOAD_WIEDERHOLUNGEN = 3             # nach Fehlern, zusätzlich zum ersten Versuch
+DOWNLOAD_BACKOFF = 1.0                  # s vor der ersten Wiederholung, danach jeweils doppelt
+DOWNLOAD_POOLGROESSE = 10               # Verbindungen pro Host
+
+_STATUS_UEBERLASTET = [429, 503]
 
 class SimpleDownloader:
+    def __init__(self, *, timeout=DOWNLOAD_TIMEOUT, wiederholungen:int=DOWNLOAD_WIEDERHOLUNGEN,
+                 backoff:float=DOWNLOAD_BACKOFF, poolgroesse:int=DOWNLOAD_POOLGROESSE, cache=None, schlafen=time.sleep):
+        self.timeout = timeout
+        self.cache = cache          # HttpCache oder None
+        self.wiederholungen = wiederholungen
+        self.backoff = backoff
+        self.schlafen = schlafen
+        self.status_weitergeben = []         # ohne Wiederholung an den Aufrufer
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=poolgroesse, pool_maxsize=poolgroesse)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+        # Host -> [Abfragen, Wiederholungen, Fehler, Summe s, Max s, Bytes]
+        self.statistik = {}
+        self._lock = threading.Lock()
+
+    def _erfasse(self, host:str, sekunden:float, *, wiederholung:bool=False, fehler:bool=False, anz_bytes:int=0) -> None:
+        with self._lock:
+            st = self.statistik.get(host)
+            if st is None:
+                st = self.statistik[host] = [0, 0, 0, 0.0, 0.0, 0]
+            st[0] += 1
+            if wiederholung:
+                st[1] += 1
+            if fehler:
+                st[2] += 1
+            st[3] += sekunden
+            st[4] = max(st[4], sekunden)
+            st[5] += anz_bytes
+
+    def ueberlastung_weitergeben(self) -> None:
+        """ 429/503 nicht wiederholen, sondern sofort an den Aufrufer geben (der sie selbst wiederholt)
+        """
+        self.status_weitergeben = _STATUS_UEBERLASTET
+
+    def aus_cache(self, url:str):
+        """ Antwort ohne Web-Zugriff, falls gültig gespeichert (bzw. offline)
+
+        :return: (status, inhalt, info) oder None
+        """
+        if self.cache is None:
+            return None
+        res = self.cache.frische_antwort(url)
+        if res is None and self.cache.offline:
+            return self.cache.offline_antwort()
+        return res
+
     def get_url(self, url:str):
-        d = requests.get(url)
-        resp_data = {
-            "encoding": d.encoding,
-            "headers": d.headers,
-        }
-        return d.status_code, d.content, resp_data
+        """ GET mit Wiederholungen (und Zwischenspeicher)
+
+        :param url: URL
+        :type url: str
+        :raises requests.RequestException: Verbindungsfehler auch nach allen Wiederholungen
+        :return: HTTP-Status, Inhalt (entpackt), Infos ("encoding", "headers", ggf. "aus_cache")
+        :rtype: tuple(int, bytes, dict)
+        """
+        if self.cache is None:
+            return self._get(url)
+
+        res = self.aus_cache(url)
+        if res is not None:
+            return res
+
+        status, content, info = self._get(url, headers=self.cache.bedingungen(url))
+        if status == 304:
+            res = self.cache.bestaetige(url)
+            if res is not None:
+                return res
+            # inzwischen verdrängt => ohne Bedingungen
+            status, content, info = self._get(url)
+        self.cache.speichere(url, status, content, info)
+        return status, content, info
+
+    def _get(self, url:str, headers=None):
+        host = urllib.parse.urlsplit(url).netloc
+        versuch = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                d = self.session.get(url, headers=headers, timeout=self.timeout)
+                content = d.content
+            except (requests.ConnectionError, requests.Timeout):
+                self._erfasse(host, time.perf_counter() - start, wiederholung=versuch > 0, fehler=True)
+                if versuch >= self.wiederholungen:
+                    raise
+            else:
+                fehler = d.status_code // 100 == 5
+                self._erfasse(host, time.perf_counter() - start, wiederholung=versuch > 0, fehler=fehler,
+                              anz_bytes=len(content))
+                if not fehler or "Retry-After" in d.headers or d.status_code in self.status_weitergeben \
+                        or versuch >= self.wiederholungen:
+                    resp_data = {
+                        "encoding": d.encoding,
+                        "headers": d.headers,
+                    }
+                    return d.status_code, content, resp_data
+
+            self.schlafen(self.backoff * 2 ** versuch)
+            versuch += 1
+
+    def statistik_zeilen(self) -> list:
+        """ Statistik pro Host
+
+        :return: (Host, Abfragen, Wiederholungen, Fehler, Summe ms, Max ms, kB)
+        :rtype: list of tuple
+        """
+        with self._lock:
+            return [(host, st[0], st[1], st[2], st[3] * 1000, st[4] * 1000, st[5] / 1024)
+                    for host, st in sorted(self.statistik.items())]
+
+    def close(self) -> None:
+        self.session.close()
 
 
 if __name__ == "__main__":
     dl = SimpleDownloader()
     status, data, info = dl.get_url("http://192.168.0.15:9090/axs")
     print(status)
-    print(info)
\ No newline at end of file
+    print(info)
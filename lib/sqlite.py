@@ -1,6 +1,7 @@
 from contextlib import contextmanager
 import sqlite3
 import re
+import time
 
 def local_cursor_wrapper(func):
     """ decorator to create/ensure a cursor from local database
@@ -66,16 +67,199 @@ def row2dict(row):
         dt[x] = row[x]
     return dt
 
+# rows per fetchmany call in `DBClass.iterate`
+DEFAULT_BATCH_SIZE = 500
+
+# pragmas of a performance profile and their valid values (None = integer)
+PROFILE_PRAGMAS = {
+    "journal_mode": ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"],
+    "synchronous": ["OFF", "NORMAL", "FULL", "EXTRA"],
+    "cache_size": None,             # pages (> 0) or KiB (< 0)
+    "mmap_size": None,              # bytes, 0 = off
+    "temp_store": ["DEFAULT", "FILE", "MEMORY"]
+}
+
+# only relevant when writing
+PROFILE_PRAGMAS_WRITE = ["journal_mode", "synchronous"]
+
+def check_profile(profile):
+    """ check a performance profile and return the pragma statements
+
+    :param profile: pragma -> value, e.g. {"journal_mode": "WAL"}
+    :return: list of (pragma, sql statement)
+    :raises ValueError: unknown pragma or invalid value
+    """
+    statements = []
+    for pragma, value in profile.items():
+        pragma = pragma.lower()
+        if pragma not in PROFILE_PRAGMAS:
+            raise ValueError("unknown sqlite pragma in profile: %s" % pragma)
+        valid = PROFILE_PRAGMAS[pragma]
+        if valid is None:
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError("sqlite pragma %s needs an integer, not %s" % (pragma, value))
+        else:
+            value = str(value).upper()
+            if value not in valid:
+                raise ValueError("invalid value for sqlite pragma %s: %s (valid: %s)" % (pragma, value, ", ".join(valid)))
+        statements.append((pragma, "PRAGMA %s=%s" % (pragma, value)))
+    return statements
+
 def _open_sqlite_filename(dat):
     """ create sqlite connection from data dict
 
     :param dat: dict with connection parameters
+                filename
+                readonly    open read only (optional)
+                profile     pragma -> value, see `PROFILE_PRAGMAS` (optional)
+                check_same_thread   see sqlite3.connect (optional, default True)
     :return: connection
     """
-    con = sqlite3.connect(dat["filename"], detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    readonly = dat.get("readonly", False)
+    check_same_thread = dat.get("check_same_thread", True)
+    if readonly:
+        import os
+        import urllib.request
+        uri = "file:%s?mode=ro" % urllib.request.pathname2url(os.path.abspath(dat["filename"]))
+        con = sqlite3.connect(uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                              check_same_thread=check_same_thread)
+    else:
+        con = sqlite3.connect(dat["filename"], detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                              check_same_thread=check_same_thread)
     con.row_factory = sqlite3.Row
+
+    for pragma, statement in check_profile(dat.get("profile") or {}):
+        if readonly and pragma in PROFILE_PRAGMAS_WRITE:
+            continue
+        con.execute(statement)
     return con
 
+# only these statements are explained in the slow query log
+_EXPLAIN_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+_NORMALIZE_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_NORMALIZE_LISTS = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+
+def normalize_query(query):
+    """ normalize query text for statistics
+
+    Whitespace is collapsed, literals are replaced by `?` and lists of placeholders by `(?, ...)`.
+
+    :param query: sql query
+    :return: normalized query
+    """
+    query = " ".join(query.split())
+    query = _NORMALIZE_LITERALS.sub("?", query)
+    return _NORMALIZE_LISTS.sub("(?, ...)", query)
+
+class QueryStats:
+    """ count, total and maximum latency per normalized query
+
+    The latency of a call includes execute and all fetches until the cursor executes the next
+    query or is closed.
+
+    :param slow_ms: log calls slower than this (milliseconds) together with their query plan, None = off
+    """
+    def __init__(self, *, slow_ms=None):
+        self.slow_ms = slow_ms
+        self.queries = {}           # normalized query -> [count, total seconds, max seconds]
+        self.slow = []              # (milliseconds, query, params, list of plan lines or None)
+
+    def begin(self, query, params):
+        """ start a call
+
+        :param query: sql query
+        :param params: parameters (None = do not explain)
+        :return: call record for `add` and `end`
+        """
+        key = normalize_query(query)
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = [0, 0.0, 0.0]
+        entry[0] += 1
+        return [entry, 0.0, query, params]
+
+    def add(self, call, seconds):
+        call[0][1] += seconds
+        call[1] += seconds
+
+    def end(self, connection, call):
+        entry, seconds, query, params = call
+        entry[2] = max(entry[2], seconds)
+        if self.slow_ms is not None and seconds * 1000 >= self.slow_ms:
+            self.slow.append((seconds * 1000, query, params, self._explain(connection, query, params)))
+
+    @staticmethod
+    def _explain(connection, query, params):
+        if params is None or not query.lstrip().upper().startswith(_EXPLAIN_STATEMENTS):
+            return None
+        try:
+            return [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()]
+        except sqlite3.Error:
+            return None
+
+    def rows(self):
+        """ statistics sorted by total time
+
+        :return: list of (normalized query, count, total ms, max ms)
+        """
+        res = [(key, count, total * 1000, maximum * 1000) for key, (count, total, maximum) in self.queries.items()]
+        return sorted(res, key=lambda x: x[2], reverse=True)
+
+class _StatsCursor(sqlite3.Cursor):
+    """ cursor recording its calls in a `QueryStats` object """
+    def __init__(self, con, stats):
+        super().__init__(con)
+        self._stats = stats
+        self._call = None
+
+    def _finish(self):
+        if self._call is not None:
+            self._stats.end(self.connection, self._call)
+            self._call = None
+
+    def _timed(self, fkt, *args):
+        start = time.perf_counter()
+        try:
+            return fkt(*args)
+        finally:
+            if self._call is not None:
+                self._stats.add(self._call, time.perf_counter() - start)
+
+    def execute(self, query, params=()):
+        self._finish()
+        self._call = self._stats.begin(query, params)
+        return self._timed(super().execute, query, params)
+
+    def executemany(self, query, seq_of_params):
+        self._finish()
+        if not isinstance(seq_of_params, (list, tuple)):
+            seq_of_params = list(seq_of_params)
+        self._call = self._stats.begin(query, seq_of_params[0] if seq_of_params else None)
+        return self._timed(super().executemany, query, seq_of_params)
+
+    def executescript(self, script):
+        self._finish()
+        self._call = self._stats.begin(script, None)
+        return self._timed(super().executescript, script)
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+    def __next__(self):
+        return self._timed(super().__next__)
+
+    def close(self):
+        self._finish()
+        super().close()
 
 
 class DBClass:
@@ -99,6 +283,7 @@ class DBClass:
         self.driver = driver_dict["drivername"]
         self.joker = driver_dict["joker"]
         self.replace_joker_flag = self.joker != "?"
+        self.query_stats = None
 
         self.con = driver_dict.get("open_connection")
         if self.con is None:
@@ -113,23 +298,38 @@ class DBClass:
         self.con = openfkt(openparam)
 
     @classmethod
-    def open_sqlite(cls, filename, schema=None):
+    def open_sqlite(cls, filename, schema=None, *, profile=None, readonly=False, check_same_thread=True):
         """ open an sqlite database file
 
         :param filename: filename
         :param schema: file name to sql script to create database (or None)
+        :param profile: performance settings, pragma -> value (see `PROFILE_PRAGMAS`), defaults to None
+        :param readonly: open read only (the file must exist), defaults to False
+        :param check_same_thread: False = connection may be used by other threads (caller must serialize access), defaults to True
         :return:
+        :note: Read-only connections ignore journal_mode and synchronous. In WAL mode they can
+        :note: read while another process is writing.
         """
         import os
+        import errno
         con = None
-
-        if ((filename == ":memory:") or (not os.path.exists(filename))) and schema is not None:
+        open_param = {
+            "filename": filename,
+            "readonly": readonly,
+            "profile": profile,
+            "check_same_thread": check_same_thread
+        }
+
+        if readonly:
+            if not os.path.exists(filename):
+                raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), filename)
+        elif ((filename == ":memory:") or (not os.path.exists(filename))) and schema is not None:
             fsch = os.path.expanduser(schema)
             assert os.path.exists(fsch), "** schema missing: " + fsch
             with open(fsch, 'r') as fein:
                 schemasql = fein.read()
             # print("*** Creating "+filename)
-            con = _open_sqlite_filename({'filename': filename})
+            con = _open_sqlite_filename(open_param)
             cur = con.cursor()
             cur.executescript(schemasql)
             cur.close()
@@ -139,21 +339,32 @@ class DBClass:
             "drivername": "sqlite",
             "joker": "?",
             "open_function": _open_sqlite_filename,
-            "open_param": {
-                "filename": filename
-            },
+            "open_param": open_param,
             "open_connection": con
         })
 
+    def enable_query_stats(self, *, slow_ms=None):
+        """ record count and latency of all queries from now on
+
+        :param slow_ms: log calls slower than this (milliseconds), defaults to None (off)
+        :return: statistics, also in `self.query_stats`
+        :rtype: QueryStats
+        """
+        self.query_stats = QueryStats(slow_ms=slow_ms)
+        return self.query_stats
+
     def cursor(self):
-        return self.con.cursor()
+        if self.query_stats is None:
+            return self.con.cursor()
+        stats = self.query_stats
+        return self.con.cursor(lambda con: _StatsCursor(con, stats))
 
     @contextmanager
     def cursor2(self, oldcursor=None):
         if not oldcursor is None:
             return oldcursor
         try:
-            f = self.con.cursor()
+            f = self.cursor()
             yield f
         finally:
             f.close()
@@ -219,9 +430,78 @@ class DBClass:
 
         return [x[tolistparam] for x in res]
 
+    def iterate(self, query, params, *, batch_size=DEFAULT_BATCH_SIZE, tolistparam=None, row_factory=None):
+        """ generator version of `fetchall`, reads `batch_size` rows at a time
+
+        :param query: sql query
+        :param params: parameters
+        :param batch_size: rows per `fetchmany`, defaults to DEFAULT_BATCH_SIZE
+        :param tolistparam: yield only this column, defaults to None (dict per row)
+        :param row_factory: yield the result of row_factory(cursor, row) instead, defaults to None
+        :note: The cursor stays open until the generator is exhausted or closed.
+        """
+        with self.cursor2() as cursor:
+            if row_factory is not None:
+                cursor.row_factory = row_factory
+            self.execute(query, params, cursor=cursor)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if row_factory is not None:
+                        yield row
+                    elif tolistparam is None:
+                        yield row2dict(row)
+                    else:
+                        yield row[tolistparam]
+
     def commit(self):
         self.con.commit()
 
+    def get_user_version(self):
+        with self.cursor2() as cursor:
+            cursor.execute("PRAGMA user_version")
+            return cursor.fetchone()[0]
+
+    def apply_migrations(self, migrations):
+        """ bring the database schema up to date
+
+        :param migrations: list of (version, step), ascending versions > 0
+                           step is a list of sql statements or a function(cursor)
+        :return: list of applied versions
+        :note: The current version is stored in `PRAGMA user_version` (0 = new or unversioned database).
+        :note: Each step runs in its own transaction together with the update of the version.
+        """
+        versions = [x[0] for x in migrations]
+        assert versions == sorted(set(versions)) and versions[0] > 0, "migrations must have ascending versions"
+
+        current = self.get_user_version()
+        if current > versions[-1]:
+            raise ValueError("database schema version %d is newer than supported version %d" % (current, versions[-1]))
+
+        applied = []
+        if self.con.in_transaction:
+            self.con.commit()
+        with self.cursor2() as cursor:
+            for version, step in migrations:
+                if version <= current:
+                    continue
+                try:
+                    cursor.execute("BEGIN")
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        for query in step:
+                            cursor.execute(query)
+                    cursor.execute("PRAGMA user_version=%d" % version)
+                    self.con.commit()
+                except BaseException:
+                    self.con.rollback()
+                    raise
+                applied.append(version)
+        return applied
+
     @local_cursor_wrapper
     def count(self, table, debug=False, cursor=None):
         return self.fetchone("SELECT COUNT(*) FROM %s" % table, params=(), singleparam="COUNT(*)", cursor=cursor, debug=debug)
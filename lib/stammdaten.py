@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .yamlbase import YamlBase
+from .yamlbase import YamlBase, lade_yaml_dokumente
 from lib.isincheck import isin_check
 import re
 
@@ -15,6 +15,7 @@ STAMMDATEN_TYP_INDEX = "index"             # Kleinschreibung
 STAMMDATEN_TYP_FUND = "fund"
 STAMMDATEN_THESAURIEREND = "thesaurierend"
 STAMMDATEN_WKN = "wkn"
+STAMMDATEN_ONVISTA_NOTATION = "onvista_notation"
 
 def theausierend_mark(entry, nonestr="?"):
     t = entry.get(STAMMDATEN_THESAURIEREND)
@@ -30,26 +31,90 @@ class Stammdaten(YamlBase):
     def __init__(self, filename):
         YamlBase.__init__(self, filename, [STAMMDATEN_ISIN, STAMMDATEN_NAME, STAMMDATEN_TEILFREISTELLUNG, STAMMDATEN_KURSWAEHRUNG, STAMMDATEN_TYP])
 
+        # Index über ISIN, WKN und Onvista-Notation
+        # wird beim ersten Zugriff aufgebaut
+        self._index_dokumente = None
+        self._by_isin = None
+        self._by_wkn = None
+        self._by_notation = None
+
+    def _index(self):
+        """ Baue die Indices auf (nur einmal bzw. wenn sich die Datei geändert hat)
+
+        :note: Bei mehrfachen Einträgen gilt der erste; gemeldet werden sie von der Prüfung (`pruefregeln`).
+        """
+        dokumente = lade_yaml_dokumente(self.filename)
+        if dokumente is self._index_dokumente:
+            return
+
+        by_isin = {}
+        by_wkn = {}
+        by_notation = {}
+        for item in dokumente:
+            if not isinstance(item, dict):
+                continue
+            isin = item.get(STAMMDATEN_ISIN)
+            if isin is not None:
+                by_isin.setdefault(isin, item)
+
+            wkn = item.get(STAMMDATEN_WKN)
+            if wkn is not None:
+                by_wkn.setdefault(wkn, item)
+
+            notation = item.get(STAMMDATEN_ONVISTA_NOTATION)
+            if notation is not None:
+                by_notation.setdefault(notation, item)
+
+        self._by_isin = by_isin
+        self._by_wkn = by_wkn
+        self._by_notation = by_notation
+        self._index_dokumente = dokumente
+
     def get_entry(self, isin):
-        return self.stringsuche(STAMMDATEN_ISIN, isin)
+        self._index()
+        return self._by_isin.get(isin)
+
+    def get_entry_by_wkn(self, wkn):
+        self._index()
+        return self._by_wkn.get(wkn)
+
+    def get_entry_by_onvista_notation(self, notation):
+        self._index()
+        return self._by_notation.get(notation)
 
     def get_all_isins(self):
-        alle = []
-        for item in self.iter_entries():
-            if item[STAMMDATEN_ISIN] in alle:
-                raise ValueError("Doppelte ISIN in Stammdaten " + item[STAMMDATEN_ISIN])
-            alle.append(item[STAMMDATEN_ISIN])
-        return alle
+        self._index()
+        return list(self._by_isin.keys())
 
 
-    def base_check(self):
-        super().base_check()
-        for item in self.iter_entries():
+    def pruefregeln(self, gesehen=None):
+        """ Prüfregeln für die Stammdaten
+
+        :param gesehen: sammelt die ISINs (Prüfung auf doppelte Einträge), defaults to None
+        :type gesehen: set, optional
+        :return: Prüfregeln
+        :rtype: list of function
+        """
+        if gesehen is None:
+            gesehen = set()
+
+        def eindeutig(item):
             isin = item[STAMMDATEN_ISIN]
-            self.regex_check(item, STAMMDATEN_TEILFREISTELLUNG,TEILFREISTELLUNG_CO, info=isin)
-            self.content_not_empty(item, STAMMDATEN_NAME, info=isin)
-            self.content_not_empty(item, STAMMDATEN_KURSWAEHRUNG, info=isin)
-            self.content_must_be(item, STAMMDATEN_TYP, ["etf", "fonds", "currency", "index"], info=isin, fkt=lambda x: x.lower())
-            if item[STAMMDATEN_TYP].lower() not in ["currency", "index"]:
-                assert isin_check.check_list(isin)
+            if isin in gesehen:
+                raise ValueError("Doppelte ISIN in Stammdaten " + isin)
+            gesehen.add(isin)
+
+        def pruefziffer(item):
+            if str(item[STAMMDATEN_TYP]).lower() in [STAMMDATEN_TYP_CURRENCY, STAMMDATEN_TYP_INDEX]:
+                return
+            if not isin_check.check(item[STAMMDATEN_ISIN]):
+                raise ValueError("Fehlerhafte ISIN: %s" % item[STAMMDATEN_ISIN])
 
+        return [
+            eindeutig,
+            lambda item: self.regex_check(item, STAMMDATEN_TEILFREISTELLUNG, TEILFREISTELLUNG_CO, info=item[STAMMDATEN_ISIN]),
+            lambda item: self.content_not_empty(item, STAMMDATEN_NAME, info=item[STAMMDATEN_ISIN]),
+            lambda item: self.content_not_empty(item, STAMMDATEN_KURSWAEHRUNG, info=item[STAMMDATEN_ISIN]),
+            lambda item: self.content_must_be(item, STAMMDATEN_TYP, ["etf", "fonds", "currency", "index"], info=item[STAMMDATEN_ISIN], fkt=lambda x: str(x).lower()),
+            pruefziffer
+        ]
@@ -46,6 +46,7 @@ from .utils import myround, dstr, p2k, k2p, dparse
 from .transaktionen import *
 from .vorabpauschale import get_basiszins_proz, monatsanteil
 from .kursedb import KURSEDB_SCHLUSSKURS
+from .waehrung import Waehrungsfaktoren
 
 import datetime
 
@@ -239,13 +240,18 @@ class JahresTransaktionen(Transaktionen):
                               waehrungsfaktor_zum_datum=waehrungsfaktor_zum_datum)
         self.uebertrag_done = True
 
-    def do_transaktionen(self, *, fondwaehrung, transaktionen, kursedb):
-        waehrungsconv = "EUR" + fondwaehrung
-        for transaktion in transaktionen:
-            waehrungsfaktor_zum_datum = 1.0
-            if waehrungsconv != "EUREUR":
-                waehrungsfaktor_zum_datum = 1.0 / kursedb.get_kurs(waehrungsconv,dparse(transaktion[TRANSAKTION_DATUM]))[KURSEDB_SCHLUSSKURS]
+    def do_transaktionen(self, *, fondwaehrung, transaktionen, kursedb, waehrungsfaktoren=None):
+        """ Alle Transaktionen (Yaml-Einträge) eines Jahres buchen
 
+        :param waehrungsfaktoren: bereits geladene Währungsfaktoren, None = neu laden, defaults to None
+        :type waehrungsfaktoren: Waehrungsfaktoren, optional
+        """
+        if waehrungsfaktoren is None:
+            waehrungsfaktoren = Waehrungsfaktoren(kursedb)
+        # Faktoren für alle Tage mit einer Abfrage
+        faktoren = waehrungsfaktoren.faktoren(fondwaehrung, [dparse(x[TRANSAKTION_DATUM]) for x in transaktionen])
+
+        for transaktion, waehrungsfaktor_zum_datum in zip(transaktionen, faktoren):
             if transaktion[TRANSAKTION_TYP] == TRANSAKTION_TYP_KAUF:
                 self.kauf(
                     datum=dparse(transaktion[TRANSAKTION_DATUM]),
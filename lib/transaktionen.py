@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import bisect
+import hashlib
 import re
-from .utils import dparse
-from .yamlbase import YamlBase
+from .utils import dparse, k2p
+from .yamlbase import YamlBase, lade_yaml_dokumente
+from .pruefung import YamlPruefer
 from .depot import Depot_Stammdaten
 from lib.isincheck import isin_check
 
@@ -31,27 +34,37 @@ TRANSAKTION_WAEHRUNG = "waehrung"
 
 AUSSCHUETTUNG_BETRAG = "betrag"      # nur bei Ausschüttungen
 
-dcom = re.compile("(\d{1,2}).(\d{1,2}).(\d\d\d\d)")
+class Buchung:
+    """ Eine Transaktion aus Portfolio oder Ausschüttungen mit bereits umgewandelten Werten
 
-def _yaml_reorder(yamldat):
-    """ Erzeugung eines Key zum Sortieren der Einträge
-
-    :param s: daten
-    :type s: yaml-Eintrag
-    :return: Sortierwert
-    :rtype: str
+        datum     datetime.date
+        anzahl    float (bei Ausschüttungen None)
+        kurs      float oder None
+        betrag    float (nur bei Ausschüttungen)
+        item      der ursprüngliche Yaml-Eintrag
     """
-    # Sortiertwert: YYYYMMDD_ISIN_DEPOT
-    ma = dcom.match(yamldat["datum"])
-    assert ma is not None, "unpassender Wert: " + yamldat
-    datum = "%s%02d%02d" % (ma.group(3), int(ma.group(2)), int(ma.group(1)))
-    return "%s_%s_%s" % (datum, yamldat["isin"], yamldat["depot"])
+    __slots__ = ("item", "isin", "depot", "typ", "datum", "waehrung", "anzahl", "kurs", "betrag", "quelle", "sortkey")
+
+    def __init__(self, item, *, isin:str, quelle:int, laufnr:int):
+        self.item = item
+        self.isin = isin
+        self.depot = item[TRANSAKTION_DEPOT]
+        self.typ = item[TRANSAKTION_TYP]
+        self.datum = dparse(item[TRANSAKTION_DATUM])
+        self.waehrung = item.get(TRANSAKTION_WAEHRUNG)
+        self.anzahl = k2p(item.get(TRANSAKTION_ANZAHL))
+        self.kurs = k2p(item.get(TRANSAKTION_KURS))
+        self.betrag = k2p(item.get(AUSSCHUETTUNG_BETRAG))
+        # 0 = Portfolio, 1 = Ausschüttung
+        self.quelle = quelle
+        # Reihenfolge innerhalb eines Tages: erst Portfolio, dann Ausschüttungen, jeweils wie in der Datei
+        self.sortkey = (self.datum, quelle, laufnr)
 
 DATUM_CO = re.compile("^\d{1,2}\.\d{1,2}\.\d{4}$")
 BETRAG_CO = re.compile("^[.,0-9]+$")
 
 class Transaktionen(YamlBase):
-    def __init__(self, portfolio_filename:str, ausschuettung_filename:str, *, depots:Depot_Stammdaten, isinliste):
+    def __init__(self, portfolio_filename:str, ausschuettung_filename:str, *, depots:Depot_Stammdaten, isinliste=None):
         """ Transaktionen
 
         :param portfolio_filename: Yaml-Datei mit den Käufen und Verkäufen
@@ -60,47 +73,112 @@ class Transaktionen(YamlBase):
         :type ausschuettung_filename: str
         :param depots: Depot-Klasse
         :type depots: Depot_Stammdaten
-        :param isinliste: Liste der ISINs aus den Stammdaten
-        :type depotliste: list[str]
+        :param isinliste: Liste der ISINs aus den Stammdaten, defaults to None (wird nach der Prüfung gesetzt)
+        :type isinliste: list[str]
         """
         self.portfolio = YamlBase(portfolio_filename, [PORTFOLIO_ISIN, TRANSAKTION_TYP, TRANSAKTION_DEPOT, TRANSAKTION_DATUM, TRANSAKTION_ANZAHL, TRANSAKTION_WAEHRUNG])
         self.ausschuettung = YamlBase(ausschuettung_filename, [AUSSCHUETTUNG_ISIN, TRANSAKTION_DATUM, TRANSAKTION_DEPOT, AUSSCHUETTUNG_BETRAG, TRANSAKTION_TYP])
         self.depots = depots
         self.isinliste = isinliste
 
+        # Transaktionsspeicher, siehe `_speicher`
+        self._speicher_dokumente = None
+        self._gruppen = None
+        self._waehrung_geprueft = set()
+
     def check_mandatory_entries(self):
         self.portfolio.check_mandatory_entries()
         self.ausschuettung.check_mandatory_entries()
 
     def base_check(self):
-        super().base_check()
-        depotliste = self.depots.get_alle_depots()
-
-        for item in self.portfolio.iter_entries():
-            self.regex_check(item, TRANSAKTION_DATUM, DATUM_CO)
-            datum = item[TRANSAKTION_DATUM]
-            # Prüfziffer
-            isin_check.check_list(item[PORTFOLIO_ISIN])
-            # in Stammdaten
-            self.content_must_be(item, PORTFOLIO_ISIN, self.isinliste)
-            info = datum + " " + item[PORTFOLIO_ISIN]
-            self.content_must_be(item, TRANSAKTION_TYP, [TRANSAKTION_TYP_KAUF, TRANSAKTION_TYP_VERKAUF], info=info, fkt=lambda x:x.lower())
-            self.content_must_be(item, TRANSAKTION_DEPOT, depotliste, info=info)
-            self.content_not_empty(item, TRANSAKTION_WAEHRUNG, info=info)
-            self.regex_check(item, TRANSAKTION_KURS, BETRAG_CO, info=info)
-            self.regex_check(item, TRANSAKTION_ANZAHL, BETRAG_CO, info=info)
-
-        for item in self.ausschuettung.iter_entries():
-            self.regex_check(item, TRANSAKTION_DATUM, DATUM_CO)
-            datum = item[TRANSAKTION_DATUM]
-            isin_check.check_list(item[AUSSCHUETTUNG_ISIN])
-            self.content_must_be(item, AUSSCHUETTUNG_ISIN, self.isinliste)
-            info = datum + " " + item[AUSSCHUETTUNG_ISIN]
-            self.content_must_be(item, TRANSAKTION_TYP, [TRANSAKTION_TYP_AUSSCHUETTUNG], fkt=lambda x:x.lower())
-            self.content_must_be(item, TRANSAKTION_DEPOT, depotliste, info=info)
-            self.content_not_empty(item, TRANSAKTION_WAEHRUNG, info=info)
-            self.regex_check(item, AUSSCHUETTUNG_BETRAG, BETRAG_CO, info=info)
-
+        # Depots mit ihren Regeln (u.a. doppelte IDs), dann die Transaktionen
+        pruefer = YamlPruefer()
+        depotids = set()
+        pruefer.pruefe(self.depots, self.depots.pruefregeln(gesehen=depotids))
+        self.pruefe(pruefer, isins=set(self.isinliste), depotids=depotids)
+        pruefer.ergebnis()
+
+    def pruefe(self, pruefer:YamlPruefer, *, isins:set, depotids:set) -> None:
+        """ Prüfe Portfolio und Ausschüttungen (jeweils ein Durchlauf)
+
+        :param pruefer: sammelt die Verstöße
+        :type pruefer: YamlPruefer
+        :param isins: ISINs aus den Stammdaten
+        :type isins: set
+        :param depotids: IDs der Depots
+        :type depotids: set
+        """
+        def info(item, isinkey):
+            return "%s %s" % (item[TRANSAKTION_DATUM], item[isinkey])
+
+        def verweise(isinkey):
+            def regel(item):
+                # Die Prüfziffer der ISINs in den Stammdaten ist dort schon geprüft
+                if item[isinkey] not in isins:
+                    if not isin_check.check(item[isinkey]):
+                        raise ValueError("%s Fehler: Prüfziffer der ISIN falsch" % info(item, isinkey))
+                    raise ValueError("%s Fehler: ISIN nicht in Stammdaten" % info(item, isinkey))
+                if item[TRANSAKTION_DEPOT] not in depotids:
+                    raise ValueError("%s Fehler: Depot '%s' nicht in Depots" % (info(item, isinkey), item[TRANSAKTION_DEPOT]))
+            return regel
+
+        # Die Regeln hängen außer vom Eintrag nur von den ISINs und Depots ab.
+        # Nur wenn sich diese ändern, werden alle Einträge neu geprüft.
+        kontext = hashlib.sha1(repr((sorted(isins), sorted(depotids))).encode("utf8")).hexdigest()
+
+        pruefer.pruefe(self.portfolio, [
+            lambda item: self.regex_check(item, TRANSAKTION_DATUM, DATUM_CO),
+            verweise(PORTFOLIO_ISIN),
+            lambda item: self.content_must_be(item, TRANSAKTION_TYP, [TRANSAKTION_TYP_KAUF, TRANSAKTION_TYP_VERKAUF], info=info(item, PORTFOLIO_ISIN), fkt=lambda x:str(x).lower()),
+            lambda item: self.content_not_empty(item, TRANSAKTION_WAEHRUNG, info=info(item, PORTFOLIO_ISIN)),
+            lambda item: self.regex_check(item, TRANSAKTION_KURS, BETRAG_CO, info=info(item, PORTFOLIO_ISIN)),
+            lambda item: self.regex_check(item, TRANSAKTION_ANZAHL, BETRAG_CO, info=info(item, PORTFOLIO_ISIN)),
+        ], kontext=kontext)
+
+        pruefer.pruefe(self.ausschuettung, [
+            lambda item: self.regex_check(item, TRANSAKTION_DATUM, DATUM_CO),
+            verweise(AUSSCHUETTUNG_ISIN),
+            lambda item: self.content_must_be(item, TRANSAKTION_TYP, [TRANSAKTION_TYP_AUSSCHUETTUNG], info=info(item, AUSSCHUETTUNG_ISIN), fkt=lambda x:str(x).lower()),
+            lambda item: self.content_not_empty(item, TRANSAKTION_WAEHRUNG, info=info(item, AUSSCHUETTUNG_ISIN)),
+            lambda item: self.regex_check(item, AUSSCHUETTUNG_BETRAG, BETRAG_CO, info=info(item, AUSSCHUETTUNG_ISIN)),
+        ], kontext=kontext)
+
+    def _speicher(self):
+        """ Baue den Transaktionsspeicher auf (nur einmal bzw. wenn sich eine Datei geändert hat)
+
+        Die Buchungen werden nach (isin, depot) gruppiert und nach Datum sortiert gespeichert.
+
+        :return: dict (isin, depot) -> (Liste der Daten, Liste der Buchungen)
+        :rtype: dict
+        """
+        portfolio = lade_yaml_dokumente(self.portfolio.filename)
+        ausschuettung = lade_yaml_dokumente(self.ausschuettung.filename)
+        if self._speicher_dokumente is not None and \
+           self._speicher_dokumente[0] is portfolio and self._speicher_dokumente[1] is ausschuettung:
+            return self._gruppen
+
+        gruppen = {}
+        laufnr = 0
+        for quelle, dokumente in enumerate([portfolio, ausschuettung]):
+            for item in dokumente:
+                if quelle == 0:
+                    assert item[TRANSAKTION_TYP] in [TRANSAKTION_TYP_KAUF, TRANSAKTION_TYP_VERKAUF]
+                    isin = item[PORTFOLIO_ISIN]
+                else:
+                    isin = item[AUSSCHUETTUNG_ISIN]
+                    assert item[TRANSAKTION_TYP] in [TRANSAKTION_TYP_AUSSCHUETTUNG]
+
+                buchung = Buchung(item, isin=isin, quelle=quelle, laufnr=laufnr)
+                laufnr += 1
+                gruppen.setdefault((isin, buchung.depot), []).append(buchung)
+
+        self._gruppen = {}
+        for key, buchungen in gruppen.items():
+            buchungen.sort(key=lambda x: x.sortkey)
+            self._gruppen[key] = ([x.datum for x in buchungen], buchungen)
+        self._waehrung_geprueft = set()
+        self._speicher_dokumente = (portfolio, ausschuettung)
+        return self._gruppen
 
     def get_isin_depot_list(self):
         """ Gebe sortierte Liste aller Tuples aus (depot, isin) zurück
@@ -108,75 +186,61 @@ class Transaktionen(YamlBase):
         :return: (depot, isin)
         :rtype: list
         """
-        res = []
-        for item in self.portfolio.iter_entries():
-            dat = (item[TRANSAKTION_DEPOT], item[PORTFOLIO_ISIN])
-            if not dat in res:
-                res.append(dat)
-
-        for item in self.ausschuettung.iter_entries():
-            dat = (item[TRANSAKTION_DEPOT], item[AUSSCHUETTUNG_ISIN])
-            if not dat in res:
-                res.append(dat)
-
-        return sorted(res)
+        return sorted((depot, isin) for isin, depot in self._speicher().keys())
+
+    def _pruefe_depotwaehrung(self, isin, depot, buchungen):
+        if (isin, depot) in self._waehrung_geprueft:
+            return
+        depotwaehrung = self.depots.get_depotwaehrung(depot)
+        for buchung in buchungen:
+            if buchung.waehrung != depotwaehrung:
+                if buchung.quelle == 0:
+                    text = "Portfolio- und Depotwährung stimmen nicht überein (%s / %s)"
+                else:
+                    text = "Ausschüttungs- und Depotwährung stimmen nicht überein (%s / %s)"
+                raise ValueError(text % (buchung.waehrung, depotwaehrung))
+        self._waehrung_geprueft.add((isin, depot))
+
+    def get_buchungen_by_isin(self, isin, *, depot=None, start=None, ende=None):
+        """ Buchungen einer ISIN (optional eines Depots) chronologisch sortiert
+
+        :param isin: ISIN
+        :type isin: str
+        :param depot: Depot oder None für alle Depots, defaults to None
+        :type depot: str, optional
+        :param start: erstes Datum (einschließlich), defaults to None
+        :type start: datetime.date, optional
+        :param ende: letztes Datum (einschließlich), defaults to None
+        :type ende: datetime.date, optional
+        :raises ValueError: Währung der Buchung weicht von Depotwährung ab
+        :return: Buchungen
+        :rtype: list(Buchung)
+        """
+        gruppen = self._speicher()
+
+        if depot is not None:
+            gruppe = gruppen.get((isin, depot))
+            if gruppe is None:
+                return []
+            self._pruefe_depotwaehrung(isin, depot, gruppe[1])
+            daten, buchungen = gruppe
+        else:
+            buchungen = []
+            for (gisin, _), gruppe in gruppen.items():
+                if gisin == isin:
+                    buchungen.extend(gruppe[1])
+            buchungen.sort(key=lambda x: (x.datum, x.depot) + x.sortkey[1:])
+            daten = [x.datum for x in buchungen]
+
+        von = 0 if start is None else bisect.bisect_left(daten, start)
+        bis = len(daten) if ende is None else bisect.bisect_right(daten, ende)
+        return buchungen[von:bis]
 
     def get_by_isin(self, isin, *, depot=None, start=None, ende=None):
-        def dat_check_ok(s:str) -> bool:
-            dat = dparse(s)
-            if start is not None:
-                if dat < start:
-                    return False
-            if ende is not None:
-                if dat > ende:
-                    return False
-            return True
-
-        checkdate = start is not None or ende is not None
-
-        result = []
-        for item in self.portfolio.iter_entries():
-            assert item[TRANSAKTION_TYP] in [TRANSAKTION_TYP_KAUF, TRANSAKTION_TYP_VERKAUF]
-
-            if item[PORTFOLIO_ISIN] != isin:
-                continue
-
-            if (depot is not None):
-                if (item[TRANSAKTION_DEPOT] != depot):
-                    continue
-                if self.depots.get_depotwaehrung(depot) != item[TRANSAKTION_WAEHRUNG]:
-                    raise ValueError("Portfolio- und Depotwährung stimmen nicht überein (%s / %s)" % (
-                        item[TRANSAKTION_WAEHRUNG],
-                        self.depots.get_depotwaehrung(depot)
-                    ))
-
-            if checkdate:
-                if not dat_check_ok(item[TRANSAKTION_DATUM]):
-                    continue
-
-            result.append(item)
-
-        for item in self.ausschuettung.iter_entries():
-            if item[AUSSCHUETTUNG_ISIN] == isin:
-                assert item[TRANSAKTION_TYP] in [TRANSAKTION_TYP_AUSSCHUETTUNG]
-
-            if item[AUSSCHUETTUNG_ISIN] != isin:
-                continue
-
-            if (depot is not None):
-                if (item[TRANSAKTION_DEPOT] != depot):
-                    continue
-                if self.depots.get_depotwaehrung(depot) != item[TRANSAKTION_WAEHRUNG]:
-                    raise ValueError("Ausschüttungs- und Depotwährung stimmen nicht überein (%s / %s)" % (
-                        item[TRANSAKTION_WAEHRUNG],
-                        self.depots.get_depotwaehrung(depot)
-                    ))
-
-            if checkdate:
-                if not dat_check_ok(item[TRANSAKTION_DATUM]):
-                    continue
-
-            result.append(item)
-
-        res2 = sorted(result, key=lambda x: _yaml_reorder(x))
-        return res2
\ No newline at end of file
+        """ Yaml-Einträge einer ISIN (optional eines Depots) chronologisch sortiert
+
+        :return: Einträge aus Portfolio und Ausschüttungen
+        :rtype: list(dict)
+        :note: Parameter wie bei `get_buchungen_by_isin`
+        """
+        return [x.item for x in self.get_buchungen_by_isin(isin, depot=depot, start=start, ende=ende)]
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import os
+import pickle
 
 def dstr(d):
     if d is None:
@@ -69,3 +71,37 @@ def p2k(s, nachkomma=None, *, sign=False) -> str:
     if add >= 0:
         s += "0" * add
     return s
+
+def lade_pickle(filename:str):
+    """ Lade ein mit `speichere_pickle` gespeichertes Objekt
+
+    :param filename: Dateiname
+    :type filename: str
+    :return: Objekt oder None, falls nicht vorhanden oder nicht lesbar
+    """
+    try:
+        with open(filename, "rb") as fin:
+            return pickle.load(fin)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+def speichere_pickle(filename:str, obj) -> bool:
+    """ Speichere ein Objekt (atomar über eine temporäre Datei)
+
+    :param filename: Dateiname, das Verzeichnis wird ggf. angelegt
+    :type filename: str
+    :param obj: Objekt
+    :return: erfolgreich gespeichert
+    :rtype: bool
+    """
+    tmpname = filename + ".%d.tmp" % os.getpid()
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(tmpname, "wb") as fout:
+            pickle.dump(obj, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, filename)
+    except OSError:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        return False
+    return True
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Währungsfaktoren
+#
+# Die Umrechnungskurse stehen in der Kurse-DB unter der "ISIN" <Bewertungswährung><Währung>,
+# z.B. "EURUSD" (1 EUR = x USD). Der Faktor für die Umrechnung nach EUR ist 1 / Kurs.
+#
+# Statt pro Datum eine Abfrage zu stellen, wird die Reihe eines Währungspaars einmal als
+# `Kursreihe` geladen (siehe lib/kurscache.py) und dann per Binärsuche ausgewertet. Ist der
+# Zwischenspeicher der Kurse-DB aktiv (`aktiviere_kurscache`), wird er mitbenutzt.
+#
+# Ohne diesen Zwischenspeicher werden die Daten nicht aktualisiert, wenn sich die Kurse-DB
+# ändert. Ein Objekt ist deshalb für die Dauer einer Auswertung gedacht.
+
+from .kurscache import KursCache, Kursreihe
+from .utils import dstr
+
+BEWERTUNGSWAEHRUNG = "EUR"
+
+class KeinWaehrungskursError(ValueError): pass
+
+class Waehrungsfaktoren:
+    def __init__(self, kursedb, *, bewertungswaehrung:str=BEWERTUNGSWAEHRUNG):
+        self.kursedb = kursedb
+        self.bewertungswaehrung = bewertungswaehrung
+        self.kurscache = kursedb.kurscache if kursedb.kurscache is not None else KursCache(kursedb)
+
+    def _reihe(self, waehrung:str) -> Kursreihe:
+        info = self.kurscache.fonds_info(self.bewertungswaehrung + waehrung)
+        if info is None:
+            return None
+        return self.kurscache.reihe(info[0])
+
+    def _faktor(self, waehrung:str, reihe:Kursreihe, datum) -> float:
+        i = reihe.index_bis(datum) if reihe is not None else None
+        if i is None or reihe.schluss[i] == 0:
+            raise KeinWaehrungskursError("Keine Umrechungseinträge für %s -> %s am %s" % (
+                waehrung, self.bewertungswaehrung, dstr(datum)))
+        return 1.0 / reihe.schluss[i]
+
+    def faktor(self, waehrung:str, datum) -> float:
+        """ Faktor für die Umrechnung in die Bewertungswährung
+
+        :param waehrung: Währung, z.B. "USD"
+        :type waehrung: str
+        :param datum: Datum (es gilt der letzte Kurs an oder vor diesem Tag)
+        :type datum: date
+        :raises KeinWaehrungskursError: kein Umrechnungskurs vorhanden
+        :return: Faktor
+        :rtype: float
+        """
+        if waehrung == self.bewertungswaehrung:
+            return 1.0
+        return self._faktor(waehrung, self._reihe(waehrung), datum)
+
+    def faktoren(self, waehrung:str, daten) -> list:
+        """ Faktoren für mehrere Tage (höchstens eine Abfrage)
+
+        :param waehrung: Währung, z.B. "USD"
+        :type waehrung: str
+        :param daten: Tage in beliebiger Reihenfolge
+        :type daten: list of date
+        :raises KeinWaehrungskursError: kein Umrechnungskurs vorhanden
+        :return: Faktoren in der Reihenfolge von `daten`
+        :rtype: list of float
+        """
+        if waehrung == self.bewertungswaehrung:
+            return [1.0] * len(daten)
+        if len(daten) == 0:
+            return []
+        reihe = self._reihe(waehrung)
+        return [self._faktor(waehrung, reihe, datum) for datum in daten]
@@ -1,17 +1,102 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import hashlib
+import os
+
 import yaml
 
+from .pruefung import YamlPruefer
+from .utils import lade_pickle, speichere_pickle
+
+# Die geparsten Yaml-Dokumente werden als Snapshot (Pickle) gespeichert.
+# Solange sich die Yaml-Datei nicht ändert, wird nur der Snapshot gelesen.
+# None = kein Snapshot auf der Platte (nur im Speicher)
+SNAPSHOT_VERZEICHNIS = os.path.expanduser("~/.cache/depotauswertung/yaml")
+SNAPSHOT_VERSION = 1
+
+# Snapshots im Speicher: absoluter Pfad -> (mtime_ns, Größe, Dokumente)
+_snapshots = {}
+
+def _snapshot_dateiname(pfad:str) -> str:
+    name = hashlib.sha1(pfad.encode("utf8")).hexdigest()
+    return os.path.join(SNAPSHOT_VERZEICHNIS, name + ".pickle")
+
+def _lese_snapshot(pfad:str):
+    """ Snapshot von der Platte lesen
+
+    :param pfad: absoluter Pfad der Yaml-Datei
+    :type pfad: str
+    :return: gespeicherter Snapshot oder None
+    :rtype: dict
+    """
+    if SNAPSHOT_VERZEICHNIS is None:
+        return None
+    snap = lade_pickle(_snapshot_dateiname(pfad))
+    if type(snap) is not dict or snap.get("version") != SNAPSHOT_VERSION or snap.get("pfad") != pfad:
+        return None
+    return snap
+
+def _schreibe_snapshot(snap:dict) -> None:
+    if SNAPSHOT_VERZEICHNIS is None:
+        return
+    # Ohne Snapshot geht es auch, nur langsamer
+    speichere_pickle(_snapshot_dateiname(snap["pfad"]), snap)
+
+def lade_yaml_dokumente(filename:str) -> list:
+    """ Alle Dokumente einer Yaml-Datei laden
+
+    Die Yaml-Datei wird nur geparst, wenn kein passender Snapshot existiert.
+    Schlüssel des Snapshots sind Pfad, Änderungszeit, Größe und Hash des Inhalts.
+
+    :param filename: Yaml-Datei
+    :type filename: str
+    :return: Liste der Dokumente
+    :rtype: list
+    :note: Die Dokumente werden von allen Aufrufern gemeinsam genutzt und dürfen nicht verändert werden.
+    """
+    pfad = os.path.abspath(filename)
+    st = os.stat(pfad)
+
+    mem = _snapshots.get(pfad)
+    if mem is not None and mem[0] == st.st_mtime_ns and mem[1] == st.st_size:
+        return mem[2]
+
+    snap = _lese_snapshot(pfad)
+    if snap is not None and snap["mtime_ns"] == st.st_mtime_ns and snap["size"] == st.st_size:
+        # unverändert => Yaml-Datei muss nicht gelesen werden
+        _snapshots[pfad] = (st.st_mtime_ns, st.st_size, snap["dokumente"])
+        return snap["dokumente"]
+
+    with open(pfad, "rb") as fin:
+        rohdaten = fin.read()
+    digest = hashlib.sha256(rohdaten).hexdigest()
+
+    if snap is not None and snap["sha256"] == digest:
+        # nur Zeitstempel geändert (z.B. touch)
+        dokumente = snap["dokumente"]
+    else:
+        dokumente = list(yaml.load_all(rohdaten.decode("utf8"), Loader=yaml.SafeLoader))
+
+    _schreibe_snapshot({
+        "version": SNAPSHOT_VERSION,
+        "pfad": pfad,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": digest,
+        "dokumente": dokumente
+    })
+    _snapshots[pfad] = (st.st_mtime_ns, st.st_size, dokumente)
+    return dokumente
+
 class YamlBase:
     def __init__(self, filename, mandatory_keys_list):
         self.filename = filename
         self.mandatory_keys = set(mandatory_keys_list)
 
     def iter_entries(self):
-        with open(self.filename, "r", encoding="utf8") as fin:
-            for item in yaml.load_all(fin, Loader=yaml.SafeLoader):
-                yield item
+        for item in lade_yaml_dokumente(self.filename):
+            yield item
 
     def check_mandatory_entries(self):
         for item in self.iter_entries():
@@ -22,8 +107,20 @@ class YamlBase:
                 print("Es fehlen:", ", ".join(kl))
                 raise ValueError("Nicht alle erforderlichen Einträge in %s vorhanden: %s" % (self.filename, ", ".join(kl)))
 
+    def pruefregeln(self):
+        """ Prüfregeln für den YamlPruefer
+
+        :return: Funktionen, die für jeden Eintrag aufgerufen werden
+        :rtype: list of function
+        :note: Abgeleitete Klassen ergänzen hier ihre Prüfungen.
+        """
+        return []
+
     def base_check(self):
-        self.check_mandatory_entries()
+        # Erforderliche Einträge und alle Prüfregeln in einem Durchlauf
+        pruefer = YamlPruefer()
+        pruefer.pruefe(self, self.pruefregeln())
+        pruefer.ergebnis()
 
     @staticmethod
     def regex_check(item, itemkey:str, compregex,*, default:bool=False, info=None) -> bool:
@@ -0,0 +1,13 @@
+CREATE TABLE antworten (
+    url text primary key,                         -- URL der Abfrage
+    status integer not null,                      -- HTTP-Status (nur 200)
+    encoding text,
+    headers text not null,                        -- Header der Antwort als JSON
+    inhalt blob not null,                         -- Inhalt (entpackt)
+    etag text,                                    -- für If-None-Match
+    last_modified text,                           -- für If-Modified-Since
+    geprueft real not null,                       -- Zeitpunkt (time.time) des letzten Downloads bzw. 304
+    zugriff real not null,                        -- Zeitpunkt der letzten Verwendung (LRU)
+    groesse integer not null                      -- Bytes von `inhalt`
+);
+CREATE INDEX a_zugriff ON antworten(zugriff);
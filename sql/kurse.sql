@@ -15,5 +15,6 @@ CREATE TABLE kurse (
     volumen float,
     FOREIGN KEY(fondsid) REFERENCES fonds(fondsid)
 );
-CREATE INDEX k_isin ON kurse(fondsid);
-CREATE INDEX k_datum ON kurse(fondsid, datum);
\ No newline at end of file
+CREATE UNIQUE INDEX k_fonds_datum ON kurse(fondsid, datum);
+
+-- Spätere Änderungen (z.B. Tabelle kurse_info) als Migrationen in lib/kursedb.py (PRAGMA user_version)
@@ -3,8 +3,21 @@
 
 import unittest
 import os
+import tempfile
+import sqlite3
+import gzip
+import importlib.util
+import datetime
+import json
+import math
+import threading
+import time
 
+import lib.aufzeichnung
 import lib.config
+import lib.drosselung
+import lib.httpcache
+import lib.handelskalender
 import lib.isincheck
 import lib.utils
 import lib.tranche
@@ -13,6 +26,26 @@ import lib.stammdaten
 import lib.depot
 import lib.transaktionen
 import lib.kursedb
+import lib.sqlite
+import lib.waehrung
+import lib.yamlbase
+import lib.pruefung
+import lib.onlinekursabfrage
+
+# Snapshots und Prüfergebnisse der Tests nicht in ~/.cache speichern
+_cache_tmpdir = None
+_cache_alt = None
+
+def setUpModule():
+    global _cache_tmpdir, _cache_alt
+    _cache_tmpdir = tempfile.TemporaryDirectory()
+    _cache_alt = (lib.yamlbase.SNAPSHOT_VERZEICHNIS, lib.pruefung.PRUEFCACHE_VERZEICHNIS)
+    lib.yamlbase.SNAPSHOT_VERZEICHNIS = os.path.join(_cache_tmpdir.name, "yaml")
+    lib.pruefung.PRUEFCACHE_VERZEICHNIS = os.path.join(_cache_tmpdir.name, "pruefung")
+
+def tearDownModule():
+    lib.yamlbase.SNAPSHOT_VERZEICHNIS, lib.pruefung.PRUEFCACHE_VERZEICHNIS = _cache_alt
+    _cache_tmpdir.cleanup()
 
 class TestIsinCheck(unittest.TestCase):
     def setUp(self):
@@ -158,12 +191,16 @@ class TestBeispielConfig(unittest.TestCase):
         self.assertEqual(cfg.get_filename_portfolio(), "./beispiele/portfolio.yaml")
         self.assertEqual(cfg.get_filename_ausschuettungen(), "./beispiele/ausschuettungen.yaml")
         self.assertEqual(cfg.get_filename_kursdatenbank(), "./beispiele/kurse_ov.db")
+        self.assertEqual(cfg.get_sqlite_profil(), {})
 
         stammdaten = lib.stammdaten.Stammdaten(cfg.get_filename_stammdaten())
 
         stammdaten.base_check()
         isinliste = stammdaten.get_all_isins()
         self.assertEqual(isinliste, ['LU1437016972', 'GB00BJDQQQ59', 'FR0010315770'])
+        self.assertEqual(stammdaten.get_entry_by_wkn("A2ATYV")[lib.stammdaten.STAMMDATEN_ISIN], "LU1437016972")
+        self.assertEqual(stammdaten.get_entry_by_onvista_notation(175063421)[lib.stammdaten.STAMMDATEN_ISIN], "LU1437016972")
+        self.assertIsNone(stammdaten.get_entry("LU1437016973"))
 
         depots = lib.depot.Depot_Stammdaten(cfg.get_filename_depots())
         depots.base_check()
@@ -171,9 +208,1077 @@ class TestBeispielConfig(unittest.TestCase):
         transaktionen = lib.transaktionen.Transaktionen(cfg.get_filename_portfolio(), cfg.get_filename_ausschuettungen(), depots=depots, isinliste=isinliste)
         transaktionen.base_check()
 
-        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        self.assertEqual(transaktionen.get_isin_depot_list(), [('postbank', 'FR0010315770'), ('postbank', 'LU1437016972')])
+        buchungen = transaktionen.get_buchungen_by_isin('LU1437016972', depot='postbank')
+        self.assertEqual([lib.utils.dstr(x.datum) for x in buchungen], ["05.10.2023", "06.11.2023"])
+        self.assertEqual(buchungen[0].anzahl, 2.0896)
+        res = transaktionen.get_by_isin('LU1437016972', start=lib.utils.dparse("1.11.2023"), ende=lib.utils.dparse("6.11.2023"))
+        self.assertEqual([x[lib.transaktionen.TRANSAKTION_DATUM] for x in res], ["06.11.2023"])
+        self.assertEqual(transaktionen.get_by_isin('FR0010315770', depot='flatex'), [])
+
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql", profile=cfg.get_sqlite_profil())
         kursedb.close()
 
+class TestYamlSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.alt_verzeichnis = lib.yamlbase.SNAPSHOT_VERZEICHNIS
+        lib.yamlbase.SNAPSHOT_VERZEICHNIS = os.path.join(self.tmpdir.name, "cache")
+        lib.yamlbase._snapshots.clear()
+        self.yamlname = os.path.join(self.tmpdir.name, "test.yaml")
+        with open(self.yamlname, "w", encoding="utf8") as fout:
+            fout.write("name: a\nwaehrung: EUR\n---\nname: b\nwaehrung: USD\n")
+
+    def tearDown(self):
+        lib.yamlbase.SNAPSHOT_VERZEICHNIS = self.alt_verzeichnis
+        lib.yamlbase._snapshots.clear()
+        self.tmpdir.cleanup()
+
+    def test_snapshot(self):
+        yb = lib.yamlbase.YamlBase(self.yamlname, ["name"])
+        self.assertEqual([x["name"] for x in yb.iter_entries()], ["a", "b"])
+        self.assertEqual(len(os.listdir(lib.yamlbase.SNAPSHOT_VERZEICHNIS)), 1)
+
+        # Snapshot von der Platte (ohne Cache im Speicher)
+        lib.yamlbase._snapshots.clear()
+        self.assertEqual(yb.stringsuche("name", "b")["waehrung"], "USD")
+
+        # Änderung der Datei wird erkannt
+        with open(self.yamlname, "a", encoding="utf8") as fout:
+            fout.write("---\nname: c\nwaehrung: CHF\n")
+        self.assertEqual([x["name"] for x in yb.iter_entries()], ["a", "b", "c"])
+
+class TestPruefung(unittest.TestCase):
+    def test_alle_fehler_sammeln(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fnm = os.path.join(tmpdir, "stammdaten.yaml")
+            with open(fnm, "w", encoding="utf8") as fout:
+                fout.write(
+                    "isin: LU1437016972\nname: A\nteilfreistellung: 30%\nkurswaehrung: EUR\ntyp: etf\n---\n"
+                    "isin: LU1437016973\nname: B\nteilfreistellung: 30\nkurswaehrung: EUR\ntyp: etf\n---\n"
+                    "isin: LU1437016972\nname: C\nteilfreistellung: 30%\nkurswaehrung: EUR\n"
+                )
+            stammdaten = lib.stammdaten.Stammdaten(fnm)
+            with self.assertRaises(lib.pruefung.PruefungFehlgeschlagenError) as cm:
+                stammdaten.base_check()
+            verstoesse = cm.exception.verstoesse
+            # 2. Eintrag: Teilfreistellung + Prüfziffer, 3. Eintrag: `typ` fehlt
+            self.assertEqual([x.index for x in verstoesse], [2, 2, 3])
+            self.assertTrue(all([x.dateiname == fnm for x in verstoesse]))
+
+    def test_inkrementell(self):
+        cfg = lib.config.Config("./config-beispiel.ini")
+        depots = lib.depot.Depot_Stammdaten(cfg.get_filename_depots())
+        isinliste = ['LU1437016972', 'GB00BJDQQQ59', 'FR0010315770']
+        transaktionen = lib.transaktionen.Transaktionen(cfg.get_filename_portfolio(), cfg.get_filename_ausschuettungen(), depots=depots, isinliste=isinliste)
+
+        aufrufe = []
+        def zaehle_regex_check(item, itemkey, compregex, **kwargs):
+            aufrufe.append(itemkey)
+            return lib.yamlbase.YamlBase.regex_check(item, itemkey, compregex, **kwargs)
+        transaktionen.regex_check = zaehle_regex_check
+
+        alt_verzeichnis = lib.pruefung.PRUEFCACHE_VERZEICHNIS
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lib.pruefung.PRUEFCACHE_VERZEICHNIS = tmpdir
+            try:
+                transaktionen.base_check()
+                self.assertNotEqual(aufrufe, [])
+
+                # unverändert => keine Regel wird erneut angewendet
+                aufrufe.clear()
+                transaktionen.base_check()
+                self.assertEqual(aufrufe, [])
+
+                # anderer Kontext (ISIN fehlt) => alles neu prüfen
+                transaktionen.isinliste = isinliste[:2]
+                self.assertRaises(lib.pruefung.PruefungFehlgeschlagenError, transaktionen.base_check)
+                self.assertNotEqual(aufrufe, [])
+            finally:
+                lib.pruefung.PRUEFCACHE_VERZEICHNIS = alt_verzeichnis
+
+    def test_do_ressourcen(self):
+        # Prüfung über den Weg von do.py: alle Verstöße aller Dateien auf einmal
+        spec = importlib.util.spec_from_file_location("do", "do.py")
+        do = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(do)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            def datei(name, inhalt):
+                fnm = os.path.join(tmpdir, name)
+                with open(fnm, "w", encoding="utf8") as fout:
+                    fout.write(inhalt)
+                return fnm
+
+            stammdaten = datei("stammdaten.yaml",
+                "isin: LU1437016972\nname: A\nkurswaehrung: EUR\ntyp: etf\nteilfreistellung: 30%\n---\n"
+                "isin: LU1437016973\nname: B\nkurswaehrung: EUR\ntyp: etf\nteilfreistellung: 30%\n---\n"
+                "isin: EURUSD\nname: Dollar\nkurswaehrung: USD\nteilfreistellung: 0%\n---\n"
+                "isin: LU1437016972\nname: A2\nkurswaehrung: EUR\ntyp: etf\nteilfreistellung: 30%\n---\n"
+                "isin: LU1437016972\nname: A3\nkurswaehrung: EUR\ntyp: etf\nteilfreistellung: 30%\n")
+            depots = datei("depots.yaml", "name: postbank\nwaehrung: EUR\n---\nname: postbank\nwaehrung: EUR\n")
+            portfolio = datei("portfolio.yaml",
+                "typ: kauf\ndatum: 05.10.2023\ndepot: flatex\nisin: LU1437016972\nkurs: 95,713\nwaehrung: EUR\nanzahl: 2\n")
+            ausschuettung = datei("ausschuettungen.yaml",
+                "typ: ausschuettung\ndatum: 05.12.2021\ndepot: postbank\nisin: LU1437016972\nbetrag: 12,13\nwaehrung: EUR\n")
+            inifile = datei("test.ini", "[data]\ndepots=%s\nwertpapiere_stammdaten=%s\nportfolio=%s\nausschuettung=%s\n" % (
+                depots, stammdaten, portfolio, ausschuettung))
+
+            alt_verzeichnis = lib.pruefung.PRUEFCACHE_VERZEICHNIS
+            lib.pruefung.PRUEFCACHE_VERZEICHNIS = None
+            try:
+                ressourcen = do.Ressourcen(lib.config.Config(inifile))
+                with self.assertRaises(lib.pruefung.PruefungFehlgeschlagenError) as cm:
+                    ressourcen.lade([do.RES_STAMMDATEN, do.RES_TRANSAKTIONEN])
+                verstoesse = [(os.path.basename(x.dateiname), x.index) for x in cm.exception.verstoesse]
+                # Prüfziffer, fehlender `typ` (ohne KeyError), doppelte ISINs, doppeltes Depot, unbekanntes Depot
+                self.assertEqual(verstoesse, [("stammdaten.yaml", 2), ("stammdaten.yaml", 3), ("stammdaten.yaml", 4),
+                                              ("stammdaten.yaml", 5), ("depots.yaml", 2), ("portfolio.yaml", 1)])
+                self.assertIn("Depot-ID mehrfach vergeben", str(cm.exception))
+                self.assertIn("Doppelte ISIN in Stammdaten LU1437016972", str(cm.exception))
+
+                # ohne Transaktionen nur Stammdaten und Depots
+                with self.assertRaises(lib.pruefung.PruefungFehlgeschlagenError) as cm:
+                    do.Ressourcen(lib.config.Config(inifile)).lade([do.RES_STAMMDATEN])
+                self.assertEqual(len(cm.exception.verstoesse), 5)
+
+                # Transaktionen nach den Stammdaten: bereits geladene Objekte bleiben gültig
+                ressourcen = do.Ressourcen(lib.config.Config("./config-beispiel.ini"))
+                stammdaten = ressourcen.stammdaten
+                depots = ressourcen.depots
+                transaktionen = ressourcen.transaktionen
+                self.assertIs(ressourcen.stammdaten, stammdaten)
+                self.assertIs(transaktionen.depots, depots)
+                self.assertEqual(transaktionen.isinliste, ['LU1437016972', 'GB00BJDQQQ59', 'FR0010315770'])
+            finally:
+                lib.pruefung.PRUEFCACHE_VERZEICHNIS = alt_verzeichnis
+
+class TestOnlineabfrageRegistry(unittest.TestCase):
+    def test_registry(self):
+        self.assertIn("onvista", lib.onlinekursabfrage.get_abfrage_ids())
+        self.assertIsNone(lib.onlinekursabfrage.get_abfrage_by_id("gibtsnicht"))
+        minfo = lib.onlinekursabfrage.get_abfrage_by_id("onvista")
+        self.assertEqual(minfo["module"].Onlineabfrage.ID, "onvista")
+        # zweiter Zugriff liefert das gespeicherte Ergebnis
+        self.assertIs(lib.onlinekursabfrage.get_abfrage_by_id("onvista"), minfo)
+
+class TestKursspalten(unittest.TestCase):
+    def test_kursspalten(self):
+        from lib.onlinekursabfrage.base import Kursspalten, unix_zu_tagen, als_kursspalten
+
+        zeitstempel = [0, 86399, 86400, 1704153600, 1704196800.5]
+        self.assertEqual(list(unix_zu_tagen(zeitstempel)),
+                         [datetime.datetime.utcfromtimestamp(ts).date().toordinal() for ts in zeitstempel])
+
+        zeilen = [{"datum": datetime.datetime(2024, 1, 2, 18, 0), "last": 100.0, "volume": None},
+                  {"datum": datetime.datetime(2024, 1, 3, 18, 0), "last": 101.0, "volume": 7}]
+        spalten = als_kursspalten(zeilen)
+        self.assertIs(als_kursspalten(spalten), spalten)
+        self.assertEqual(len(spalten), 2)
+        self.assertEqual(spalten.datum(1), datetime.date(2024, 1, 3))
+        self.assertTrue(math.isnan(spalten.volume[0]))
+        self.assertEqual(spalten.volume[1], 7.0)
+        self.assertEqual(spalten.index_nach(datetime.date(2024, 1, 2).toordinal()), 1)
+        self.assertIsNone(spalten.index_exakt(datetime.date(2024, 1, 4).toordinal()))
+
+        # fehlende Spalten sind eigenständige Arrays
+        neue = Kursspalten()
+        neue.anhaengen(spalten, 1)
+        self.assertEqual(list(neue.last), [101.0])
+        self.assertEqual(len(neue.low), 1)
+        self.assertEqual(len(neue.volume), 1)
+
+class TestDrosselung(unittest.TestCase):
+    def setUp(self):
+        self.zeit = 1000.0
+        self.geschlafen = []
+
+    def uhr(self):
+        return self.zeit
+
+    def schlafen(self, sekunden):
+        self.geschlafen.append(round(sekunden, 3))
+        self.zeit += sekunden
+
+    def test_token_bucket(self):
+        bucket = lib.drosselung.TokenBucket(abstand=7.0, kapazitaet=2, zufall=0.0, uhr=self.uhr)
+        for _ in range(4):
+            bucket.warte(self.schlafen)
+        self.assertEqual(self.geschlafen, [7.0, 7.0])
+        self.zeit += 100
+        bucket.warte(self.schlafen)
+        self.assertEqual(self.geschlafen, [7.0, 7.0])
+
+    def test_retry_after(self):
+        self.assertEqual(lib.drosselung.retry_after({"Retry-After": "30"}), 30.0)
+        self.assertEqual(lib.drosselung.retry_after({"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}, jetzt=1445412470.0), 10.0)
+        self.assertIsNone(lib.drosselung.retry_after({"Content-Type": "text/plain"}))
+
+        antworten = [(429, b"", {"headers": {"Retry-After": "30"}}), (200, b"ok", {"headers": {}})]
+        abgefragt = []
+        class Downloader:
+            def get_url(self, url):
+                abgefragt.append(url)
+                return antworten.pop(0)
+
+        dl = lib.drosselung.GedrosselterDownloader(Downloader(), abstand=7.0, zufall=0.0, uhr=self.uhr, schlafen=self.schlafen)
+        self.assertEqual(dl.get_url("https://api.example.org/a")[0], 200)
+        self.assertEqual(len(abgefragt), 2)
+        self.assertEqual(self.geschlafen, [30.0])
+        # anderer Host hat einen eigenen Bucket
+        self.assertIsNot(dl.bucket("api.example.org"), dl.bucket("www.example.org"))
+
+    def test_refresh(self):
+        import lib.module.kurse_online
+        start = lib.utils.dparse("2.1.2023")
+        online = [(start + datetime.timedelta(days=i), 100.0 + i) for i in range(8)]
+
+        class Abfrage:
+            # liefert höchstens 3 Kurse ab `startdate`
+            def query_isin(self, *, isin, startdate):
+                if isin != "LU1437016972":
+                    return []
+                return [{"datum": datetime.datetime.combine(tag, datetime.time()), "last": kurs, "volume": 0}
+                        for tag, kurs in online if tag >= startdate][:3]
+
+        class Stammdaten:
+            def get_entry(self, isin):
+                return {lib.stammdaten.STAMMDATEN_NAME: "Fonds " + isin}
+
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        try:
+            for isin in ["LU1437016972", "FR0010315770"]:
+                kursedb.insert_isin(isin)
+                kursedb.upsert_kurse(isin, datalist=[TestKurseDB.kurs("2.1.2023", 100.0)])
+
+            lib.module.kurse_online.refresh_datenbank(config=None, downloader=None, kursedb=kursedb, stammdaten=Stammdaten(),
+                abfrager=[{"name": "test", "poi": Abfrage()}], threads=2)
+
+            self.assertEqual(kursedb.count_kurse(isin="LU1437016972"), 8)
+            self.assertEqual(kursedb.get_last_kurs("LU1437016972")[lib.kursedb.KURSEDB_SCHLUSSKURS], 107.0)
+            self.assertEqual(kursedb.count_kurse(isin="FR0010315770"), 1)
+        finally:
+            kursedb.close()
+
+    def test_refresh_abbruch(self):
+        # Strg-C beim Schreiben: der Thread, der in der Drosselung wartet, wird sofort geweckt
+        import lib.module.kurse_online
+        start = lib.utils.dparse("2.1.2023")
+
+        class Downloader:
+            def get_url(self, url):
+                return 200, b"", {"headers": {}}
+
+        dl = lib.drosselung.GedrosselterDownloader(Downloader(), abstand=30.0, kapazitaet=1, zufall=0.0)
+
+        class Abfrage:
+            def query_isin(self, *, isin, startdate):
+                if startdate != start:
+                    return []
+                dl.get_url("https://api.example.org/" + isin)
+                return [{"datum": datetime.datetime.combine(startdate + datetime.timedelta(days=i), datetime.time()),
+                         "last": 100.0 + i, "volume": 0} for i in range(2)]
+
+        class Stammdaten:
+            def get_entry(self, isin):
+                return {lib.stammdaten.STAMMDATEN_NAME: "Fonds " + isin}
+
+        def strg_c(*args, **kwargs):
+            raise KeyboardInterrupt()
+
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        try:
+            for isin in ["LU1437016972", "FR0010315770"]:
+                kursedb.insert_isin(isin)
+                kursedb.upsert_kurse(isin, datalist=[TestKurseDB.kurs("2.1.2023", 100.0)])
+            kursedb.upsert_kurs_spalten = strg_c
+
+            beginn = time.monotonic()
+            self.assertRaises(KeyboardInterrupt, lib.module.kurse_online.refresh_datenbank,
+                config=None, downloader=dl, kursedb=kursedb, stammdaten=Stammdaten(),
+                abfrager=[{"name": "test", "poi": Abfrage()}], threads=2, heute=start + datetime.timedelta(days=7))
+            self.assertLess(time.monotonic() - beginn, 10.0)
+            self.assertRaises(lib.drosselung.AbfrageAbgebrochen, dl.get_url, "https://api.example.org/x")
+        finally:
+            kursedb.close()
+
+    def test_refresh_fenster(self):
+        import lib.module.kurse_online
+        import concurrent.futures
+        start = lib.utils.dparse("2.1.2023")
+        online = {start + datetime.timedelta(days=i): 100.0 + i for i in range(40)}
+        abgefragt = []
+        abweichend = {}             # Startdatum -> erster Kurs der Abfrage
+        verspaetet = {}             # Startdatum -> Tage, die am Anfang fehlen
+
+        class Abfrage:
+            FENSTER_TAGE = 7
+            # liefert 10 Tage ab `startdate`
+            def query_isin(self, *, isin, startdate):
+                abgefragt.append(startdate)
+                von = startdate + datetime.timedelta(days=verspaetet.get(startdate, 0))
+                res = [{"datum": datetime.datetime.combine(tag, datetime.time()), "last": kurs, "volume": 0}
+                       for tag, kurs in sorted(online.items()) if von <= tag < startdate + datetime.timedelta(days=10)]
+                if startdate in abweichend:
+                    res[0]["last"] = abweichend[startdate]
+                return res
+
+        bis = start + datetime.timedelta(days=39)
+        starts = lib.module.kurse_online.plane_fenster(start, bis, 7)
+        self.assertEqual(starts, [start + datetime.timedelta(days=7 * i) for i in range(6)])
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse([{"name": "test", "poi": Abfrage()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis, executor=executor)
+            self.assertEqual(sorted(abgefragt), starts)
+            self.assertEqual(list(neue_daten.last), [101.0 + i for i in range(39)])
+            self.assertEqual(neue_daten.datum(0), start + datetime.timedelta(days=1))
+            self.assertEqual(warnungen, [])
+
+            # mittleres Fenster leer: übernommen wird nur, was davor lückenlos geladen wurde
+            verspaetet[start + datetime.timedelta(days=14)] = 10
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse([{"name": "test", "poi": Abfrage()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis, executor=executor)
+            self.assertEqual(list(neue_daten.last), [101.0 + i for i in range(16)])
+            self.assertEqual(len(warnungen), 1)
+            self.assertIn("ohne Kurse", warnungen[0])
+
+            # Lücke am Anfang eines Fensters (Do 26.1.2023 fehlt)
+            verspaetet[start + datetime.timedelta(days=14)] = 0
+            verspaetet[start + datetime.timedelta(days=21)] = 4
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse([{"name": "test", "poi": Abfrage()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis, executor=executor)
+            self.assertEqual(neue_daten.datum(-1), start + datetime.timedelta(days=23))
+            self.assertEqual(len(warnungen), 1)
+            self.assertIn("Lücke vor 27.01.2023", warnungen[0])
+
+            # erstes Fenster leer: kein Anschluss an die Datenbank
+            verspaetet.clear()
+            verspaetet[start] = 10
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse([{"name": "test", "poi": Abfrage()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis, executor=executor)
+            self.assertEqual(len(neue_daten), 0)
+            self.assertIn("ohne Kurse", warnungen[0])
+            verspaetet.clear()
+
+            # Abweichung in der Überlappung zweier Fenster
+            abweichend[start + datetime.timedelta(days=14)] = 50.0
+            self.assertRaises(ValueError, lib.module.kurse_online._hole_neue_kurse, [{"name": "test", "poi": Abfrage()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis, executor=executor)
+
+    def test_fenster_wochenende(self):
+        # Grenze zweier Fenster an einem Wochenende: ohne gemeinsamen Kurs wird gewarnt
+        import lib.module.kurse_online
+        start = lib.utils.dparse("2.1.2023")            # Montag
+        online = [(start + datetime.timedelta(days=i), 100.0 + i) for i in range(14)
+                  if lib.handelskalender.ist_handelstag(start + datetime.timedelta(days=i))]
+
+        class Abfrage:
+            FENSTER_TAGE = 5                            # 2. Fenster ab Samstag, 7.1.
+            # liefert die Kurse bis einschließlich `startdate` + 5 Tage
+            def query_isin(self, *, isin, startdate):
+                return [{"datum": datetime.datetime.combine(tag, datetime.time()), "last": kurs, "volume": 0}
+                        for tag, kurs in online if startdate <= tag <= startdate + datetime.timedelta(days=5)]
+
+        neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse([{"name": "test", "poi": Abfrage()}],
+            isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=lib.utils.dparse("12.1.2023"))
+        self.assertEqual(neue_daten.datum(-1), lib.utils.dparse("12.1.2023"))
+        self.assertEqual(len(warnungen), 1)
+        self.assertIn("ab 07.01.2023 nicht prüfbar", warnungen[0])
+
+        # Onvista (range=M1, mindestens bis zum selben Tag des Folgemonats): Fenster überlappen sich
+        # immer um Handelstage, auch im Februar und über Wochenenden
+        from lib.onlinekursabfrage.query_onvista import Onlineabfrage
+        schritt = datetime.timedelta(days=Onlineabfrage.FENSTER_TAGE)
+        tag = lib.utils.dparse("1.1.2024")
+        for _ in range(366):
+            ende = lib.aufzeichnung._monat_spaeter(tag)
+            self.assertGreater(lib.handelskalender.anzahl_handelstage(tag + schritt - datetime.timedelta(days=1), ende - datetime.timedelta(days=1)), 1, tag)
+            tag += datetime.timedelta(days=1)
+
+    def test_gleichzeitig_drosselung(self):
+        # der Verlierer wartet in der Drosselung seines Hosts und fragt danach nicht mehr ab
+        import lib.module.kurse_online
+        import concurrent.futures
+        start = lib.utils.dparse("2.1.2023")
+        abgefragt = []
+
+        class Downloader:
+            def get_url(self, url):
+                abgefragt.append(url)
+                return 200, b"", {"headers": {}}
+
+        dl = lib.drosselung.GedrosselterDownloader(Downloader(), abstand=30.0, kapazitaet=1, zufall=0.0)
+        dl.get_url("http://b.example.org/vorher")         # Token von Host b verbraucht
+
+        class Abfrage:
+            FENSTER_TAGE = 7
+            def __init__(self, host):
+                self.host = host
+            def query_isin(self, *, isin, startdate):
+                dl.get_url("http://%s/%s" % (self.host, isin))
+                return [{"datum": datetime.datetime.combine(startdate + datetime.timedelta(days=i), datetime.time()),
+                         "last": 100.0 + i, "volume": 0} for i in range(3)]
+
+        abfrager = [{"name": "b", "poi": Abfrage("b.example.org")}, {"name": "a", "poi": Abfrage("a.example.org")}]
+        beginn = time.monotonic()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=2) as abfrage_executor:
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse(abfrager,
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=start + datetime.timedelta(days=2),
+                executor=executor, abfrage_executor=abfrage_executor)
+            self.assertEqual(list(neue_daten.last), [101.0, 102.0])
+        self.assertLess(time.monotonic() - beginn, 10.0)
+        self.assertEqual(abgefragt, ["http://b.example.org/vorher", "http://a.example.org/LU1437016972"])
+        self.assertEqual(dl.wartende, [])
+        # der Downloader selbst ist nicht abgebrochen
+        self.assertFalse(dl.abbruch.is_set())
+
+    def test_refresh_gleichzeitig(self):
+        import lib.module.kurse_online
+        import concurrent.futures
+        from lib.onlinekursabfrage.base import PlausibilitaetskontrolleException
+        start = lib.utils.dparse("2.1.2023")
+        bis = start + datetime.timedelta(days=20)
+        online = [(start + datetime.timedelta(days=i), 100.0 + i) for i in range(21)]
+        freigabe = threading.Event()
+        langsam_abgefragt = []
+
+        def kurse(startdate):
+            return [{"datum": datetime.datetime.combine(tag, datetime.time()), "last": kurs, "volume": 0}
+                    for tag, kurs in online if tag >= startdate]
+
+        class Langsam:
+            FENSTER_TAGE = 7
+            def query_isin(self, *, isin, startdate):
+                langsam_abgefragt.append(startdate)
+                freigabe.wait(5)
+                return kurse(startdate)
+
+        class Schnell:
+            def query_isin(self, *, isin, startdate):
+                return kurse(startdate)
+
+        class Falsch:
+            def query_isin(self, *, isin, startdate):
+                raise PlausibilitaetskontrolleException("Markt nicht KVG")
+
+        class OhneAnschluss:
+            def query_isin(self, *, isin, startdate):
+                return [{"datum": datetime.datetime.combine(startdate, datetime.time()), "last": 50.0, "volume": 0}] * 2
+
+        abfrager = [{"name": "langsam", "poi": Langsam()}, {"name": "falsch", "poi": Falsch()}, {"name": "schnell", "poi": Schnell()}]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=3) as abfrage_executor:
+            neue_daten, warnungen = lib.module.kurse_online._hole_neue_kurse(abfrager,
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis,
+                executor=executor, abfrage_executor=abfrage_executor)
+            self.assertEqual(list(neue_daten.last), [101.0 + i for i in range(20)])
+            self.assertEqual(warnungen, ["* falsch: Markt nicht KVG"])
+            freigabe.set()
+
+            # kein gültiges Ergebnis: Fehler des ersten Abfragemoduls
+            self.assertRaises(PlausibilitaetskontrolleException, lib.module.kurse_online._hole_neue_kurse,
+                [{"name": "falsch", "poi": Falsch()}, {"name": "ohne", "poi": OhneAnschluss()}],
+                isin="LU1437016972", letztes_datum=start, letzter_kurs=100.0, bis=bis,
+                executor=executor, abfrage_executor=abfrage_executor)
+
+        # die weiteren Fenster der langsamen Abfrage wurden nicht mehr abgefragt
+        # (war die schnelle Abfrage vor dem Start fertig, auch das erste nicht)
+        self.assertIn(langsam_abgefragt, [[], [start]])
+
+class TestHandelskalender(unittest.TestCase):
+    def test_kalender(self):
+        d = lib.utils.dparse
+        self.assertEqual(lib.handelskalender.ostersonntag(2024), d("31.3.2024"))
+        self.assertEqual(lib.handelskalender.ostersonntag(2025), d("20.4.2025"))
+        self.assertFalse(lib.handelskalender.ist_handelstag(d("29.3.2024")))       # Karfreitag
+        self.assertFalse(lib.handelskalender.ist_handelstag(d("1.4.2024")))        # Ostermontag
+        self.assertTrue(lib.handelskalender.ist_handelstag(d("20.5.2024")))        # Pfingstmontag
+        self.assertFalse(lib.handelskalender.ist_handelstag(d("24.12.2024")))
+        self.assertTrue(lib.handelskalender.ist_handelstag(d("24.12.2024"), lib.handelskalender.KALENDER_TARGET2))
+        self.assertEqual(lib.handelskalender.letzter_handelstag(d("1.1.2025")), d("30.12.2024"))
+        self.assertEqual(lib.handelskalender.letzter_handelstag(d("1.1.2025"), lib.handelskalender.KALENDER_TARGET2), d("31.12.2024"))
+        self.assertEqual(lib.handelskalender.anzahl_handelstage(d("20.12.2024"), d("3.1.2025")), 5)       # 23., 27., 30.12., 2., 3.1.
+        self.assertRaises(ValueError, lib.handelskalender.feiertage, 2024, "nyse")
+
+    def test_auswahl(self):
+        import lib.module.kurse_online
+        d = lib.utils.dparse
+        def eintrag(isin, datum):
+            return {lib.kursedb.KURSEDB_ISIN: isin, lib.kursedb.KURSEDB_LETZTER_DATUM: d(datum)}
+        uebersicht = [eintrag("A", "7.1.2025"), eintrag("B", "27.12.2024"), eintrag("C", "8.11.2024")]
+
+        auswahl, aktuell, uebersprungen = lib.module.kurse_online.waehle_auftraege(uebersicht, heute=d("8.1.2025"))
+        self.assertEqual([x[lib.kursedb.KURSEDB_ISIN] for x in auswahl], ["C", "B"])
+        self.assertEqual(aktuell, ["A"])
+
+        # "C" braucht 3 Abfragen zu je 28 Tagen
+        auswahl, aktuell, uebersprungen = lib.module.kurse_online.waehle_auftraege(uebersicht, heute=d("8.1.2025"), fenster_tage=28, budget=2)
+        self.assertEqual([x[lib.kursedb.KURSEDB_ISIN] for x in auswahl], ["B"])
+        self.assertEqual(uebersprungen, ["C"])
+
+        auswahl, aktuell, uebersprungen = lib.module.kurse_online.waehle_auftraege(uebersicht, heute=d("8.1.2025"), alle=True)
+        self.assertEqual(len(auswahl), 3)
+
+        # zwei Abfragemodule gleichzeitig: "B" kostet 2 x 1, "C" 2 x 3 Abfragen
+        auswahl, aktuell, uebersprungen = lib.module.kurse_online.waehle_auftraege(uebersicht, heute=d("8.1.2025"), fenster_tage=[28, 28], budget=5)
+        self.assertEqual([x[lib.kursedb.KURSEDB_ISIN] for x in auswahl], ["B"])
+        self.assertEqual(uebersprungen, ["C"])
+
+    def test_budget_zwei_abfragemodule(self):
+        import lib.module.kurse_online
+        start = lib.utils.dparse("2.1.2023")
+        heute = start + datetime.timedelta(days=21)         # 3 Fenster zu 7 Tagen
+        abgefragt = []
+
+        class Abfrage:
+            FENSTER_TAGE = 7
+            def __init__(self, name, kurse):
+                self.name = name
+                self.kurse = kurse
+            def query_isin(self, *, isin, startdate):
+                abgefragt.append(self.name)
+                if not self.kurse:
+                    return []
+                return [{"datum": datetime.datetime.combine(startdate + datetime.timedelta(days=i), datetime.time()),
+                         "last": 100.0 + (startdate - start).days + i, "volume": 0} for i in range(8)]
+
+        class Stammdaten:
+            def get_entry(self, isin):
+                return {lib.stammdaten.STAMMDATEN_NAME: "Fonds " + isin}
+
+        abfrager = [{"name": "leer", "poi": Abfrage("leer", False)}, {"name": "voll", "poi": Abfrage("voll", True)}]
+        # erwartet: Abfragen je Abfragemodul (gleichzeitig: "leer" wird evtl. vorher abgebrochen)
+        for gleichzeitig, budget, erwartet in [(False, 3, {"leer": 3}), (False, 6, {"leer": 3, "voll": 3}),
+                                               (True, 5, {"leer": 0, "voll": 0}), (True, 6, {"voll": 3})]:
+            del abgefragt[:]
+            kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+            try:
+                kursedb.insert_isin("LU1437016972")
+                kursedb.upsert_kurse("LU1437016972", datalist=[TestKurseDB.kurs("2.1.2023", 100.0)])
+                lib.module.kurse_online.refresh_datenbank(config=None, downloader=None, kursedb=kursedb, stammdaten=Stammdaten(),
+                    abfrager=abfrager, threads=1, heute=heute, budget=budget, gleichzeitig=gleichzeitig)
+                self.assertLessEqual(len(abgefragt), budget)
+                for name, anzahl in erwartet.items():
+                    self.assertEqual(abgefragt.count(name), anzahl, (gleichzeitig, budget))
+                self.assertEqual(kursedb.count_kurse() > 1, erwartet.get("voll", 0) > 0)
+            finally:
+                kursedb.close()
+
+@unittest.skipIf(importlib.util.find_spec("requests") is None, "requests nicht installiert")
+class TestSimpleDownloader(unittest.TestCase):
+    # lokaler HTTP-Server als Ersatz für die Websites
+    def setUp(self):
+        import http.server
+        import threading
+
+        self.anfragen = []          # (Port des Clients, Accept-Encoding)
+        self.antworten = []         # (Status, Header), danach 200
+        test = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                test.anfragen.append((self.client_address[1], self.headers.get("Accept-Encoding")))
+                if self.headers.get("If-None-Match") == '"v1"':
+                    self.send_response(304)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status, header = test.antworten.pop(0) if test.antworten else (200, {"ETag": '"v1"'})
+                body = gzip.compress(b'{"last": [101.5]}')
+                self.send_response(status)
+                self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in header.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = "http://127.0.0.1:%d/kurse" % self.server.server_address[1]
+
+        import lib.simpledownloader
+        self.geschlafen = []
+        self.dl = lib.simpledownloader.SimpleDownloader(timeout=5, wiederholungen=2, backoff=0.5, schlafen=self.geschlafen.append)
+
+    def tearDown(self):
+        self.dl.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_url(self):
+        self.antworten = [(500, {}), (502, {})]
+        status, data, info = self.dl.get_url(self.url)
+        self.assertEqual(status, 200)
+        self.assertEqual(data, b'{"last": [101.5]}')
+        self.assertEqual(self.geschlafen, [0.5, 1.0])
+
+        # Verbindung wird wiederverwendet
+        self.dl.get_url(self.url)
+        self.assertEqual(len(self.anfragen), 4)
+        self.assertEqual(len(set(port for port, _ in self.anfragen)), 1)
+        self.assertIn("gzip", self.anfragen[0][1])
+
+        host, anzahl, wiederholungen, fehler = self.dl.statistik_zeilen()[0][:4]
+        self.assertEqual((anzahl, wiederholungen, fehler), (4, 2, 2))
+
+    def test_fehler(self):
+        # alle Versuche 5xx => letzte Antwort
+        self.antworten = [(500, {})] * 3
+        self.assertEqual(self.dl.get_url(self.url)[0], 500)
+        self.assertEqual(len(self.anfragen), 3)
+
+        # mit Retry-After entscheidet der Aufrufer
+        self.antworten = [(503, {"Retry-After": "30"})]
+        self.assertEqual(self.dl.get_url(self.url)[0], 503)
+        self.assertEqual(len(self.anfragen), 4)
+
+        # keine Verbindung (freier Port ohne Server)
+        import requests
+        import socket
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.geschlafen.clear()
+        self.assertRaises(requests.ConnectionError, self.dl.get_url, "http://127.0.0.1:%d/kurse" % port)
+        self.assertEqual(self.geschlafen, [0.5, 1.0])
+
+    def test_gedrosselt(self):
+        # 429/503 ohne Retry-After wiederholt nur die Drosselung, nicht zusätzlich der Downloader
+        zeit = [1000.0]
+        def schlafen(sekunden):
+            zeit[0] += sekunden
+        dl = lib.drosselung.GedrosselterDownloader(self.dl, abstand=1.0, zufall=0.0, uhr=lambda: zeit[0], schlafen=schlafen)
+        self.antworten = [(503, {})] * 4
+        self.assertEqual(dl.get_url(self.url)[0], 503)
+        self.assertEqual(len(self.anfragen), 4)
+        self.assertEqual(self.geschlafen, [])
+
+        # andere 5xx wiederholt weiterhin der Downloader
+        self.antworten = [(500, {}), (429, {})]
+        self.assertEqual(dl.get_url(self.url)[0], 200)
+        self.assertEqual(len(self.anfragen), 7)
+        self.assertEqual(self.geschlafen, [0.5])
+
+    def test_cache(self):
+        import lib.httpcache
+        zeit = [1000.0]
+        cache = lib.httpcache.HttpCache.open_cache(":memory:", ttl=60, uhr=lambda: zeit[0])
+        self.dl.cache = cache
+
+        self.assertEqual(self.dl.get_url(self.url)[1], b'{"last": [101.5]}')
+        status, data, info = self.dl.get_url(self.url)
+        self.assertEqual((status, data), (200, b'{"last": [101.5]}'))
+        self.assertTrue(info["aus_cache"])
+        self.assertEqual(len(self.anfragen), 1)
+
+        # abgelaufen => bedingte Abfrage, 304
+        zeit[0] += 120
+        self.assertEqual(self.dl.get_url(self.url)[1], b'{"last": [101.5]}')
+        self.assertEqual(len(self.anfragen), 2)
+        self.assertEqual((cache.treffer, cache.bestaetigt, cache.gespeichert), (1, 1, 1))
+
+        # offline nur aus dem Zwischenspeicher (auch abgelaufen)
+        zeit[0] += 120
+        cache.offline = True
+        self.assertEqual(self.dl.get_url(self.url)[0], 200)
+        self.assertEqual(self.dl.get_url(self.url + "?neu")[0], lib.httpcache.HTTPCACHE_STATUS_OFFLINE)
+        self.assertEqual(len(self.anfragen), 2)
+        cache.close()
+
+class TestHttpCache(unittest.TestCase):
+    def test_verdraengen(self):
+        zeit = [1000.0]
+        def uhr():
+            zeit[0] += 1
+            return zeit[0]
+
+        cache = lib.httpcache.HttpCache.open_cache(":memory:", max_bytes=10, uhr=uhr)
+        try:
+            cache.speichere("a", 200, b"aaaaaa", {"headers": {"etag": '"a1"'}})
+            cache.speichere("b", 200, b"bbbb", {"headers": {"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"}})
+            cache.speichere("x", 500, b"x", {})
+            self.assertIsNotNone(cache.frische_antwort("a"))
+            self.assertEqual(cache.bedingungen("a"), {"If-None-Match": '"a1"'})
+            self.assertEqual(cache.bedingungen("b"), {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"})
+            self.assertIsNone(cache.frische_antwort("x"))
+
+            # "b" wurde am längsten nicht verwendet
+            cache.speichere("c", 200, b"cccc", {})
+            self.assertEqual(cache.fetchall("SELECT url FROM antworten ORDER BY url", None, tolistparam="url"), ["a", "c"])
+        finally:
+            cache.close()
+
+class TestAufzeichnung(unittest.TestCase):
+    URL = "https://api.onvista.de/api/v1/instruments/FUND/F1/eod_history?idNotation=1001&range=M1&startDate=2024-01-01&withEarnings=false"
+
+    class Onvista:
+        # Kurse 1.1.-29.2.2024 (Mitternacht UTC), unabhängig von `startDate`
+        def get_url(self, url):
+            tage = [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(60)]
+            dj = {
+                "market": {"name": "KVG"},
+                "isoCurrency": "EUR",
+                "datetimeLast": [int(datetime.datetime(x.year, x.month, x.day, tzinfo=datetime.timezone.utc).timestamp()) for x in tage],
+                "last": [100.0 + i for i in range(60)],
+                "low": [0.0] * 60,
+                "high": [0.0] * 60,
+                "volume": [0] * 60,
+            }
+            return 200, json.dumps(dj).encode("utf-8"), {"encoding": "utf-8", "headers": {"Content-Type": "application/json"}}
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        dl = lib.aufzeichnung.AufzeichnenderDownloader(self.Onvista(), self.tmpdir.name)
+        self.original = dl.get_url(self.URL)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_wiedergabe(self):
+        dl = lib.aufzeichnung.WiedergabeDownloader(self.tmpdir.name)
+        self.assertEqual(dl.get_url(self.URL), self.original)
+        # ohne Host
+        self.assertEqual(dl.get_url(self.URL.replace("https://api.onvista.de", "http://127.0.0.1:8080"))[1], self.original[1])
+        self.assertEqual(dl.get_url("https://api.onvista.de/unbekannt")[0], 404)
+
+        # anderes Startdatum: ein Monat aus den aufgezeichneten Kursen
+        status, data, _ = dl.get_url(self.URL.replace("2024-01-01", "2024-02-10"))
+        self.assertEqual(status, 200)
+        dj = json.loads(data)
+        self.assertEqual(dj["market"], {"name": "KVG"})
+        self.assertEqual(dj["last"], [140.0 + i for i in range(20)])
+
+        dl = lib.aufzeichnung.WiedergabeDownloader(self.tmpdir.name, fehlerquote=1.0)
+        self.assertEqual(dl.get_url(self.URL)[0], lib.aufzeichnung.AUFZEICHNUNG_FEHLERSTATUS)
+        self.assertEqual(dl.statistik_zeilen(), [("Wiedergabe", 1, 0, 1, 0.0, 0.0, 0.0)])
+
+    @unittest.skipIf(importlib.util.find_spec("requests") is None, "requests nicht installiert")
+    def test_server(self):
+        from lib.simpledownloader import SimpleDownloader
+        import lib.onlinekursabfrage.query_onvista as query_onvista
+
+        class Stammdaten:
+            def get_entry(self, isin):
+                return {lib.stammdaten.STAMMDATEN_TYP: lib.stammdaten.STAMMDATEN_TYP_FUND,
+                        lib.stammdaten.STAMMDATEN_KURSWAEHRUNG: "EUR",
+                        query_onvista.ONVISTA_ENTITY: "F1", query_onvista.ONVISTA_NOTATION: "1001"}
+
+        with lib.aufzeichnung.StandInServer(self.tmpdir.name) as server:
+            inifile = os.path.join(self.tmpdir.name, "test.ini")
+            with open(inifile, "w") as fout:
+                fout.write("[onvista]\napi_url=%s/\n" % server.basis_url)
+            dl = SimpleDownloader()
+            abfrage = query_onvista.Onlineabfrage(downloader=dl, stammdaten=Stammdaten(), iniconfig=lib.config.Config(inifile))
+            kurse = abfrage.query_isin(isin="LU1437016972", startdate=datetime.date(2024, 2, 20))
+            dl.close()
+        self.assertEqual(server.abfragen, 1)
+        self.assertEqual(kurse.datum(0), datetime.date(2024, 2, 20))
+        self.assertEqual(list(kurse.last), [150.0 + i for i in range(10)])
+
+class TestKurseDB(unittest.TestCase):
+    def setUp(self):
+        self.kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        self.fondsid = self.kursedb.insert_isin("LU1437016972")
+
+    def tearDown(self):
+        self.kursedb.close()
+
+    @staticmethod
+    def kurs(datum, schluss):
+        return {lib.kursedb.KURSEDB_DATUM: lib.utils.dparse(datum), lib.kursedb.KURSEDB_SCHLUSSKURS: schluss}
+
+    def test_upsert(self):
+        daten = [self.kurs("2.1.2023", 100.0), self.kurs("3.1.2023", 101.0), self.kurs("4.1.2023", 102.0)]
+        res = self.kursedb.upsert_kurse("LU1437016972", datalist=daten)
+        self.assertEqual(res, {lib.kursedb.KURSEDB_ANZ_NEU: 3, lib.kursedb.KURSEDB_ANZ_GEAENDERT: 0, lib.kursedb.KURSEDB_ANZ_UNVERAENDERT: 0})
+
+        # erneutes Einlesen erzeugt keine doppelten Einträge
+        daten = [self.kurs("3.1.2023", 101.0), self.kurs("4.1.2023", 102.5), self.kurs("5.1.2023", 103.0)]
+        res = self.kursedb.upsert_kurse(self.fondsid, datalist=daten)
+        self.assertEqual(res, {lib.kursedb.KURSEDB_ANZ_NEU: 1, lib.kursedb.KURSEDB_ANZ_GEAENDERT: 1, lib.kursedb.KURSEDB_ANZ_UNVERAENDERT: 1})
+        self.assertEqual(self.kursedb.count_kurse(isin="LU1437016972"), 4)
+        self.assertEqual(self.kursedb.get_kurs_db(self.fondsid, lib.utils.dparse("4.1.2023"))[lib.kursedb.KURSEDB_SCHLUSSKURS], 102.5)
+
+    def test_upsert_kurs_spalten(self):
+        tage = [lib.utils.dparse(x).toordinal() for x in ["2.1.2023", "3.1.2023", "4.1.2023"]]
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0)])
+        res = self.kursedb.upsert_kurs_spalten("LU1437016972", tage=tage, schluss=[100.0, 101.0, 102.0],
+                                               volumen=[float("nan"), 5.0, float("nan")])
+        self.assertEqual(res, {lib.kursedb.KURSEDB_ANZ_NEU: 2, lib.kursedb.KURSEDB_ANZ_GEAENDERT: 0, lib.kursedb.KURSEDB_ANZ_UNVERAENDERT: 1})
+        self.assertEqual(self.kursedb.get_kurse_tupel(self.fondsid),
+                         [lib.kursedb.Kurs(lib.utils.dparse("2.1.2023"), 100.0, None, None),
+                          lib.kursedb.Kurs(lib.utils.dparse("3.1.2023"), 101.0, None, 5.0),
+                          lib.kursedb.Kurs(lib.utils.dparse("4.1.2023"), 102.0, None, None)])
+
+    def test_get_kurs(self):
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0), self.kurs("4.1.2023", 102.0)])
+        res = self.kursedb.get_kurs("LU1437016972", lib.utils.dparse("4.1.2023"))
+        self.assertTrue(res[lib.kursedb.KURSEDB_EXAKTES_DATUM])
+        self.assertEqual(res[lib.kursedb.KURSEDB_SCHLUSSKURS], 102.0)
+        self.assertEqual(res[lib.kursedb.KURSEDB_KURSWAEHRUNG], "EUR")
+        res = self.kursedb.get_kurs("LU1437016972", lib.utils.dparse("3.1.2023"))
+        self.assertFalse(res[lib.kursedb.KURSEDB_EXAKTES_DATUM])
+        self.assertEqual(res[lib.kursedb.KURSEDB_DATUM], lib.utils.dparse("2.1.2023"))
+        self.assertIsNone(self.kursedb.get_kurs("LU1437016972", lib.utils.dparse("1.1.2023")))
+        self.assertIsNone(self.kursedb.get_kurs("FR0010315770", lib.utils.dparse("4.1.2023")))
+
+    def test_get_alle_kurse(self):
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0), self.kurs("3.1.2023", 101.0), self.kurs("4.1.2023", 102.0)])
+        res = self.kursedb.get_alle_kurse("LU1437016972", start=lib.utils.dparse("3.1.2023"))
+        self.assertEqual([x[lib.kursedb.KURSEDB_SCHLUSSKURS] for x in res], [101.0, 102.0])
+        res = self.kursedb.get_alle_kurse(self.fondsid, ende=lib.utils.dparse("2.1.2023"))
+        self.assertEqual(res, [self.kursedb.get_kurs_db(self.fondsid, lib.utils.dparse("2.1.2023"))])
+        self.assertIsNone(res[0]["stueck"])
+
+    def test_get_kurse_tupel(self):
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0), self.kurs("3.1.2023", 101.0), self.kurs("4.1.2023", 102.0)])
+        res = self.kursedb.get_kurse_tupel("LU1437016972", start=lib.utils.dparse("3.1.2023"))
+        self.assertEqual(res, [
+            lib.kursedb.Kurs(lib.utils.dparse("3.1.2023"), 101.0, None, None),
+            lib.kursedb.Kurs(lib.utils.dparse("4.1.2023"), 102.0, None, None)
+        ])
+        self.assertEqual([(x.datum, x.schluss) for x in self.kursedb.get_kurse_tupel(self.fondsid)],
+                         [(x[lib.kursedb.KURSEDB_DATUM], x[lib.kursedb.KURSEDB_SCHLUSSKURS]) for x in self.kursedb.get_alle_kurse(self.fondsid)])
+
+    def test_iter_kurse(self):
+        tage = ["2.1.2023", "3.1.2023", "4.1.2023", "5.1.2023", "6.1.2023"]
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs(tag, 100.0 + i) for i, tag in enumerate(tage)])
+        res = self.kursedb.iter_kurse("LU1437016972", start=lib.utils.dparse("3.1.2023"), batch_size=2)
+        self.assertNotIsInstance(res, list)
+        self.assertEqual(list(res), [(lib.utils.dparse(tag), 101.0 + i) for i, tag in enumerate(tage[1:])])
+        self.assertEqual(list(self.kursedb.iter_kurse(self.fondsid, ende=lib.utils.dparse("1.1.2023"))), [])
+
+        query = "SELECT schluss FROM kurse WHERE fondsid=? ORDER BY datum"
+        self.assertEqual(list(self.kursedb.iterate(query, (self.fondsid,), batch_size=3, tolistparam=0)),
+                         self.kursedb.fetchall(query, (self.fondsid,), tolistparam=0))
+        self.assertEqual(next(self.kursedb.iterate(query, (self.fondsid,))), {"schluss": 100.0})
+
+    def test_kurs_uebersicht(self):
+        fondsid2 = self.kursedb.insert_isin("FR0010315770")
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("3.1.2023", 101.0), self.kurs("4.1.2023", 102.0)])
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0), self.kurs("4.1.2023", 102.5)])
+
+        def uebersicht():
+            return {x[lib.kursedb.KURSEDB_ISIN]: (
+                x[lib.kursedb.KURSEDB_ANZAHL],
+                x[lib.kursedb.KURSEDB_ERSTER_DATUM], x[lib.kursedb.KURSEDB_ERSTER_SCHLUSSKURS],
+                x[lib.kursedb.KURSEDB_LETZTER_DATUM], x[lib.kursedb.KURSEDB_LETZTER_SCHLUSSKURS]
+            ) for x in self.kursedb.kurs_uebersicht()}
+
+        erwartet = {
+            "LU1437016972": (3, lib.utils.dparse("2.1.2023"), 100.0, lib.utils.dparse("4.1.2023"), 102.5),
+            "FR0010315770": (0, None, None, None, None)
+        }
+        self.assertEqual(uebersicht(), erwartet)
+        self.assertEqual(self.kursedb.count_kurse(), 3)
+        self.assertEqual(self.kursedb.count_kurse(isin="FR0010315770"), 0)
+        self.assertIsNone(self.kursedb.get_last_kurs(fondsid2))
+        self.assertEqual(self.kursedb.get_last_kurs("LU1437016972")[lib.kursedb.KURSEDB_SCHLUSSKURS], 102.5)
+
+        # Löschen des letzten Kurses
+        self.kursedb.execute("DELETE FROM kurse WHERE fondsid=? AND datum=?", (self.fondsid, lib.utils.dparse("4.1.2023").toordinal()))
+        erwartet["LU1437016972"] = (2, lib.utils.dparse("2.1.2023"), 100.0, lib.utils.dparse("3.1.2023"), 101.0)
+        self.assertEqual(uebersicht(), erwartet)
+
+class TestQueryStats(unittest.TestCase):
+    def test_normalize_query(self):
+        self.assertEqual(lib.sqlite.normalize_query("SELECT *\n  FROM kurse WHERE fondsid IN (?, ?,?) AND schluss>12.5 AND x='a'"),
+                         "SELECT * FROM kurse WHERE fondsid IN (?, ...) AND schluss>? AND x=?")
+
+    def test_statistik(self):
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        try:
+            fondsid = kursedb.insert_isin("LU1437016972")
+            kursedb.upsert_kurse(fondsid, datalist=[TestKurseDB.kurs("2.1.2023", 100.0), TestKurseDB.kurs("4.1.2023", 102.0)])
+            stats = kursedb.enable_query_stats(slow_ms=0)
+
+            for tag in ["2.1.2023", "3.1.2023", "4.1.2023"]:
+                kursedb.get_kurs("LU1437016972", lib.utils.dparse(tag))
+            self.assertEqual(len(kursedb.get_kurse_tupel(fondsid)), 2)
+
+            anzahl = {query: count for query, count, _, _ in stats.rows()}
+            self.assertEqual(anzahl[lib.sqlite.normalize_query(lib.kursedb.KurseDB._QUERY_KURS_ASOF)], 3)
+            self.assertEqual(sum(anzahl.values()), len(stats.slow))
+
+            # Abfrageplan der Kursabfrage nutzt den Index
+            plaene = [plan for _, query, _, plan in stats.slow if query == lib.kursedb.KurseDB._QUERY_KURS_ASOF]
+            self.assertEqual(len(plaene), 3)
+            self.assertTrue(any("k_fonds_datum" in zeile for zeile in plaene[0]))
+        finally:
+            kursedb.close()
+
+class TestKurseDBMitCache(TestKurseDB):
+    # Dieselben Tests, aber aus dem Zwischenspeicher beantwortet
+    def setUp(self):
+        super().setUp()
+        self.kursedb.aktiviere_kurscache(max_punkte=3)
+
+    def test_iter_kurse_do(self):
+        # wie in do.py geöffnet (Zwischenspeicher aktiv): `iter_kurse` liest trotzdem nacheinander aus sqlite
+        spec = importlib.util.spec_from_file_location("do", "do.py")
+        do = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(do)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            dbname = os.path.join(tmpdir, "kurse.db")
+            kursedb = lib.kursedb.KurseDB.open_sqlite(filename=dbname, schema="sql/kurse.sql")
+            kursedb.insert_isin("LU1437016972")
+            kursedb.upsert_kurse("LU1437016972", datalist=[self.kurs("%d.1.2023" % tag, 100.0 + tag) for tag in range(2, 7)])
+            kursedb.close()
+            inifile = os.path.join(tmpdir, "test.ini")
+            with open(inifile, "w") as fout:
+                fout.write("[databases]\nkurse=%s\n" % dbname)
+
+            kursedb = do.Ressourcen(lib.config.Config(inifile)).kursedb_lesen
+            try:
+                self.assertIsNotNone(kursedb.kurscache)
+                start = lib.utils.dparse("4.1.2023")
+                self.assertEqual(kursedb.get_kurs_db("LU1437016972", start, exact=False, laden=False)[lib.kursedb.KURSEDB_SCHLUSSKURS], 104.0)
+                self.assertEqual(list(kursedb.iter_kurse("LU1437016972", start=start, batch_size=2)),
+                                 [(lib.utils.dparse("%d.1.2023" % tag), 100.0 + tag) for tag in range(4, 7)])
+                self.assertEqual(kursedb.kurscache.punkte, 0)
+
+                # bereits geladene Reihen werden benutzt
+                kursedb.get_kurs_db("LU1437016972", start)
+                self.assertEqual(kursedb.kurscache.punkte, 5)
+                self.assertEqual(len(list(kursedb.iter_kurse("LU1437016972", start=start))), 3)
+            finally:
+                kursedb.close()
+
+    def test_verdraengen(self):
+        self.kursedb.upsert_kurse(self.fondsid, datalist=[self.kurs("2.1.2023", 100.0), self.kurs("3.1.2023", 101.0)])
+        fondsid2 = self.kursedb.insert_isin("FR0010315770")
+        self.kursedb.upsert_kurse(fondsid2, datalist=[self.kurs("2.1.2023", 50.0), self.kurs("3.1.2023", 51.0)])
+
+        self.kursedb.get_kurs("LU1437016972", lib.utils.dparse("3.1.2023"))
+        self.assertEqual(list(self.kursedb.kurscache.reihen.keys()), [self.fondsid])
+        self.kursedb.get_kurs("FR0010315770", lib.utils.dparse("3.1.2023"))
+        self.assertEqual(list(self.kursedb.kurscache.reihen.keys()), [fondsid2])
+
+        # Schreiben verwirft die gespeicherte Reihe
+        self.kursedb.upsert_kurse(fondsid2, datalist=[self.kurs("3.1.2023", 52.0)])
+        self.assertEqual(self.kursedb.kurscache.punkte, 0)
+        self.assertEqual(self.kursedb.get_kurs("FR0010315770", lib.utils.dparse("3.1.2023"))[lib.kursedb.KURSEDB_SCHLUSSKURS], 52.0)
+
+class TestKurseDBOhneRowid(TestKurseDB):
+    # Dieselben Tests mit neu aufgebauter Tabelle
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.kursedb.reorganisiere_kurse())
+        self.assertFalse(self.kursedb.reorganisiere_kurse())
+
+class TestKurseDBMigration(unittest.TestCase):
+    # Datenbank mit dem ursprünglichen Aufbau (user_version 0)
+    ALTES_SCHEMA = """
+        CREATE TABLE fonds (fondsid integer primary key autoincrement, isin varchar(32) not null,
+            bezeichnung varchar(200) not null default "", waehrung varchar(5) not null default "EUR");
+        CREATE INDEX f_isin ON fonds(isin);
+        CREATE TABLE kurse (id integer primary key autoincrement, datum date not null, fondsid integer not null,
+            schluss float not null, stueck float, volumen float, FOREIGN KEY(fondsid) REFERENCES fonds(fondsid));
+        CREATE INDEX k_isin ON kurse(fondsid);
+        CREATE INDEX k_datum ON kurse(fondsid, datum);
+        INSERT INTO fonds (isin) VALUES ('LU1437016972');
+        INSERT INTO kurse (datum, fondsid, schluss) VALUES ('2023-01-02', 1, 100.0), ('2023-01-03', 1, 101.0), ('2023-01-03 00:00:00', 1, 101.5);
+    """
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        con = sqlite3.connect(self.filename)
+        con.executescript(self.ALTES_SCHEMA)
+        con.close()
+
+    def tearDown(self):
+        for endung in ["", "-wal", "-shm"]:
+            if os.path.exists(self.filename + endung):
+                os.remove(self.filename + endung)
+
+    def test_profil_und_nur_lesen(self):
+        profil = {"journal_mode": "wal", "synchronous": "NORMAL", "cache_size": "-4000", "temp_store": "MEMORY", "mmap_size": 1048576}
+        self.assertRaises(ValueError, lib.sqlite.check_profile, {"page_size": 4096})
+        self.assertRaises(ValueError, lib.sqlite.check_profile, {"synchronous": "SCHNELL"})
+        self.assertRaises(ValueError, lib.sqlite.check_profile, {"cache_size": "viel"})
+
+        # eine veraltete Datenbank wird auch beim Öffnen zum Lesen aktualisiert
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=self.filename, profile=profil, readonly=True)
+        try:
+            self.assertEqual(kursedb.get_user_version(), lib.kursedb.KURSEDB_MIGRATIONEN[-1][0])
+            self.assertEqual(kursedb.fetchone("PRAGMA journal_mode", None, singleparam=0), "wal")
+            self.assertEqual(kursedb.fetchone("PRAGMA cache_size", None, singleparam=0), -4000)
+            self.assertEqual(kursedb.count_kurse(isin="LU1437016972"), 2)
+            self.assertRaises(sqlite3.OperationalError, kursedb.insert_isin, "FR0010315770")
+        finally:
+            kursedb.close()
+
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=self.filename, profile=profil)
+        try:
+            self.assertEqual(kursedb.fetchone("PRAGMA synchronous", None, singleparam=0), 1)     # NORMAL
+            self.assertEqual(kursedb.fetchone("PRAGMA temp_store", None, singleparam=0), 2)      # MEMORY
+        finally:
+            kursedb.close()
+
+        self.assertRaises(FileNotFoundError, lib.kursedb.KurseDB.open_sqlite, filename=self.filename + ".fehlt", readonly=True)
+
+    def test_migration(self):
+        kursedb = lib.kursedb.KurseDB.open_sqlite(filename=self.filename, schema="sql/kurse.sql")
+        try:
+            self.assertEqual(kursedb.get_user_version(), lib.kursedb.KURSEDB_MIGRATIONEN[-1][0])
+            indizes = [x["name"] for x in kursedb.fetchall("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='kurse'", None)]
+            self.assertEqual(indizes, ["k_fonds_datum"])
+
+            # der zuletzt gespeicherte Kurs eines Tages bleibt
+            self.assertEqual(kursedb.count_kurse(isin="LU1437016972"), 2)
+            letzter = kursedb.get_last_kurs("LU1437016972")
+            self.assertEqual(letzter[lib.kursedb.KURSEDB_SCHLUSSKURS], 101.5)
+            self.assertEqual(letzter[lib.kursedb.KURSEDB_DATUM], lib.utils.dparse("3.1.2023"))
+
+            # Tage als Ordinalzahl
+            self.assertEqual(kursedb.fetchall("SELECT DISTINCT typeof(datum) AS typ FROM kurse", None, tolistparam="typ"), ["integer"])
+            self.assertEqual(kursedb.fetchone("SELECT min(datum) AS tag FROM kurse", None, singleparam="tag"), lib.utils.dparse("2.1.2023").toordinal())
+
+            # erneutes Öffnen ändert nichts
+            self.assertEqual(kursedb.apply_migrations(lib.kursedb.KURSEDB_MIGRATIONEN), [])
+            self.assertRaises(ValueError, kursedb.apply_migrations, lib.kursedb.KURSEDB_MIGRATIONEN[:1])
+        finally:
+            kursedb.close()
+
+class TestWaehrungsfaktoren(unittest.TestCase):
+    def setUp(self):
+        self.kursedb = lib.kursedb.KurseDB.open_sqlite(filename=":memory:", schema="sql/kurse.sql")
+        self.kursedb.insert_isin("EURUSD", waehrung="USD")
+        self.kursedb.upsert_kurse("EURUSD", datalist=[TestKurseDB.kurs(d, k) for d, k in
+            [("29.12.2022", 1.0), ("2.1.2023", 2.0), ("4.1.2023", 4.0), ("9.1.2023", 5.0)]])
+
+    def tearDown(self):
+        self.kursedb.close()
+
+    def test_faktoren(self):
+        wf = lib.waehrung.Waehrungsfaktoren(self.kursedb)
+        daten = [lib.utils.dparse(x) for x in ["4.1.2023", "1.1.2023", "3.1.2023"]]
+        self.assertEqual(wf.faktoren("USD", daten), [0.25, 1.0, 0.5])
+        self.assertEqual(wf.faktoren("EUR", daten), [1.0, 1.0, 1.0])
+        # die ganze Reihe liegt als Kursreihe im Zwischenspeicher
+        self.assertEqual(list(wf.kurscache.reihen.values())[0].schluss.tolist(), [1.0, 2.0, 4.0, 5.0])
+
+        self.assertEqual(wf.faktor("USD", lib.utils.dparse("10.1.2023")), 0.2)
+        self.assertEqual(wf.faktor("USD", lib.utils.dparse("10.1.2023")), self.kursedb.get_waehrungs_faktor("USD", "EUR", lib.utils.dparse("10.1.2023")))
+        self.assertRaises(lib.waehrung.KeinWaehrungskursError, wf.faktor, "USD", lib.utils.dparse("1.12.2022"))
+        self.assertRaises(lib.waehrung.KeinWaehrungskursError, wf.faktor, "CHF", lib.utils.dparse("1.1.2023"))
+
+        # aktiver Zwischenspeicher der Kurse-DB wird mitbenutzt
+        self.kursedb.aktiviere_kurscache()
+        wf = lib.waehrung.Waehrungsfaktoren(self.kursedb)
+        self.assertIs(wf.kurscache, self.kursedb.kurscache)
+        self.assertEqual(wf.faktor("USD", lib.utils.dparse("3.1.2023")), 0.5)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file